@@ -0,0 +1,283 @@
+#!/usr/bin/env python3
+"""
+asyncio BIK to MP4 streaming server, a drop-in replacement for simple-bik-server.py
+Every connection is a coroutine on one event loop: ffmpeg runs as an asyncio
+subprocess (bik.AsyncTranscodePool) with stdout and stderr read concurrently,
+responses are written with drain() backpressure, and a client disconnect kills
+its encode immediately. Blocking work (ffprobe, segment and still renders) runs
+in the loop's thread pool. Uses the same endpoints and transcode cache.
+"""
+
+import asyncio
+import os
+from http import HTTPStatus
+from urllib.parse import urlparse
+
+import bik
+import peaks
+
+PORT = 8002
+
+# Largest request head (request line and headers) accepted
+MAX_HEADER_SIZE = 64 * 1024
+# Bytes per read while watching a streaming client for disconnects (it sends nothing more)
+READ_IGNORED = 1024
+
+catalog = bik.BIKCatalog()
+transcode_cache = bik.TranscodeCache()
+transcode_pool = bik.AsyncTranscodePool(transcode_cache)
+
+
+async def in_thread(function, *args):
+    """Run a blocking call in the loop's default thread pool"""
+    return await asyncio.get_event_loop().run_in_executor(None, function, *args)
+
+
+class BIKConnection:
+    """One client connection: reads a request, routes it like BIKHandler, then closes.
+
+    Every response is sent with Connection: close, since live streams have no length.
+    """
+
+    def __init__(self, reader, writer):
+        self.reader = reader
+        self.writer = writer
+        self.method = None
+        self.path = None
+        self.headers = {}
+        self.body = b''
+
+    async def handle(self):
+        try:
+            if await self.read_request():
+                await self.route()
+        except (ConnectionError, asyncio.IncompleteReadError):
+            pass
+        finally:
+            self.writer.close()
+            try:
+                await self.writer.wait_closed()
+            except (ConnectionError, AttributeError):
+                pass
+
+    async def read_request(self):
+        """Parse the request line, headers and body; False if the client sent nothing usable"""
+        try:
+            head = await self.reader.readuntil(b'\r\n\r\n')
+        except (asyncio.IncompleteReadError, asyncio.LimitOverrunError):
+            return False
+        lines = head.decode('iso-8859-1').split('\r\n')
+        try:
+            self.method, self.path, _ = lines[0].split(' ', 2)
+        except ValueError:
+            await self.send_error(400, "Bad request line")
+            return False
+        for line in lines[1:]:
+            name, sep, value = line.partition(':')
+            if sep:
+                self.headers[name.strip().lower()] = value.strip()
+        length = int(self.headers.get('content-length') or 0)
+        if length:
+            self.body = await self.reader.readexactly(length)
+        return True
+
+    async def route(self):
+        """Dispatch to the same endpoints as simple-bik-server.py"""
+        if self.method == 'OPTIONS':
+            await self.send_response(200, [
+                ('Access-Control-Allow-Methods', 'GET, POST, OPTIONS'),
+                ('Access-Control-Allow-Headers', 'Content-Type, Range, If-None-Match'),
+            ])
+            return
+        try:
+            if self.method == 'POST':
+                if self.path == '/proxy-url':
+                    await self.send_json_response(bik.proxy_urls(self.body, PORT))
+                else:
+                    await self.send_error(404, "Not Found")
+            elif self.method == 'GET':
+                await self.route_get()
+            else:
+                await self.send_error(501, f"Unsupported method {self.method}")
+        except bik.RequestError as e:
+            await self.send_error(e.status, str(e))
+
+    async def route_get(self):
+        """GET endpoints; the shared request handling blocks (ffprobe, stat), so it runs in the thread pool"""
+        path = urlparse(self.path).path
+        if path in ('/status', '/health'):
+            await self.send_json_response({
+                'status': 'running',
+                'service': 'bik-proxy',
+                'server': 'asyncio',
+                'catalog': len(catalog.entries),
+                'transcodes': transcode_pool.stats()
+            })
+        elif path == '/test-ffmpeg':
+            await self.test_ffmpeg()
+        elif path == '/list-bik-files':
+            await self.send_json_response(catalog.page(*bik.page_request(self.path)))
+        elif path.startswith('/stream/') or path == '/convert':
+            await self.stream_bik()
+        elif path.startswith('/keyframes/'):
+            await self.send_json_response(await in_thread(bik.keyframes_request, transcode_cache, catalog, self.path))
+        elif path.startswith('/hls/'):
+            await self.send_result(await in_thread(bik.hls_request, transcode_cache, catalog, self.path))
+        elif path.startswith('/thumb/'):
+            await self.send_result(await in_thread(bik.still_request, transcode_cache, catalog, self.path, 'thumb'))
+        elif path.startswith('/sprite/'):
+            await self.send_result(await in_thread(bik.still_request, transcode_cache, catalog, self.path, 'sprite'))
+        elif path.startswith('/peaks/'):
+            await self.send_result(await in_thread(peaks.peaks_request, transcode_cache, catalog, self.path))
+        else:
+            await self.send_error(404, "Not Found")
+
+    async def send_response(self, status, headers=(), body=b''):
+        """Write the status line, headers (plus CORS) and an optional body, then drain"""
+        lines = [f'HTTP/1.1 {status} {HTTPStatus(status).phrase}',
+                 'Access-Control-Allow-Origin: *', 'Connection: close']
+        lines += [f'{name}: {value}' for name, value in headers]
+        if body and not any(name == 'Content-Length' for name, _ in headers):
+            lines.append(f'Content-Length: {len(body)}')
+        self.writer.write(('\r\n'.join(lines) + '\r\n\r\n').encode('iso-8859-1') + body)
+        await self.writer.drain()
+
+    async def send_error(self, status, message):
+        await self.send_response(status, [('Content-Type', 'text/plain; charset=utf-8')], message.encode('utf-8'))
+
+    async def send_body(self, response):
+        """Send a complete bik.Response"""
+        await self.send_response(response.status, response.headers, response.body)
+
+    async def send_json_response(self, data):
+        """Send JSON response with CORS headers"""
+        await self.send_body(bik.json_response(data))
+
+    async def send_result(self, result):
+        """Send a bik.Response, or serve a bik.CachedFile"""
+        if isinstance(result, bik.CachedFile):
+            await self.serve_cached(result)
+        else:
+            await self.send_body(result)
+
+    async def test_ffmpeg(self):
+        """Test if FFmpeg is available"""
+        try:
+            proc = await asyncio.create_subprocess_exec('ffmpeg', '-version', stdout=asyncio.subprocess.PIPE,
+                                                        stderr=asyncio.subprocess.PIPE)
+            stdout, stderr = await proc.communicate()
+            response = {
+                'status': 'ok' if proc.returncode == 0 else 'error',
+                'ffmpeg_available': proc.returncode == 0,
+                'version': (stdout if proc.returncode == 0 else stderr).decode('utf-8', errors='ignore').split('\n')[0]
+            }
+        except FileNotFoundError:
+            response = {
+                'status': 'error',
+                'ffmpeg_available': False,
+                'error': 'FFmpeg not found in PATH'
+            }
+        await self.send_json_response(response)
+
+    async def stream_bik(self):
+        """Stream a cutscene as MP4 (see bik.stream_request): from the cache once encoded,
+        otherwise live from an ffmpeg subprocess shared by identical requests"""
+        live = await in_thread(bik.stream_request, transcode_cache, catalog, self.path)
+        if isinstance(live, bik.CachedFile):
+            await self.serve_cached(live)
+            return
+
+        try:
+            transcode = await transcode_pool.transcode(live.key, live.command, keep=live.keep)
+        except bik.PoolSaturated as e:
+            await self.send_busy(str(e))
+            return
+
+        reader = transcode.attach() if transcode else None
+        if reader is None:
+            # The encode finished between the cache check and now
+            cached = live.cached()
+            if cached:
+                await self.serve_cached(cached)
+            else:
+                await self.send_error(502, "Transcode failed")
+            return
+
+        try:
+            await self.send_response(200, live.headers)
+            # Stop as soon as the client goes away, even while waiting for ffmpeg output
+            pump = asyncio.ensure_future(self.pump(transcode, reader))
+            disconnect = asyncio.ensure_future(self.wait_for_disconnect())
+            done, _ = await asyncio.wait({pump, disconnect}, return_when=asyncio.FIRST_COMPLETED)
+            disconnect.cancel()
+            if pump not in done:
+                pump.cancel()
+                print(f"Client disconnected from {os.path.basename(live.source)}")
+            try:
+                await pump
+            except (asyncio.CancelledError, ConnectionError):
+                pass
+        finally:
+            # The last client leaving kills ffmpeg; a partial encode is never cached
+            transcode.detach(reader)
+
+        if transcode.ended and transcode.returncode != 0 and not transcode.cancelled:
+            print(f"FFmpeg error (code {transcode.returncode}): {transcode.stderr.decode('utf-8', errors='ignore')}")
+
+    async def pump(self, transcode, reader):
+        """Copy the shared encode to the client, waiting on drain() so a slow client is not buffered in memory"""
+        async for chunk in transcode.follow(reader):
+            self.writer.write(chunk)
+            await self.writer.drain()
+
+    async def wait_for_disconnect(self):
+        """Return once the client closes its side of the connection"""
+        while await self.reader.read(READ_IGNORED):
+            pass
+
+    async def send_busy(self, reason):
+        await self.send_body(bik.busy_response(reason, transcode_pool.stats()))
+
+    async def serve_cached(self, cached):
+        """Serve a bik.CachedFile, rendering it in the transcode pool first if needed"""
+        if cached.path is None:
+            try:
+                cached.path = await transcode_pool.run(cached.job_key, cached.render)
+            except bik.PoolSaturated as e:
+                await self.send_busy(str(e))
+                return
+            except bik.TranscodeError as e:
+                print(f"{cached.failure} failed: {e}")
+                await self.send_error(502, cached.error)
+                return
+
+        status, headers, offset, length = cached.head(self.headers.get('if-none-match'), self.headers.get('range'))
+        await self.send_response(status, headers)
+        if length:
+            with open(cached.path, 'rb') as f:
+                await asyncio.get_event_loop().sendfile(self.writer.transport, f, offset, length)
+
+async def serve(host='', port=PORT):
+    """Accept connections until cancelled"""
+    async def handle(reader, writer):
+        await BIKConnection(reader, writer).handle()
+
+    server = await asyncio.start_server(handle, host, port, limit=MAX_HEADER_SIZE)
+    async with server:
+        await server.serve_forever()
+
+
+if __name__ == '__main__':
+    print(f"asyncio BIK Proxy Server starting on http://localhost:{PORT}")
+    print("Same endpoints as simple-bik-server.py; encodes run as asyncio subprocesses")
+
+    print(f"Cataloguing BIK files in {catalog.root}...")
+    catalog.refresh()
+    catalog.start_polling()
+    print(f"Catalogued {len(catalog.entries)} BIK files")
+
+    print(f"Server listening on port {PORT}")
+    try:
+        asyncio.run(serve())
+    except KeyboardInterrupt:
+        print("\nServer stopped")
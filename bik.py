@@ -0,0 +1,1285 @@
+#!/usr/bin/env python3
+"""
+BIK cutscene transcoding helpers for the Matrix Online Modding Suite
+Builds the ffmpeg commands used by simple-bik-server.py and async-bik-server.py
+and manages the on-disk cache of transcoded MP4s, keyed by source path, mtime and encode settings
+"""
+
+import asyncio
+import bisect
+import hashlib
+import itertools
+import json
+import os
+import re
+import shutil
+import subprocess
+import tempfile
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from urllib.parse import urlparse, parse_qs, unquote, urlencode
+
+from http_util import etag_matches, parse_range
+
+CLIENT_DIR = os.environ.get('MOMS_CLIENT_DIR', '/Users/pascaldisse/Sync/SOE_Matrix_Online_Win_EN')
+CACHE_DIR = os.environ.get('MOMS_BIK_CACHE', 'bik_cache')
+
+# Concurrent ffmpeg encodes, and how long a request may wait for a free slot
+MAX_JOBS = int(os.environ.get('MOMS_BIK_MAX_JOBS', max(1, (os.cpu_count() or 2) // 2)))
+QUEUE_TIMEOUT = float(os.environ.get('MOMS_BIK_QUEUE_TIMEOUT', 10))
+
+# Length of HLS segments; part of the segment cache key
+SEGMENT_SECONDS = float(os.environ.get('MOMS_BIK_SEGMENT_SECONDS', 6))
+
+# Poster frame width, and the sprite sheet of evenly spaced frames used for scrubbing
+THUMB_WIDTH = 320
+SPRITE_FRAMES = 100
+SPRITE_COLUMNS = 10
+SPRITE_TILE = (160, 90)
+
+# Seconds between catalog rescans, and concurrent ffprobe runs while scanning
+CATALOG_POLL_INTERVAL = float(os.environ.get('MOMS_BIK_POLL_INTERVAL', 60))
+PROBE_JOBS = 8
+
+# Listing page size when the client does not ask for one, and the largest allowed
+DEFAULT_PAGE_SIZE = 100
+MAX_PAGE_SIZE = 1000
+# Posters, sprite sheets and peaks only change with the source file
+STILL_MAX_AGE = 7 * 24 * 3600
+# Seconds a client is told to wait after a 503
+RETRY_AFTER = 5
+
+READ_SIZE = 64 * 1024
+# ffmpeg stdout reads in the asyncio proxy; fewer, larger chunks per loop iteration
+ASYNC_READ_SIZE = 256 * 1024
+STDERR_TAIL = 16 * 1024
+
+_part_ids = itertools.count()
+
+# Browser-playable H.264/AAC; part of every cache key, so changing it invalidates the cache
+ENCODE_ARGS = ('-c:v', 'libx264', '-preset', 'ultrafast', '-tune', 'zerolatency', '-c:a', 'aac')
+
+# Selectable with ?profile=; each profile's arguments key its own cache entries
+ENCODE_PROFILES = {
+    # Source resolution, as fast as the encoder goes
+    'full': {'args': ENCODE_ARGS, 'content_type': 'video/mp4'},
+    # 360p with capped bitrate for quick looks: a fraction of the CPU time and bytes of 'full'
+    'preview': {
+        'args': ('-vf', 'scale=-2:360', '-c:v', 'libx264', '-preset', 'veryfast', '-tune', 'zerolatency',
+                 '-crf', '30', '-maxrate', '600k', '-bufsize', '1200k',
+                 '-c:a', 'aac', '-b:a', '64k', '-ac', '2'),
+        'content_type': 'video/mp4',
+    },
+    # Soundtrack only; every AAC frame is a keyframe, so fragments are held to at least a second
+    'audio': {
+        'args': ('-vn', '-c:a', 'aac', '-b:a', '128k', '-min_frag_duration', '1000000'),
+        'content_type': 'audio/mp4',
+    },
+}
+DEFAULT_PROFILE = 'full'
+
+# Fragmented MP4 can be played while it is still being written to the pipe
+STREAM_ARGS = ('-movflags', 'frag_keyframe+empty_moov+faststart', '-f', 'mp4')
+
+
+def encode_profile(name=None):
+    """Encode profile by name (DEFAULT_PROFILE when empty); raises ValueError for unknown names"""
+    name = name or DEFAULT_PROFILE
+    if name not in ENCODE_PROFILES:
+        raise ValueError(f"Unknown profile {name!r} (expected one of {', '.join(ENCODE_PROFILES)})")
+    return ENCODE_PROFILES[name]
+
+
+def transcode_command(source, encode_args=ENCODE_ARGS, output='pipe:1', start=0, threads=None):
+    """ffmpeg command transcoding source to a streamable fragmented MP4, from `start` seconds"""
+    # -ss before -i seeks the input, so nothing before the start point is decoded
+    seek = ['-ss', f'{start:.3f}'] if start else []
+    # Thread count is a machine setting, not an encode setting, so it stays out of the cache key
+    thread_args = ['-threads', str(threads)] if threads else []
+    # File outputs are part files the cache writer has already created
+    overwrite = ['-y'] if output != 'pipe:1' else []
+    return ['ffmpeg', '-loglevel', 'warning', *overwrite, *seek, '-i', source, *encode_args, *thread_args, *STREAM_ARGS, output]
+
+
+def remux_command(source, output):
+    """ffmpeg command rewriting a fragmented MP4 as a regular faststart MP4 (no re-encode)"""
+    return ['ffmpeg', '-loglevel', 'warning', '-y', '-i', source,
+            '-c', 'copy', '-movflags', '+faststart', '-f', 'mp4', output]
+
+
+def probe_command(source):
+    """ffprobe command printing container duration and video stream size as JSON"""
+    return ['ffprobe', '-v', 'error', '-select_streams', 'v:0',
+            '-show_entries', 'format=duration:stream=width,height', '-of', 'json', source]
+
+
+def probe(source):
+    """Duration (seconds), width and height of a video; None values when ffprobe fails"""
+    info = {'duration': None, 'width': None, 'height': None}
+    try:
+        result = subprocess.run(probe_command(source), capture_output=True, timeout=30)
+        data = json.loads(result.stdout or b'{}')
+    except (OSError, subprocess.TimeoutExpired, ValueError):
+        return info
+
+    duration = data.get('format', {}).get('duration')
+    info['duration'] = float(duration) if duration not in (None, 'N/A') else None
+    streams = data.get('streams') or [{}]
+    info['width'] = streams[0].get('width')
+    info['height'] = streams[0].get('height')
+    return info
+
+
+def segment_command(source, number, seconds, workdir, encode_args=ENCODE_ARGS):
+    """ffmpeg command encoding segment `number` of source as HLS fMP4 (init.mp4 + segment.m4s) in workdir"""
+    start = number * seconds
+    return ['ffmpeg', '-loglevel', 'warning', '-y', '-ss', f'{start:.3f}', '-t', f'{seconds:.3f}', '-i', source,
+            *encode_args,
+            # Timestamps continue from the segment start, so segments play back to back
+            '-output_ts_offset', f'{start:.3f}',
+            # hls_time well past the segment length keeps the output in a single file
+            '-f', 'hls', '-hls_time', f'{seconds * 10:.0f}', '-hls_playlist_type', 'vod',
+            '-hls_segment_type', 'fmp4', '-hls_fmp4_init_filename', 'init.mp4',
+            '-hls_segment_filename', os.path.join(workdir, 'segment.m4s'),
+            os.path.join(workdir, 'segment.m3u8')]
+
+
+def segment_count(duration, seconds=SEGMENT_SECONDS):
+    """Number of segments covering duration"""
+    return max(1, int(-(-duration // seconds)))
+
+
+def hls_playlist(duration, seconds=SEGMENT_SECONDS, query=''):
+    """VOD playlist of fixed-length fMP4 segments named <n>.m4s with per-segment <n>.init.mp4.
+
+    `query` (e.g. '?path=...') is appended to every URI, since relative URIs do not
+    inherit the playlist's query string.
+    """
+    count = segment_count(duration, seconds)
+    lines = [
+        '#EXTM3U',
+        '#EXT-X-VERSION:7',
+        f'#EXT-X-TARGETDURATION:{int(-(-seconds // 1))}',
+        '#EXT-X-PLAYLIST-TYPE:VOD',
+        '#EXT-X-INDEPENDENT-SEGMENTS',
+    ]
+    for number in range(count):
+        length = min(seconds, duration - number * seconds)
+        # Segments are encoded independently, so each carries its own init section
+        lines.append(f'#EXT-X-MAP:URI="{number}.init.mp4{query}"')
+        lines.append(f'#EXTINF:{length:.3f},')
+        lines.append(f'{number}.m4s{query}')
+    lines.append('#EXT-X-ENDLIST')
+    return '\n'.join(lines) + '\n'
+
+
+def poster_command(source, at, output, width=THUMB_WIDTH):
+    """ffmpeg command writing the frame at `at` seconds as a JPEG poster"""
+    return ['ffmpeg', '-loglevel', 'warning', '-y', '-ss', f'{at:.3f}', '-i', source,
+            '-frames:v', '1', '-vf', f'scale={width}:-2', '-q:v', '3', output]
+
+
+def sprite_layout(duration, frames=SPRITE_FRAMES, columns=SPRITE_COLUMNS, tile=SPRITE_TILE):
+    """Geometry of a sprite sheet: frame i shows time i * interval at column i % columns, row i // columns"""
+    return {
+        'frames': frames,
+        'columns': columns,
+        'rows': -(-frames // columns),
+        'tile_width': tile[0],
+        'tile_height': tile[1],
+        'interval': duration / frames,
+    }
+
+
+def sprite_command(source, duration, output, frames=SPRITE_FRAMES, columns=SPRITE_COLUMNS, tile=SPRITE_TILE):
+    """ffmpeg command sampling `frames` evenly spaced frames into one JPEG grid"""
+    layout = sprite_layout(duration, frames, columns, tile)
+    width, height = tile
+    video_filter = (f"fps=1/{layout['interval']:.6f},"
+                    f"scale={width}:{height}:force_original_aspect_ratio=decrease,"
+                    f"pad={width}:{height}:(ow-iw)/2:(oh-ih)/2,"
+                    f"tile={columns}x{layout['rows']}")
+    return ['ffmpeg', '-loglevel', 'warning', '-y', '-i', source,
+            '-vf', video_filter, '-frames:v', '1', '-q:v', '4', output]
+
+
+def keyframe_command(source):
+    """ffprobe command listing packet timestamps and flags of the first video stream"""
+    return ['ffprobe', '-v', 'error', '-select_streams', 'v:0',
+            '-show_entries', 'packet=pts_time,flags', '-of', 'csv=p=0', source]
+
+
+def probe_keyframes(source):
+    """Sorted keyframe timestamps (seconds) of a video; reads packets only, nothing is decoded"""
+    try:
+        result = subprocess.run(keyframe_command(source), capture_output=True, timeout=120)
+    except (OSError, subprocess.TimeoutExpired):
+        return []
+
+    keyframes = set()
+    for line in result.stdout.decode('ascii', errors='ignore').splitlines():
+        pts_time, _, flags = line.partition(',')
+        if 'K' in flags:
+            try:
+                keyframes.add(float(pts_time))
+            except ValueError:
+                continue
+    return sorted(keyframes)
+
+
+def nearest_keyframe(keyframes, seconds):
+    """Latest keyframe at or before `seconds` (0 when there is none)"""
+    i = bisect.bisect_right(keyframes, seconds) - 1
+    return keyframes[i] if i >= 0 else 0.0
+
+
+class CacheWriter:
+    """Tee target for a transcode in progress: write() chunks, then commit() or discard().
+
+    With keep=False the output only spools the encode for the clients following it,
+    and commit() discards it instead of caching it.
+    """
+
+    def __init__(self, path, keep=True):
+        self.path = path
+        self.keep = keep
+        self.part_path = f'{path}.{os.getpid()}.{next(_part_ids)}.part'
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        self._file = open(self.part_path, 'wb')
+        self.bytes_written = 0
+
+    def write(self, chunk):
+        self._file.write(chunk)
+        # Flushed so clients following the part file see every chunk
+        self._file.flush()
+        self.bytes_written += len(chunk)
+
+    def _remove_part(self):
+        try:
+            os.remove(self.part_path)
+        except OSError:
+            # Still open by a follower on a platform that cannot unlink open files
+            pass
+
+    def commit(self, remux=True):
+        """Move the finished output into the cache, remuxed for seeking when possible.
+
+        Returns the cache path, or None when the output is not kept. The part file is
+        never rewritten in place: clients that attached to the encode keep reading it
+        up to the encode's size while the remux is written alongside.
+        """
+        self._file.close()
+        if not self.keep:
+            self._remove_part()
+            return None
+        if remux:
+            remux_path = f'{self.part_path}.mp4'
+            try:
+                returncode = subprocess.run(remux_command(self.part_path, remux_path), capture_output=True).returncode
+            except OSError:
+                returncode = None
+            if returncode == 0:
+                os.replace(remux_path, self.path)
+                self._remove_part()
+                return self.path
+            if os.path.exists(remux_path):
+                os.remove(remux_path)
+        os.replace(self.part_path, self.path)
+        return self.path
+
+    def discard(self):
+        """Drop a partial output (failed transcode or disconnected client)"""
+        self._file.close()
+        if os.path.exists(self.part_path):
+            os.remove(self.part_path)
+
+
+class TranscodeCache:
+    """Transcoded cutscenes on disk as <directory>/<key[:2]>/<key>.mp4"""
+
+    def __init__(self, directory=CACHE_DIR):
+        self.directory = directory
+        self._keyframes = {}
+
+    def key(self, source, encode_args=ENCODE_ARGS, start=0):
+        """Cache key for a source file; changes when the file, the encode settings or the start time change"""
+        stat = os.stat(source)
+        identity = [os.path.abspath(source), stat.st_mtime_ns, stat.st_size, list(encode_args)]
+        if start:
+            identity.append(round(start, 3))
+        return hashlib.sha1(json.dumps(identity).encode('utf-8')).hexdigest()
+
+    def path(self, key, suffix='.mp4'):
+        return os.path.join(self.directory, key[:2], key + suffix)
+
+    def lookup(self, key):
+        """Path of the cached output for key, or None"""
+        path = self.path(key)
+        return path if os.path.isfile(path) else None
+
+    def writer(self, key, keep=True):
+        return CacheWriter(self.path(key), keep)
+
+    def segment(self, source, number, seconds=SEGMENT_SECONDS, encode_args=ENCODE_ARGS):
+        """(init path, media path) of an HLS segment, or None if it has not been encoded"""
+        directory = self.path(self.key(source, encode_args + ('hls', seconds)), '.hls')
+        init_path = os.path.join(directory, f'{number}.init.mp4')
+        media_path = os.path.join(directory, f'{number}.m4s')
+        # The media file is moved in last, so it marks a complete segment
+        return (init_path, media_path) if os.path.isfile(media_path) else None
+
+    def encode_segment(self, source, number, seconds=SEGMENT_SECONDS, encode_args=ENCODE_ARGS):
+        """Encode an HLS segment into the cache (if missing) and return (init path, media path)"""
+        cached = self.segment(source, number, seconds, encode_args)
+        if cached:
+            return cached
+
+        directory = self.path(self.key(source, encode_args + ('hls', seconds)), '.hls')
+        os.makedirs(directory, exist_ok=True)
+        workdir = tempfile.mkdtemp(prefix=f'{number}.', suffix='.part', dir=directory)
+        try:
+            try:
+                result = subprocess.run(segment_command(source, number, seconds, workdir, encode_args),
+                                        capture_output=True)
+            except OSError as e:
+                raise TranscodeError(str(e))
+            init_path = os.path.join(directory, f'{number}.init.mp4')
+            media_path = os.path.join(directory, f'{number}.m4s')
+            if result.returncode != 0 or not os.path.isfile(os.path.join(workdir, 'segment.m4s')):
+                raise TranscodeError(result.stderr.decode('utf-8', errors='ignore')[-STDERR_TAIL:])
+            os.replace(os.path.join(workdir, 'init.mp4'), init_path)
+            os.replace(os.path.join(workdir, 'segment.m4s'), media_path)
+            return init_path, media_path
+        finally:
+            shutil.rmtree(workdir, ignore_errors=True)
+
+    def still_path(self, source, kind):
+        """Cache path of a 'thumb' (poster) or 'sprite' (scrub sheet) image of source"""
+        settings = (kind, THUMB_WIDTH, SPRITE_FRAMES, SPRITE_COLUMNS) + SPRITE_TILE
+        return self.path(self.key(source, settings), '.jpg')
+
+    def render_still(self, source, kind, command):
+        """Render a still with command(output path) unless cached; returns the cache path"""
+        path = self.still_path(source, kind)
+        if os.path.isfile(path):
+            return path
+
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        # ffmpeg picks the image format from the extension
+        part_path = f'{path}.{os.getpid()}.{next(_part_ids)}.part.jpg'
+        try:
+            try:
+                result = subprocess.run(command(part_path), capture_output=True)
+            except OSError as e:
+                raise TranscodeError(str(e))
+            if result.returncode != 0 or not os.path.isfile(part_path):
+                raise TranscodeError(result.stderr.decode('utf-8', errors='ignore')[-STDERR_TAIL:])
+            os.replace(part_path, path)
+            return path
+        finally:
+            if os.path.exists(part_path):
+                os.remove(part_path)
+
+    def keyframes(self, source):
+        """Duration and keyframe timestamps of a source, probed once and kept on disk and in memory"""
+        key = self.key(source, encode_args=())
+        index = self._keyframes.get(key)
+        if index is not None:
+            return index
+
+        path = self.path(key, '.keyframes.json')
+        try:
+            with open(path, 'r', encoding='utf-8') as f:
+                index = json.load(f)
+        except (OSError, ValueError):
+            index = {
+                'duration': probe(source).get('duration'),
+                'keyframes': probe_keyframes(source),
+            }
+            # An empty index usually means ffprobe is missing; do not persist that
+            if index['keyframes']:
+                os.makedirs(os.path.dirname(path), exist_ok=True)
+                tmp_path = f'{path}.{os.getpid()}.{next(_part_ids)}.tmp'
+                with open(tmp_path, 'w', encoding='utf-8') as f:
+                    json.dump(index, f)
+                os.replace(tmp_path, path)
+
+        self._keyframes[key] = index
+        return index
+
+
+class PoolSaturated(Exception):
+    """No transcode slot became free within the queue timeout"""
+
+
+class TranscodeError(Exception):
+    """ffmpeg failed to produce an output"""
+
+
+class Transcode:
+    """One ffmpeg encode into the cache, shared by every client requesting the same output.
+
+    The encode runs on its own thread and writes to the cache's part file; clients
+    follow that file from the start, so late joiners get the whole stream. The
+    encode is cancelled when its last client detaches before it finishes.
+
+    `ended` is set as soon as ffmpeg exits, which ends every follower's stream; the
+    output is then remuxed and committed to the cache, after which `done` is set.
+    """
+
+    def __init__(self, key, command, writer, on_done=None):
+        self.key = key
+        self.command = command
+        self.writer = writer
+        self.on_done = on_done
+        self.size = 0
+        self.ended = False
+        self.done = False
+        self.cancelled = False
+        self.returncode = None
+        self.cached_path = None
+        self.stderr = b''
+        self._clients = 0
+        self._proc = None
+        self._cond = threading.Condition()
+
+    def start(self):
+        threading.Thread(target=self._run, name=f'transcode-{self.key[:8]}', daemon=True).start()
+        return self
+
+    def _drain_stderr(self, pipe):
+        # Read concurrently: a full stderr pipe would block ffmpeg
+        for line in pipe:
+            self.stderr = (self.stderr + line)[-STDERR_TAIL:]
+
+    def _run(self):
+        try:
+            self._proc = subprocess.Popen(self.command, stdout=subprocess.PIPE, stderr=subprocess.PIPE)
+            stderr_thread = threading.Thread(target=self._drain_stderr, args=(self._proc.stderr,), daemon=True)
+            stderr_thread.start()
+            while not self.cancelled:
+                chunk = self._proc.stdout.read(READ_SIZE)
+                if not chunk:
+                    break
+                self.writer.write(chunk)
+                with self._cond:
+                    self.size += len(chunk)
+                    self._cond.notify_all()
+            if self.cancelled:
+                self._proc.terminate()
+            self.returncode = self._proc.wait()
+            stderr_thread.join()
+        except OSError as e:
+            self.stderr = str(e).encode('utf-8')
+        finally:
+            completed = self.returncode == 0 and not self.cancelled
+            if not completed:
+                self.writer.discard()
+            # Followers reach EOF now rather than after the remux
+            with self._cond:
+                self.ended = True
+                self._cond.notify_all()
+            try:
+                if completed:
+                    self.cached_path = self.writer.commit()
+            finally:
+                with self._cond:
+                    self.done = True
+                    self._cond.notify_all()
+                if self.on_done:
+                    self.on_done(self)
+
+    def attach(self):
+        """Open the output for a new client; returns None once the output has been committed or discarded"""
+        with self._cond:
+            if self.done or self.cancelled:
+                return None
+            try:
+                reader = open(self.writer.part_path, 'rb')
+            except FileNotFoundError:
+                # Committed or discarded a moment ago
+                return None
+            self._clients += 1
+            return reader
+
+    def detach(self, reader):
+        """Close a client's reader; the last client leaving an unfinished encode cancels it"""
+        reader.close()
+        with self._cond:
+            self._clients -= 1
+            if self._clients == 0 and not self.ended:
+                self.cancel()
+
+    def wait(self, timeout=None):
+        """Block until the encode has finished (and been committed or discarded)"""
+        with self._cond:
+            return self._cond.wait_for(lambda: self.done, timeout)
+
+    def cancel(self):
+        self.cancelled = True
+        if self._proc and self._proc.poll() is None:
+            self._proc.terminate()
+
+    def follow(self, reader, chunk_size=READ_SIZE):
+        """Yield the output from the start, waiting for new data until the encode ends"""
+        offset = 0
+        while True:
+            with self._cond:
+                while self.size <= offset and not self.ended:
+                    self._cond.wait()
+                available, done = self.size, self.ended
+            if available > offset:
+                chunk = reader.read(min(chunk_size, available - offset))
+                offset += len(chunk)
+                yield chunk
+            elif done:
+                return
+
+
+class TranscodePool:
+    """Bounded set of concurrent encodes, with identical requests coalesced onto one"""
+
+    def __init__(self, cache, max_jobs=MAX_JOBS, queue_timeout=QUEUE_TIMEOUT):
+        self.cache = cache
+        self.max_jobs = max_jobs
+        self.queue_timeout = queue_timeout
+        self._slots = threading.BoundedSemaphore(max_jobs)
+        self._lock = threading.Lock()
+        self._inflight = {}
+        self._jobs = {}
+        self._active_jobs = 0
+        self.waiting = 0
+
+    def _running(self, key):
+        transcode = self._inflight.get(key)
+        return transcode if transcode and not transcode.cancelled else None
+
+    def _finished(self, transcode):
+        with self._lock:
+            if self._inflight.get(transcode.key) is transcode:
+                del self._inflight[transcode.key]
+        self._slots.release()
+
+    def transcode(self, key, command, keep=True):
+        """In-flight Transcode for key (joined or newly started), or None if the output is now cached.
+
+        keep=False streams the encode to its clients without caching it. Raises
+        PoolSaturated when no slot frees up within queue_timeout.
+        """
+        with self._lock:
+            running = self._running(key)
+            if running:
+                return running
+            self.waiting += 1
+
+        try:
+            acquired = self._slots.acquire(timeout=self.queue_timeout)
+        finally:
+            with self._lock:
+                self.waiting -= 1
+        if not acquired:
+            raise PoolSaturated(f'{self.max_jobs} transcodes running')
+
+        with self._lock:
+            # Another request may have started or finished the same encode while we waited
+            running = self._running(key)
+            if running or self.cache.lookup(key):
+                self._slots.release()
+                return running
+            transcode = Transcode(key, command, self.cache.writer(key, keep), on_done=self._finished)
+            self._inflight[key] = transcode
+        return transcode.start()
+
+    def run(self, key, job):
+        """Run job() in a transcode slot and return its result.
+
+        Concurrent calls with the same key wait for the first call instead of running
+        job again. Raises PoolSaturated when no slot frees up within queue_timeout.
+        """
+        with self._lock:
+            pending = self._jobs.get(key)
+            owner = pending is None
+            if owner:
+                pending = self._jobs[key] = {'done': threading.Event(), 'result': None, 'error': None}
+            self.waiting += 1
+
+        if not owner:
+            try:
+                pending['done'].wait()
+            finally:
+                with self._lock:
+                    self.waiting -= 1
+            if pending['error']:
+                raise pending['error']
+            return pending['result']
+
+        try:
+            try:
+                acquired = self._slots.acquire(timeout=self.queue_timeout)
+            finally:
+                with self._lock:
+                    self.waiting -= 1
+            if not acquired:
+                raise PoolSaturated(f'{self.max_jobs} transcodes running')
+            with self._lock:
+                self._active_jobs += 1
+            try:
+                pending['result'] = job()
+            finally:
+                with self._lock:
+                    self._active_jobs -= 1
+                self._slots.release()
+        except Exception as e:
+            pending['error'] = e
+            raise
+        finally:
+            with self._lock:
+                del self._jobs[key]
+            pending['done'].set()
+        return pending['result']
+
+    def stats(self):
+        with self._lock:
+            return {
+                'max_jobs': self.max_jobs,
+                'running': len(self._inflight) + self._active_jobs,
+                'waiting': self.waiting,
+                'queue_timeout': self.queue_timeout,
+            }
+
+
+class AsyncTranscode:
+    """asyncio counterpart of Transcode, for the asyncio BIK proxy.
+
+    ffmpeg runs through asyncio.create_subprocess_exec with stdout and stderr read
+    concurrently on the event loop, so an encode costs no threads. Output is teed
+    into the cache's part file and clients follow it from the start, as with
+    Transcode; the last client detaching kills ffmpeg at once. `ended` and `done`
+    mean the same as on Transcode.
+    """
+
+    def __init__(self, key, command, writer, on_done=None):
+        self.key = key
+        self.command = command
+        self.writer = writer
+        self.on_done = on_done
+        self.size = 0
+        self.ended = False
+        self.done = False
+        self.cancelled = False
+        self.returncode = None
+        self.cached_path = None
+        self.stderr = b''
+        self._clients = 0
+        self._proc = None
+        self._cond = asyncio.Condition()
+
+    def start(self):
+        asyncio.ensure_future(self._run())
+        return self
+
+    async def _drain_stderr(self, pipe):
+        while True:
+            chunk = await pipe.read(READ_SIZE)
+            if not chunk:
+                break
+            self.stderr = (self.stderr + chunk)[-STDERR_TAIL:]
+
+    async def _notify(self):
+        async with self._cond:
+            self._cond.notify_all()
+
+    async def _run(self):
+        try:
+            self._proc = await asyncio.create_subprocess_exec(
+                *self.command, stdout=asyncio.subprocess.PIPE, stderr=asyncio.subprocess.PIPE,
+                limit=ASYNC_READ_SIZE
+            )
+            stderr_task = asyncio.ensure_future(self._drain_stderr(self._proc.stderr))
+            while not self.cancelled:
+                chunk = await self._proc.stdout.read(ASYNC_READ_SIZE)
+                if not chunk:
+                    break
+                self.writer.write(chunk)
+                self.size += len(chunk)
+                await self._notify()
+            if self.cancelled and self._proc.returncode is None:
+                self._proc.kill()
+            self.returncode = await self._proc.wait()
+            await stderr_task
+        except OSError as e:
+            self.stderr = str(e).encode('utf-8')
+        except asyncio.CancelledError:
+            # Server shutting down
+            self.cancel()
+            raise
+        finally:
+            completed = self.returncode == 0 and not self.cancelled
+            if not completed:
+                self.writer.discard()
+            # Followers reach EOF now rather than after the remux
+            self.ended = True
+            await self._notify()
+            try:
+                if completed:
+                    # The remux is a blocking ffmpeg run
+                    loop = asyncio.get_event_loop()
+                    self.cached_path = await loop.run_in_executor(None, self.writer.commit)
+            finally:
+                self.done = True
+                await self._notify()
+                if self.on_done:
+                    self.on_done(self)
+
+    def attach(self):
+        """Open the output for a new client; returns None once the output has been committed or discarded"""
+        if self.done or self.cancelled:
+            return None
+        try:
+            reader = open(self.writer.part_path, 'rb')
+        except FileNotFoundError:
+            return None
+        self._clients += 1
+        return reader
+
+    def detach(self, reader):
+        """Close a client's reader; the last client leaving an unfinished encode kills it"""
+        reader.close()
+        self._clients -= 1
+        if self._clients == 0 and not self.ended:
+            self.cancel()
+
+    async def wait(self, timeout=None):
+        """Wait until the encode has finished (and been committed or discarded)"""
+        async with self._cond:
+            try:
+                await asyncio.wait_for(self._cond.wait_for(lambda: self.done), timeout)
+            except asyncio.TimeoutError:
+                return False
+        return True
+
+    def cancel(self):
+        self.cancelled = True
+        if self._proc and self._proc.returncode is None:
+            self._proc.kill()
+
+    async def follow(self, reader, chunk_size=ASYNC_READ_SIZE):
+        """Yield the output from the start, waiting for new data until the encode ends"""
+        offset = 0
+        while True:
+            async with self._cond:
+                await self._cond.wait_for(lambda: self.size > offset or self.ended)
+                available, done = self.size, self.ended
+            if available > offset:
+                chunk = reader.read(min(chunk_size, available - offset))
+                offset += len(chunk)
+                yield chunk
+            elif done:
+                return
+
+
+class AsyncTranscodePool:
+    """asyncio counterpart of TranscodePool: bounded encodes, identical requests coalesced.
+
+    Blocking jobs given to run() (segment and still renders) execute in the loop's
+    default thread pool while holding a slot.
+    """
+
+    def __init__(self, cache, max_jobs=MAX_JOBS, queue_timeout=QUEUE_TIMEOUT):
+        self.cache = cache
+        self.max_jobs = max_jobs
+        self.queue_timeout = queue_timeout
+        self._slots = None
+        self._inflight = {}
+        self._jobs = {}
+        self._active_jobs = 0
+        self.waiting = 0
+
+    async def _acquire(self):
+        # Created on first use so it belongs to the running event loop
+        if self._slots is None:
+            self._slots = asyncio.BoundedSemaphore(self.max_jobs)
+        self.waiting += 1
+        try:
+            await asyncio.wait_for(self._slots.acquire(), self.queue_timeout)
+        except asyncio.TimeoutError:
+            raise PoolSaturated(f'{self.max_jobs} transcodes running')
+        finally:
+            self.waiting -= 1
+
+    def _running(self, key):
+        transcode = self._inflight.get(key)
+        return transcode if transcode and not transcode.cancelled else None
+
+    def _finished(self, transcode):
+        if self._inflight.get(transcode.key) is transcode:
+            del self._inflight[transcode.key]
+        self._slots.release()
+
+    async def transcode(self, key, command, keep=True):
+        """In-flight AsyncTranscode for key (joined or newly started), or None if the output is now cached.
+
+        keep=False streams the encode to its clients without caching it. Raises
+        PoolSaturated when no slot frees up within queue_timeout.
+        """
+        running = self._running(key)
+        if running:
+            return running
+
+        await self._acquire()
+        # Another request may have started or finished the same encode while we waited
+        running = self._running(key)
+        if running or self.cache.lookup(key):
+            self._slots.release()
+            return running
+        transcode = AsyncTranscode(key, command, self.cache.writer(key, keep), on_done=self._finished)
+        self._inflight[key] = transcode
+        return transcode.start()
+
+    async def run(self, key, job):
+        """Run the blocking job() in a worker thread under a transcode slot and return its result.
+
+        Concurrent calls with the same key wait for the first call instead of running
+        job again. Raises PoolSaturated when no slot frees up within queue_timeout.
+        """
+        pending = self._jobs.get(key)
+        if pending is not None:
+            self.waiting += 1
+            try:
+                await pending['done'].wait()
+            finally:
+                self.waiting -= 1
+            if pending['error']:
+                raise pending['error']
+            return pending['result']
+
+        pending = self._jobs[key] = {'done': asyncio.Event(), 'result': None, 'error': None}
+        try:
+            await self._acquire()
+            self._active_jobs += 1
+            try:
+                pending['result'] = await asyncio.get_event_loop().run_in_executor(None, job)
+            finally:
+                self._active_jobs -= 1
+                self._slots.release()
+        except Exception as e:
+            pending['error'] = e
+            raise
+        finally:
+            del self._jobs[key]
+            pending['done'].set()
+        return pending['result']
+
+    def stats(self):
+        return {
+            'max_jobs': self.max_jobs,
+            'running': len(self._inflight) + self._active_jobs,
+            'waiting': self.waiting,
+            'queue_timeout': self.queue_timeout,
+        }
+
+
+class BIKCatalog:
+    """In-memory index of the BIK files under a client directory.
+
+    Built once by refresh() and kept current by a polling thread that re-stats the
+    tree and only re-probes files whose size or mtime changed. Entries are looked
+    up by relative path or bare file name.
+    """
+
+    def __init__(self, root=CLIENT_DIR, prober=probe, poll_interval=CATALOG_POLL_INTERVAL):
+        self.root = root
+        self.prober = prober
+        self.poll_interval = poll_interval
+        self.entries = []
+        self.by_path = {}
+        self.by_name = {}
+        self.refreshed_at = None
+        self._lock = threading.Lock()
+
+    @staticmethod
+    def _normalize(path):
+        return path.replace('\\', '/').strip('/').lower()
+
+    def _scan(self):
+        found = []
+        for root, _, files in os.walk(self.root):
+            for file in files:
+                if file.lower().endswith('.bik'):
+                    full_path = os.path.join(root, file)
+                    try:
+                        stat = os.stat(full_path)
+                    except OSError:
+                        continue
+                    found.append((full_path, stat.st_size, stat.st_mtime))
+        return found
+
+    def refresh(self):
+        """Rescan the tree; returns the number of files (re)probed"""
+        previous = {entry['path']: entry for entry in self.entries}
+        entries, to_probe = [], []
+        for full_path, size, mtime in self._scan():
+            old = previous.get(full_path)
+            if old and old['size'] == size and old['mtime'] == mtime:
+                entries.append(old)
+                continue
+            entry = {
+                'name': os.path.basename(full_path),
+                'path': full_path,
+                'relative_path': os.path.relpath(full_path, self.root).replace(os.sep, '/'),
+                'size': size,
+                'mtime': mtime,
+            }
+            entries.append(entry)
+            to_probe.append(entry)
+
+        with ThreadPoolExecutor(max_workers=PROBE_JOBS) as pool:
+            for entry, info in zip(to_probe, pool.map(self.prober, [e['path'] for e in to_probe])):
+                entry.update(info)
+
+        entries.sort(key=lambda entry: entry['relative_path'].lower())
+        by_path = {self._normalize(entry['relative_path']): entry for entry in entries}
+        by_name = {}
+        for entry in entries:
+            by_name.setdefault(entry['name'].lower(), entry)
+
+        with self._lock:
+            self.entries, self.by_path, self.by_name = entries, by_path, by_name
+            self.refreshed_at = time.time()
+        return len(to_probe)
+
+    def start_polling(self):
+        """Rescan every poll_interval seconds on a daemon thread"""
+        def poll():
+            while True:
+                time.sleep(self.poll_interval)
+                try:
+                    changed = self.refresh()
+                    if changed:
+                        print(f"BIK catalog: {changed} new or changed files")
+                except OSError as e:
+                    print(f"BIK catalog refresh failed: {e}")
+        threading.Thread(target=poll, name='bik-catalog', daemon=True).start()
+
+    def lookup(self, path):
+        """Catalog entry for a relative path, a path ending in one, or a bare file name"""
+        if not path:
+            return None
+        with self._lock:
+            by_path, by_name = self.by_path, self.by_name
+        key = self._normalize(path)
+        if key in by_path:
+            return by_path[key]
+        # Paths from the browser are relative to whatever folder the user picked
+        parts = key.split('/')
+        for i in range(1, len(parts)):
+            entry = by_path.get('/'.join(parts[i:]))
+            if entry:
+                return entry
+        return by_name.get(parts[-1])
+
+    def resolve(self, path):
+        """Absolute path of a catalogued BIK file, or None"""
+        entry = self.lookup(path)
+        return entry['path'] if entry else None
+
+    def find_file(self, path):
+        """Existing file under root at a relative path or a path ending in one (for media the catalog does not index)"""
+        parts = [part for part in path.replace('\\', '/').split('/') if part and part != '..']
+        for i in range(len(parts)):
+            candidate = os.path.join(self.root, *parts[i:])
+            if os.path.isfile(candidate):
+                return candidate
+        return None
+
+    def page(self, offset=0, limit=100):
+        """JSON-ready slice of the catalog"""
+        with self._lock:
+            entries, refreshed_at = self.entries, self.refreshed_at
+        return {
+            'files': entries[offset:offset + limit],
+            'count': len(entries),
+            'offset': offset,
+            'limit': limit,
+            'refreshed_at': refreshed_at,
+        }
+
+
+# Request handling shared by simple-bik-server.py and async-bik-server.py. These
+# functions block (ffprobe, stat); the servers only send what they return.
+
+class RequestError(Exception):
+    """A request the servers answer with an error status and a plain-text message"""
+
+    def __init__(self, status, message):
+        super().__init__(message)
+        self.status = status
+
+
+class Response:
+    """A complete response body; the servers add Content-Length and CORS headers"""
+
+    def __init__(self, body, content_type, status=200, headers=()):
+        self.body = body
+        self.status = status
+        self.headers = [('Content-Type', content_type)] + list(headers)
+
+
+def json_response(data):
+    return Response(json.dumps(data).encode('utf-8'), 'application/json')
+
+
+def busy_response(reason, stats):
+    """503 with Retry-After when every transcode slot stays busy"""
+    body = json.dumps({'error': 'busy', 'reason': reason, **stats}).encode('utf-8')
+    return Response(body, 'application/json', 503, [
+        ('Retry-After', str(RETRY_AFTER)),
+        ('Access-Control-Expose-Headers', 'Retry-After'),
+    ])
+
+
+class CachedFile:
+    """A file from the transcode cache, served with ETag revalidation and single-range requests.
+
+    path is None until the file exists: the server then runs render() in its pool
+    under job_key, which returns the path. If that raises TranscodeError it logs
+    '<failure> failed' and answers 502 with error.
+    """
+
+    def __init__(self, path, etag, content_type='video/mp4', cache_control='no-cache', start_time=0,
+                 job_key=None, render=None, failure=None, error=None):
+        self.path = path
+        self.etag = etag
+        self.content_type = content_type
+        self.cache_control = cache_control
+        self.start_time = start_time
+        self.job_key = job_key
+        self.render = render
+        self.failure = failure
+        self.error = error
+
+    def head(self, if_none_match, range_header):
+        """(status, headers, offset, length) answering a request's If-None-Match and Range headers"""
+        if etag_matches(if_none_match, self.etag):
+            return 304, [('ETag', self.etag)], 0, 0
+
+        size = os.path.getsize(self.path)
+        try:
+            byte_range = parse_range(range_header, size)
+        except ValueError:
+            return 416, [('Content-Range', f'bytes */{size}'), ('Content-Length', '0')], 0, 0
+
+        headers = []
+        if byte_range:
+            start, end = byte_range
+            status = 206
+            headers.append(('Content-Range', f'bytes {start}-{end}/{size}'))
+        else:
+            start, end = 0, size - 1
+            status = 200
+        return status, headers + [
+            ('Content-Type', self.content_type),
+            ('Content-Length', str(end - start + 1)),
+            ('Accept-Ranges', 'bytes'),
+            ('ETag', self.etag),
+            # Stream URLs stay the same when the source changes, so clients revalidate via the ETag
+            ('Cache-Control', self.cache_control),
+            ('Access-Control-Expose-Headers', 'Content-Length, Content-Range, Accept-Ranges, ETag, X-Start-Time'),
+            ('X-Start-Time', f'{self.start_time:.3f}'),
+        ], start, end - start + 1
+
+
+def name_etag(path):
+    """ETag of a cache file whose name is already a content key"""
+    return '"' + os.path.splitext(os.path.basename(path))[0] + '"'
+
+
+class LiveTranscode:
+    """A /stream/ request with no cached transcode: the pool encodes command under key
+    while the server streams it, sending headers first"""
+
+    def __init__(self, cache, source, profile, start=0):
+        self.cache = cache
+        self.source = source
+        self.start = start
+        self.content_type = profile['content_type']
+        self.key = cache.key(source, profile['args'], start=start)
+        self.command = transcode_command(source, profile['args'], start=start)
+        # Encodes from a seek point are streamed but not cached: every keyframe would
+        # otherwise leave a near-copy of the cutscene in the cache
+        self.keep = not start
+        self.headers = [
+            ('Content-Type', self.content_type),
+            ('Access-Control-Expose-Headers', 'X-Start-Time'),
+            ('Cache-Control', 'no-cache'),
+            ('X-Start-Time', f'{start:.3f}'),
+        ]
+
+    def cached(self):
+        """The finished transcode as a CachedFile, or None while it is not in the cache"""
+        path = self.cache.lookup(self.key)
+        if not path:
+            return None
+        return CachedFile(path, f'"{self.key}"', self.content_type, start_time=self.start)
+
+
+def resolve_request(catalog, url, prefix, filename=None):
+    """Source path for /<prefix>/<name>?path=<path> (or ?file=<name>), plus the parsed query.
+
+    Raises RequestError when it cannot be resolved.
+    """
+    parsed = urlparse(url)
+    if filename is None:
+        filename = unquote(parsed.path[len(prefix):]) if parsed.path.startswith(prefix) else ''
+    query = parse_qs(parsed.query)
+    bik_path = query.get('path', query.get('file', [filename]))[0]
+    if not bik_path:
+        raise RequestError(400, "No path provided")
+
+    # Resolve through the catalog (or the client directory for other media); files outside it are served if they exist
+    source = catalog.resolve(bik_path) or (filename and catalog.resolve(filename)) or catalog.find_file(bik_path)
+    if not source:
+        if not os.path.isfile(bik_path):
+            raise RequestError(404, f"File not found: {bik_path}")
+        source = bik_path
+    return source, query
+
+
+def page_request(url):
+    """(offset, limit) of /list-bik-files?offset=&limit="""
+    query = parse_qs(urlparse(url).query)
+    try:
+        offset = max(0, int(query.get('offset', ['0'])[0]))
+        limit = min(MAX_PAGE_SIZE, max(1, int(query.get('limit', [str(DEFAULT_PAGE_SIZE)])[0])))
+    except ValueError:
+        raise RequestError(400, "offset and limit must be integers")
+    return offset, limit
+
+
+def proxy_urls(body, port):
+    """Answer to POST /proxy-url {"path": <path>}: stream and HLS playlist URLs of the file"""
+    try:
+        data = json.loads(body)
+    except ValueError:
+        raise RequestError(400, "Invalid JSON")
+    file_path = data.get('path', '')
+    if file_path == 'test':
+        return {'status': 'ok', 'message': 'Proxy server is running'}
+    if not file_path:
+        raise RequestError(400, "No file path provided")
+
+    filename = os.path.basename(file_path)
+    return {
+        'url': f'http://localhost:{port}/stream/{filename}?path={file_path}',
+        'playlist_url': f'http://localhost:{port}/hls/{filename}/index.m3u8?' + urlencode({'path': file_path}),
+    }
+
+
+def keyframes_request(cache, catalog, url):
+    """Duration and keyframe timestamps for /keyframes/<name>, for seeking with ?t="""
+    source, _ = resolve_request(catalog, url, '/keyframes/')
+    return {'name': os.path.basename(source), **cache.keyframes(source)}
+
+
+def _request_profile(query):
+    try:
+        return encode_profile(query.get('profile', [''])[0])
+    except ValueError as e:
+        raise RequestError(400, str(e))
+
+
+def stream_request(cache, catalog, url):
+    """CachedFile or LiveTranscode for /stream/<name>?path=<path> (or /convert?file=<name>).
+
+    With ?t=<seconds> the transcode starts at the latest keyframe at or before t;
+    the X-Start-Time header reports that keyframe, or 0 when the whole cached
+    transcode is served instead. ?profile= picks an encode profile from
+    ENCODE_PROFILES (preview, full, audio; default full).
+    """
+    source, query = resolve_request(catalog, url, '/stream/')
+    try:
+        requested_start = max(0.0, float(query.get('t', ['0'])[0]))
+    except ValueError:
+        raise RequestError(400, "t must be a number of seconds")
+    profile = _request_profile(query)
+    start = nearest_keyframe(cache.keyframes(source)['keyframes'], requested_start) if requested_start else 0
+
+    full = LiveTranscode(cache, source, profile)
+    if start:
+        # Seek encodes are never cached; once the whole transcode is, it answers seeks
+        # too (with Range) instead of a fresh encode from the keyframe
+        return full.cached() or LiveTranscode(cache, source, profile, start)
+    return full.cached() or full
+
+
+def hls_request(cache, catalog, url):
+    """Response for an HLS playlist (/hls/<name>/index.m3u8), or CachedFile for one of its
+    lazily encoded segments (/hls/<name>/<n>.m4s and /hls/<name>/<n>.init.mp4)"""
+    name, _, resource = unquote(urlparse(url).path)[len('/hls/'):].rpartition('/')
+    source, query = resolve_request(catalog, url, '/hls/', name)
+    profile_name = query.get('profile', [''])[0]
+    encode_args = _request_profile(query)['args']
+
+    seconds = SEGMENT_SECONDS
+    key = cache.key(source, encode_args + ('hls', seconds))
+    version = key[:12]
+    duration = cache.keyframes(source)['duration']
+    if not duration:
+        raise RequestError(502, "Duration unknown (is ffprobe installed?)")
+
+    if resource == 'index.m3u8':
+        # Segment URIs carry the cache version, so a segment URL never changes content
+        segment_query = {'path': query.get('path', [name])[0], 'v': version}
+        if profile_name:
+            segment_query['profile'] = profile_name
+        playlist = hls_playlist(duration, seconds, '?' + urlencode(segment_query))
+        return Response(playlist.encode('utf-8'), 'application/vnd.apple.mpegurl',
+                        headers=[('Cache-Control', 'no-cache')])
+
+    match = re.fullmatch(r'(\d+)\.(m4s|init\.mp4)', resource)
+    number = int(match.group(1)) if match else -1
+    if not 0 <= number < segment_count(duration, seconds):
+        raise RequestError(404, f"No such segment: {resource}")
+
+    # Segments are cached as (init path, media path)
+    part = 1 if match.group(2) == 'm4s' else 0
+    segment = cache.segment(source, number, seconds, encode_args)
+    immutable = query.get('v', [''])[0] == version
+    return CachedFile(
+        segment[part] if segment else None,
+        f'"{version}-{resource}"',
+        cache_control='public, max-age=31536000, immutable' if immutable else 'no-cache',
+        job_key=f'{key}:{number}',
+        render=lambda: cache.encode_segment(source, number, seconds, encode_args)[part],
+        failure=f"Segment {number} of {source}",
+        error="Segment encode failed",
+    )
+
+
+def still_request(cache, catalog, url, kind):
+    """CachedFile for a poster frame (/thumb/<name>) or scrub sprite sheet (/sprite/<name>),
+    rendered once; /sprite/<name>?layout=1 returns the sheet geometry as a JSON Response"""
+    source, query = resolve_request(catalog, url, f'/{kind}/')
+    duration = cache.keyframes(source)['duration']
+    if kind == 'sprite':
+        if not duration:
+            raise RequestError(502, "Duration unknown (is ffprobe installed?)")
+        if query.get('layout'):
+            return json_response(sprite_layout(duration))
+        command = lambda output: sprite_command(source, duration, output)
+    else:
+        # Same position the browser-side thumbnails use
+        command = lambda output: poster_command(source, (duration or 0) * 0.25, output)
+
+    path = cache.still_path(source, kind)
+    return CachedFile(
+        path if os.path.isfile(path) else None,
+        name_etag(path),
+        content_type='image/jpeg',
+        cache_control=f'public, max-age={STILL_MAX_AGE}',
+        job_key=path,
+        render=lambda: cache.render_still(source, kind, command),
+        failure=f"Rendering {kind} of {source}",
+        error=f"Could not render {kind}",
+    )
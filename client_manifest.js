@@ -0,0 +1,80 @@
+// Client install manifest served by server.py
+// Pages through /manifest (compact rows of [path, size, mtime, type]) so the file
+// tree can be built without the browser enumerating the install folder, and
+// fetches a file's bytes from /client/<path> only when it is opened. Until then a
+// file entry carries a placeholder with the name, size and lastModified of the
+// real File, which is all the listings need.
+
+window.ClientManifest = (() => {
+    const PAGE_SIZE = 10000;
+
+    const encodePath = (path) => path.split('/').map(encodeURIComponent).join('/');
+
+    // Fetch every row under prefix, awaiting onPage(rows, page) as each page arrives; if it
+    // resolves false the load stops and returns null. If the server rescans mid-way
+    // (generation changes) the listing starts over from offset 0.
+    const load = async ({ baseUrl = '', prefix = '', onPage = () => {} } = {}) => {
+        for (let attempt = 0; attempt < 3; attempt++) {
+            let offset = 0;
+            let generation = null;
+            let restarted = false;
+            let page;
+            do {
+                const query = `format=compact&prefix=${encodeURIComponent(prefix)}&offset=${offset}&limit=${PAGE_SIZE}`;
+                const response = await fetch(`${baseUrl}/manifest?${query}`);
+                if (!response.ok) {
+                    throw new Error(`Manifest request failed: ${response.status} ${response.statusText}`);
+                }
+                page = await response.json();
+                if (generation !== null && page.generation !== generation) {
+                    restarted = true;
+                    break;
+                }
+                generation = page.generation;
+                if (await onPage(page.rows, page) === false) {
+                    return null;
+                }
+                offset += page.rows.length;
+            } while (page.rows.length > 0 && offset < page.count);
+            if (!restarted) {
+                return { count: page.count, generation, types: page.types };
+            }
+        }
+        throw new Error('Client manifest kept changing while it was loading');
+    };
+
+    // File-tree entry for a manifest row; `file` is a placeholder until resolve()
+    const fileInfo = ([path, size, mtime, type], baseUrl = '') => ({
+        type: 'file',
+        file: { name: path.split('/').pop(), size, lastModified: Math.round(mtime * 1000), remote: true },
+        url: `${baseUrl}/client/${encodePath(path)}`,
+        fileType: type
+    });
+
+    // Real File for an entry, downloaded once and kept on the entry
+    const resolve = (info) => {
+        if (!info.url || info.file instanceof Blob) {
+            return Promise.resolve(info.file);
+        }
+        if (!info.pending) {
+            const { name, lastModified } = info.file;
+            info.pending = fetch(info.url)
+                .then(response => {
+                    if (!response.ok) {
+                        throw new Error(`Could not fetch ${name}: ${response.status}`);
+                    }
+                    return response.blob();
+                })
+                .then(blob => {
+                    info.file = new File([blob], name, { lastModified });
+                    return info.file;
+                })
+                .finally(() => {
+                    info.pending = null;
+                });
+        }
+        return info.pending;
+    };
+
+    return { load, fileInfo, resolve, PAGE_SIZE };
+})();
@@ -0,0 +1,182 @@
+#!/usr/bin/env python3
+"""
+Bulk PKB extractor for the Matrix Online Modding Suite
+Extracts every entry of every PKB archive under a client directory, in parallel,
+either to a directory tree or to a content-addressed store
+"""
+
+import argparse
+import hashlib
+import json
+import os
+import sys
+import time
+from concurrent.futures import ProcessPoolExecutor, as_completed
+
+import pkb
+
+# Archives are split into tasks of roughly this many bytes so that one large
+# worlds_*.pkb does not end up on a single worker
+TASK_BYTES = 256 * 1024 * 1024
+
+_worker_index = None
+
+
+def find_packmap(client_dir):
+    """Locate packmap_save.lta inside a client directory"""
+    for root, _, files in os.walk(client_dir):
+        for file in files:
+            if file.lower() == 'packmap_save.lta':
+                return os.path.join(root, file)
+    return None
+
+
+def safe_entry_path(output_dir, name):
+    """Destination for an entry name, refusing names that escape output_dir"""
+    parts = [p for p in name.replace('\\', '/').split('/') if p not in ('', '.')]
+    if not parts or '..' in parts:
+        return None
+    return os.path.join(output_dir, *parts)
+
+
+def write_file(path, data):
+    """Write data atomically (temp file + rename) so interrupted runs never leave partial files"""
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    tmp_path = f'{path}.{os.getpid()}.tmp'
+    with open(tmp_path, 'wb') as f:
+        f.write(data)
+    os.replace(tmp_path, path)
+
+
+def plan_tasks(archive_paths, index, task_bytes=TASK_BYTES):
+    """Split each archive's entries into (archive path, [entry indices], bytes) tasks"""
+    tasks = []
+    for path in archive_paths:
+        name = os.path.basename(path)
+        archive_size = os.path.getsize(path)
+        batch, batch_bytes = [], 0
+        for i in index.entries_for_pkb(name):
+            batch.append(i)
+            batch_bytes += min(index.sizes[i], max(0, archive_size - index.offsets[i]))
+            if batch_bytes >= task_bytes:
+                tasks.append((path, batch, batch_bytes))
+                batch, batch_bytes = [], 0
+        if batch:
+            tasks.append((path, batch, batch_bytes))
+    # Largest first keeps the pool busy until the end
+    tasks.sort(key=lambda task: task[2], reverse=True)
+    return tasks
+
+
+def _init_worker(index_path):
+    """Parse the packmap index once per worker process"""
+    global _worker_index
+    _worker_index = pkb.load_packmap(index_path)
+
+
+def extract_task(archive_path, entry_ids, output_dir, store, skip_existing):
+    """Extract one batch of entries; returns (archive name, stats, {entry name: sha1})"""
+    stats = {'entries': 0, 'bytes': 0, 'skipped': 0, 'rejected': 0}
+    hashes = {}
+    archive_stem = os.path.splitext(os.path.basename(archive_path))[0]
+
+    with pkb.PKBArchive(archive_path, _worker_index) as archive:
+        for i in entry_ids:
+            name = _worker_index.names[i]
+            with archive.view(i) as view:
+                if store:
+                    digest = hashlib.sha1(view).hexdigest()
+                    hashes[name] = digest
+                    path = os.path.join(output_dir, 'objects', digest[:2], digest[2:])
+                else:
+                    path = safe_entry_path(os.path.join(output_dir, archive_stem), name)
+                    if path is None:
+                        stats['rejected'] += 1
+                        continue
+
+                if (store or skip_existing) and os.path.exists(path) and os.path.getsize(path) == len(view):
+                    stats['skipped'] += 1
+                else:
+                    write_file(path, view)
+                stats['entries'] += 1
+                stats['bytes'] += len(view)
+
+        return archive.name, stats, hashes
+
+
+def run_extraction(client_dir, index_path, output_dir, store=False, jobs=None, skip_existing=False):
+    """Extract every indexed entry of every PKB under client_dir; returns the totals"""
+    index = pkb.load_packmap(index_path)
+    archive_paths = sorted(
+        os.path.join(root, file)
+        for root, _, files in os.walk(client_dir)
+        for file in files if file.lower().endswith('.pkb')
+    )
+    tasks = plan_tasks(archive_paths, index)
+    total_bytes = sum(task[2] for task in tasks)
+
+    print(f"📦 {len(archive_paths)} archives, {len(index)} index entries ({index.format})")
+    print(f"🚀 {len(tasks)} tasks, {total_bytes / 1024 / 1024:.1f} MB on {jobs or os.cpu_count()} workers")
+
+    totals = {'entries': 0, 'bytes': 0, 'skipped': 0, 'rejected': 0}
+    manifest = {}
+    start_time = time.perf_counter()
+
+    with ProcessPoolExecutor(max_workers=jobs, initializer=_init_worker, initargs=(index_path,)) as pool:
+        futures = [
+            pool.submit(extract_task, path, entry_ids, output_dir, store, skip_existing)
+            for path, entry_ids, _ in tasks
+        ]
+        for done, future in enumerate(as_completed(futures), 1):
+            archive_name, stats, hashes = future.result()
+            for key in totals:
+                totals[key] += stats[key]
+            manifest.setdefault(archive_name, {}).update(hashes)
+
+            elapsed = time.perf_counter() - start_time
+            rate = totals['bytes'] / 1024 / 1024 / elapsed if elapsed else 0
+            percent = totals['bytes'] / total_bytes * 100 if total_bytes else 100
+            print(f"[{done}/{len(tasks)}] {archive_name}: {stats['entries']} entries, "
+                  f"{stats['bytes'] / 1024 / 1024:.1f} MB | total {percent:.1f}% at {rate:.1f} MB/s")
+
+    if store:
+        write_file(os.path.join(output_dir, 'manifest.json'), json.dumps(manifest, indent=1).encode('utf-8'))
+
+    totals['seconds'] = time.perf_counter() - start_time
+    return totals
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Extract all PKB archives of a Matrix Online client install')
+    parser.add_argument('client_dir', help='Matrix Online client directory')
+    parser.add_argument('-o', '--output', default='extracted', help='Output directory (default: extracted)')
+    parser.add_argument('-i', '--index', help='packmap_save.lta (default: found inside client_dir)')
+    parser.add_argument('-j', '--jobs', type=int, default=None, help='Worker processes (default: CPU count)')
+    parser.add_argument('--store', action='store_true',
+                        help='Write a content-addressed store (objects/<sha1>) plus manifest.json')
+    parser.add_argument('--skip-existing', action='store_true',
+                        help='Skip entries already extracted with the same size')
+    args = parser.parse_args()
+
+    index_path = args.index or find_packmap(args.client_dir)
+    if not index_path:
+        print(f"❌ packmap_save.lta not found in {args.client_dir}")
+        return 1
+
+    totals = run_extraction(args.client_dir, index_path, args.output,
+                            store=args.store, jobs=args.jobs, skip_existing=args.skip_existing)
+
+    seconds = totals['seconds']
+    print("\n" + "=" * 40)
+    print(f"✅ Extracted {totals['entries']} entries ({totals['bytes'] / 1024 / 1024:.1f} MB) in {seconds:.1f}s")
+    if seconds:
+        print(f"⚡ Throughput: {totals['bytes'] / 1024 / 1024 / seconds:.1f} MB/s, {totals['entries'] / seconds:.0f} entries/s")
+    if totals['skipped']:
+        print(f"⏭️ {totals['skipped']} entries already present")
+    if totals['rejected']:
+        print(f"⚠️ {totals['rejected']} entries rejected (unsafe path)")
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
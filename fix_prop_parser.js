@@ -269,25 +269,29 @@ window.renderPROPModel = function(parsedData, scene, camera, renderer) {
     
     // Create geometry
     const geometry = new THREE.BufferGeometry();
+    // Typed-array geometry from the parsers is wrapped as-is; plain arrays are copied once
+    const floatAttribute = (array, itemSize) => array instanceof Float32Array
+        ? new THREE.BufferAttribute(array, itemSize)
+        : new THREE.Float32BufferAttribute(array, itemSize);
     
     // Set vertices
     if (parsedData.vertices && parsedData.vertices.length > 0) {
-        geometry.setAttribute('position', new THREE.Float32BufferAttribute(parsedData.vertices, 3));
+        geometry.setAttribute('position', floatAttribute(parsedData.vertices, 3));
     }
     
     // Set indices
     if (parsedData.indices && parsedData.indices.length > 0) {
-        geometry.setIndex(parsedData.indices);
+        geometry.setIndex(Array.isArray(parsedData.indices) ? parsedData.indices : new THREE.BufferAttribute(parsedData.indices, 1));
     }
     
     // Set UVs
     if (parsedData.uvs && parsedData.uvs.length > 0) {
-        geometry.setAttribute('uv', new THREE.Float32BufferAttribute(parsedData.uvs, 2));
+        geometry.setAttribute('uv', floatAttribute(parsedData.uvs, 2));
     }
     
     // Set normals
     if (parsedData.normals && parsedData.normals.length > 0) {
-        geometry.setAttribute('normal', new THREE.Float32BufferAttribute(parsedData.normals, 3));
+        geometry.setAttribute('normal', floatAttribute(parsedData.normals, 3));
     } else {
         geometry.computeVertexNormals();
     }
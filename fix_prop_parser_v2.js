@@ -1,144 +1,155 @@
 // Enhanced PROP file parser V2 for Matrix Online
 // Based on complete documentation and reverse engineering findings
 
-window.enhancedPROPParserV2 = async function(file) {
-    console.log(`🔧 Enhanced PROP Parser V2: Processing ${file.name} (${file.size} bytes)`);
-    
-    return new Promise((resolve, reject) => {
-        const reader = new FileReader();
-        reader.onload = (e) => {
-            try {
-                const buffer = e.target.result;
-                const dataView = new DataView(buffer);
-                const uint8Array = new Uint8Array(buffer);
-                
-                // Log first 256 bytes for analysis
-                console.log('📄 PROP file header (first 256 bytes):');
-                const headerHex = Array.from(uint8Array.slice(0, 256))
-                    .map(b => b.toString(16).padStart(2, '0'))
-                    .join(' ');
-                console.log(headerHex);
-                
-                // Check for PROP signature at 0x00
-                const signature = String.fromCharCode(...uint8Array.slice(0, 4));
-                console.log(`🔮 File signature: "${signature}"`);
-                
-                // Initialize data arrays
-                const vertices = [];
-                const indices = [];
-                const uvs = [];
-                const normals = [];
+// Parse a PROP file from its ArrayBuffer. Uses no DOM APIs, so lithtech_parser_worker.js
+// can run it off the main thread.
+window.parsePROPBufferV2 = function(buffer, fileName = 'unknown.prop') {
+    console.log(`🔧 Enhanced PROP Parser V2: Processing ${fileName} (${buffer.byteLength} bytes)`);
+    
+    const dataView = new DataView(buffer);
+    const uint8Array = new Uint8Array(buffer);
+    
+    // Log first 256 bytes for analysis
+    console.log('📄 PROP file header (first 256 bytes):');
+    const headerHex = Array.from(uint8Array.slice(0, 256))
+        .map(b => b.toString(16).padStart(2, '0'))
+        .join(' ');
+    console.log(headerHex);
+    
+    // Check for PROP signature at 0x00
+    const signature = String.fromCharCode(...uint8Array.slice(0, 4));
+    console.log(`🔮 File signature: "${signature}"`);
+    
+    // Geometry is written into typed arrays preallocated from the header counts,
+    // then trimmed to the entries that passed validation
+    let vertices = new Float32Array(0);
+    let indices = new Uint32Array(0);
+    let uvs = new Float32Array(0);
+    let normals = new Float32Array(0);
+    
+    if (signature === 'PROP') {
+        console.log('✅ Valid PROP signature detected');
+        
+        // Based on documentation:
+        // Header is 136 bytes (0x88)
+        // Vertex count at 0x80
+        // Face count at 0x84
+        
+        const vertexCount = dataView.getUint32(0x80, true);
+        const faceCount = dataView.getUint32(0x84, true);
+        
+        console.log(`📊 Vertex count: ${vertexCount}, Face count: ${faceCount}`);
+        
+        // Validate counts
+        if (vertexCount > 0 && vertexCount < 100000 && faceCount > 0 && faceCount < 100000) {
+            let offset = 0x88; // Start after header
+            
+            // Read vertices (3 floats per vertex)
+            console.log(`📍 Reading ${vertexCount} vertices from offset 0x${offset.toString(16)}`);
+            vertices = new Float32Array(Math.min(vertexCount, Math.max(0, Math.floor((buffer.byteLength - offset) / 12))) * 3);
+            let vertexFloats = 0;
+            for (let i = 0; i < vertexCount && offset + 12 <= buffer.byteLength; i++) {
+                let x = dataView.getFloat32(offset, true);
+                let y = dataView.getFloat32(offset + 4, true);
+                let z = dataView.getFloat32(offset + 8, true);
                 
-                if (signature === 'PROP') {
-                    console.log('✅ Valid PROP signature detected');
-                    
-                    // Based on documentation:
-                    // Header is 136 bytes (0x88)
-                    // Vertex count at 0x80
-                    // Face count at 0x84
+                // Validate vertex data
+                if (!isNaN(x) && !isNaN(y) && !isNaN(z) && 
+                    Math.abs(x) < 100000 && Math.abs(y) < 100000 && Math.abs(z) < 100000) {
                     
-                    const vertexCount = dataView.getUint32(0x80, true);
-                    const faceCount = dataView.getUint32(0x84, true);
+                    // CRITICAL FIX 1: Convert from centimeters to meters
+                    x *= 0.01;
+                    y *= 0.01;
+                    z *= 0.01;
                     
-                    console.log(`📊 Vertex count: ${vertexCount}, Face count: ${faceCount}`);
+                    // CRITICAL FIX 2: Lithtech to three.js coordinate system
+                    // Lithtech may use Z-up, three.js uses Y-up
+                    // Try swapping Y and Z
+                    vertices[vertexFloats++] = x;
+                    vertices[vertexFloats++] = z;
+                    vertices[vertexFloats++] = -y; // Note: negating Y for proper orientation
                     
-                    // Validate counts
-                    if (vertexCount > 0 && vertexCount < 100000 && faceCount > 0 && faceCount < 100000) {
-                        let offset = 0x88; // Start after header
-                        
-                        // Read vertices (3 floats per vertex)
-                        console.log(`📍 Reading ${vertexCount} vertices from offset 0x${offset.toString(16)}`);
-                        for (let i = 0; i < vertexCount && offset + 12 <= buffer.byteLength; i++) {
-                            let x = dataView.getFloat32(offset, true);
-                            let y = dataView.getFloat32(offset + 4, true);
-                            let z = dataView.getFloat32(offset + 8, true);
-                            
-                            // Validate vertex data
-                            if (!isNaN(x) && !isNaN(y) && !isNaN(z) && 
-                                Math.abs(x) < 100000 && Math.abs(y) < 100000 && Math.abs(z) < 100000) {
-                                
-                                // CRITICAL FIX 1: Convert from centimeters to meters
-                                x *= 0.01;
-                                y *= 0.01;
-                                z *= 0.01;
-                                
-                                // CRITICAL FIX 2: Lithtech to three.js coordinate system
-                                // Lithtech may use Z-up, three.js uses Y-up
-                                // Try swapping Y and Z
-                                vertices.push(x, z, -y); // Note: negating Y for proper orientation
-                                
-                            } else {
-                                console.warn(`⚠️ Invalid vertex at index ${i}: (${x}, ${y}, ${z})`);
-                            }
-                            offset += 12;
-                        }
-                        
-                        // Read face indices
-                        console.log(`📐 Reading ${faceCount} faces from offset 0x${offset.toString(16)}`);
-                        for (let i = 0; i < faceCount && offset + 12 <= buffer.byteLength; i++) {
-                            const a = dataView.getUint32(offset, true);
-                            const b = dataView.getUint32(offset + 4, true);
-                            const c = dataView.getUint32(offset + 8, true);
-                            
-                            // Validate indices
-                            if (a < vertexCount && b < vertexCount && c < vertexCount) {
-                                // CRITICAL FIX 3: Reverse face winding for three.js
-                                // Lithtech may use different winding order
-                                indices.push(a, c, b); // Reversed from a, b, c
-                            } else {
-                                console.warn(`⚠️ Invalid face indices at ${i}: (${a}, ${b}, ${c})`);
-                            }
-                            offset += 12;
-                        }
-                        
-                        // Try to read UV coordinates if space allows
-                        if (offset + vertexCount * 8 <= buffer.byteLength) {
-                            console.log(`🎨 Reading UV coordinates from offset 0x${offset.toString(16)}`);
-                            for (let i = 0; i < vertexCount; i++) {
-                                const u = dataView.getFloat32(offset, true);
-                                const v = dataView.getFloat32(offset + 4, true);
-                                if (!isNaN(u) && !isNaN(v)) {
-                                    // UV coordinates might need flipping
-                                    uvs.push(u, 1.0 - v); // Flip V coordinate
-                                }
-                                offset += 8;
-                            }
-                        }
-                        
-                        // Try to read normals if space allows
-                        if (offset + vertexCount * 12 <= buffer.byteLength) {
-                            console.log(`🔦 Reading normals from offset 0x${offset.toString(16)}`);
-                            for (let i = 0; i < vertexCount; i++) {
-                                let nx = dataView.getFloat32(offset, true);
-                                let ny = dataView.getFloat32(offset + 4, true);
-                                let nz = dataView.getFloat32(offset + 8, true);
-                                
-                                // Apply same coordinate transformation as vertices
-                                const tempNormal = [nx, nz, -ny];
-                                
-                                // Normalize
-                                const length = Math.sqrt(tempNormal[0]**2 + tempNormal[1]**2 + tempNormal[2]**2);
-                                if (length > 0.01) {
-                                    normals.push(
-                                        tempNormal[0]/length,
-                                        tempNormal[1]/length,
-                                        tempNormal[2]/length
-                                    );
-                                }
-                                offset += 12;
-                            }
-                        }
-                    }
                 } else {
-                    console.warn('⚠️ No PROP signature found, file may be corrupted or different format');
+                    console.warn(`⚠️ Invalid vertex at index ${i}: (${x}, ${y}, ${z})`);
                 }
+                offset += 12;
+            }
+            vertices = trimGeometryArray(vertices, vertexFloats);
+            
+            // Read face indices
+            console.log(`📐 Reading ${faceCount} faces from offset 0x${offset.toString(16)}`);
+            const IndexArray = vertexCount <= 65536 ? Uint16Array : Uint32Array;
+            indices = new IndexArray(Math.min(faceCount, Math.max(0, Math.floor((buffer.byteLength - offset) / 12))) * 3);
+            let indexCount = 0;
+            for (let i = 0; i < faceCount && offset + 12 <= buffer.byteLength; i++) {
+                const a = dataView.getUint32(offset, true);
+                const b = dataView.getUint32(offset + 4, true);
+                const c = dataView.getUint32(offset + 8, true);
                 
-                // Generate normals if not found
-                if (normals.length === 0 && vertices.length > 0 && indices.length > 0) {
-                    console.log('🔧 No normals found, will compute in three.js');
+                // Validate indices
+                if (a < vertexCount && b < vertexCount && c < vertexCount) {
+                    // CRITICAL FIX 3: Reverse face winding for three.js
+                    // Lithtech may use different winding order
+                    indices[indexCount++] = a; // Reversed from a, b, c
+                    indices[indexCount++] = c;
+                    indices[indexCount++] = b;
+                } else {
+                    console.warn(`⚠️ Invalid face indices at ${i}: (${a}, ${b}, ${c})`);
                 }
-                
-                console.log(`
+                offset += 12;
+            }
+            indices = trimGeometryArray(indices, indexCount);
+            
+            // Try to read UV coordinates if space allows
+            if (offset + vertexCount * 8 <= buffer.byteLength) {
+                console.log(`🎨 Reading UV coordinates from offset 0x${offset.toString(16)}`);
+                uvs = new Float32Array(vertexCount * 2);
+                let uvFloats = 0;
+                for (let i = 0; i < vertexCount; i++) {
+                    const u = dataView.getFloat32(offset, true);
+                    const v = dataView.getFloat32(offset + 4, true);
+                    if (!isNaN(u) && !isNaN(v)) {
+                        // UV coordinates might need flipping
+                        uvs[uvFloats++] = u;
+                        uvs[uvFloats++] = 1.0 - v; // Flip V coordinate
+                    }
+                    offset += 8;
+                }
+                uvs = trimGeometryArray(uvs, uvFloats);
+            }
+            
+            // Try to read normals if space allows
+            if (offset + vertexCount * 12 <= buffer.byteLength) {
+                console.log(`🔦 Reading normals from offset 0x${offset.toString(16)}`);
+                normals = new Float32Array(vertexCount * 3);
+                let normalFloats = 0;
+                for (let i = 0; i < vertexCount; i++) {
+                    let nx = dataView.getFloat32(offset, true);
+                    let ny = dataView.getFloat32(offset + 4, true);
+                    let nz = dataView.getFloat32(offset + 8, true);
+                    
+                    // Apply same coordinate transformation as vertices, then normalize
+                    const length = Math.sqrt(nx * nx + ny * ny + nz * nz);
+                    if (length > 0.01) {
+                        normals[normalFloats++] = nx / length;
+                        normals[normalFloats++] = nz / length;
+                        normals[normalFloats++] = -ny / length;
+                    }
+                    offset += 12;
+                }
+                normals = trimGeometryArray(normals, normalFloats);
+            }
+        }
+    } else {
+        console.warn('⚠️ No PROP signature found, file may be corrupted or different format');
+    }
+    
+    // Generate normals if not found
+    if (normals.length === 0 && vertices.length > 0 && indices.length > 0) {
+        console.log('🔧 No normals found, will compute in three.js');
+    }
+    
+    console.log(`
 📊 === PROP PARSING RESULTS ===
 ✅ Vertices: ${vertices.length / 3}
 ✅ Faces: ${indices.length / 3}
@@ -147,52 +158,56 @@ window.enhancedPROPParserV2 = async function(file) {
 📏 Bounds: ${vertices.length > 0 ? calculateBounds(vertices) : 'N/A'}
 🔄 Coordinate system: Converted from Lithtech (Z-up) to three.js (Y-up)
 📐 Face winding: Reversed for three.js compatibility
-                `);
-                
-                resolve({
-                    type: 'model',
-                    vertices: vertices,
-                    indices: indices,
-                    uvs: uvs,
-                    normals: normals,
-                    animations: [],
-                    materials: [{
-                        name: 'default',
-                        color: 0x808080,
-                        metalness: 0.3,
-                        roughness: 0.7,
-                        emissive: 0x101010,
-                        side: 'double' // Important for debugging
-                    }],
-                    metadata: {
-                        format: 'PROP',
-                        description: 'Matrix Online static prop (fixed coordinate system)',
-                        vertexCount: vertices.length / 3,
-                        faceCount: indices.length / 3,
-                        hasUVs: uvs.length > 0,
-                        hasNormals: normals.length > 0,
-                        engine: 'Modified Lithtech Discovery',
-                        scale: 'Converted from cm to meters',
-                        coordinateSystem: 'Converted from Lithtech to three.js',
-                        signature: signature,
-                        fileSize: buffer.byteLength,
-                        headerSize: 0x88,
-                        vertexOffset: 0x88,
-                        exportable: true
-                    }
-                });
-                
-            } catch (error) {
-                console.error('❌ Error in enhanced PROP parser V2:', error);
-                reject(error);
-            }
-        };
-        
-        reader.onerror = reject;
-        reader.readAsArrayBuffer(file);
-    });
+    `);
+    
+    return {
+        type: 'model',
+        vertices: vertices,
+        indices: indices,
+        uvs: uvs,
+        normals: normals,
+        animations: [],
+        materials: [{
+            name: 'default',
+            color: 0x808080,
+            metalness: 0.3,
+            roughness: 0.7,
+            emissive: 0x101010,
+            side: 'double' // Important for debugging
+        }],
+        metadata: {
+            format: 'PROP',
+            description: 'Matrix Online static prop (fixed coordinate system)',
+            vertexCount: vertices.length / 3,
+            faceCount: indices.length / 3,
+            hasUVs: uvs.length > 0,
+            hasNormals: normals.length > 0,
+            engine: 'Modified Lithtech Discovery',
+            scale: 'Converted from cm to meters',
+            coordinateSystem: 'Converted from Lithtech to three.js',
+            signature: signature,
+            fileSize: buffer.byteLength,
+            headerSize: 0x88,
+            vertexOffset: 0x88,
+            exportable: true
+        }
+    };
 };
 
+window.enhancedPROPParserV2 = async function(file) {
+    try {
+        return window.parsePROPBufferV2(await file.arrayBuffer(), file.name);
+    } catch (error) {
+        console.error('❌ Error in enhanced PROP parser V2:', error);
+        throw error;
+    }
+};
+
+// Trim a preallocated geometry array to the number of values actually written (no copy)
+function trimGeometryArray(array, length) {
+    return length === array.length ? array : array.subarray(0, length);
+}
+
 // Helper function to calculate bounds
 function calculateBounds(vertices) {
     let minX = Infinity, minY = Infinity, minZ = Infinity;
@@ -234,10 +249,14 @@ window.renderPROPModelV2 = function(parsedData, scene, camera, renderer, options
     
     // Create geometry
     const geometry = new THREE.BufferGeometry();
+    // Typed-array geometry from the parsers is wrapped as-is; plain arrays are copied once
+    const floatAttribute = (array, itemSize) => array instanceof Float32Array
+        ? new THREE.BufferAttribute(array, itemSize)
+        : new THREE.Float32BufferAttribute(array, itemSize);
     
     // Set vertices
     if (parsedData.vertices && parsedData.vertices.length > 0) {
-        geometry.setAttribute('position', new THREE.Float32BufferAttribute(parsedData.vertices, 3));
+        geometry.setAttribute('position', floatAttribute(parsedData.vertices, 3));
     } else {
         console.error('No vertices to render!');
         return null;
@@ -245,17 +264,17 @@ window.renderPROPModelV2 = function(parsedData, scene, camera, renderer, options
     
     // Set indices
     if (parsedData.indices && parsedData.indices.length > 0) {
-        geometry.setIndex(parsedData.indices);
+        geometry.setIndex(Array.isArray(parsedData.indices) ? parsedData.indices : new THREE.BufferAttribute(parsedData.indices, 1));
     }
     
     // Set UVs
     if (parsedData.uvs && parsedData.uvs.length > 0) {
-        geometry.setAttribute('uv', new THREE.Float32BufferAttribute(parsedData.uvs, 2));
+        geometry.setAttribute('uv', floatAttribute(parsedData.uvs, 2));
     }
     
     // Set normals or compute them
     if (parsedData.normals && parsedData.normals.length > 0) {
-        geometry.setAttribute('normal', new THREE.Float32BufferAttribute(parsedData.normals, 3));
+        geometry.setAttribute('normal', floatAttribute(parsedData.normals, 3));
     } else {
         console.log('Computing vertex normals...');
         geometry.computeVertexNormals();
@@ -0,0 +1,45 @@
+#!/usr/bin/env python3
+"""
+HTTP header helpers shared by server.py and the BIK proxies
+(simple-bik-server.py and async-bik-server.py)
+"""
+
+
+def etag_matches(header, etag):
+    """Whether an If-None-Match header matches etag (weak comparison, as RFC 9110 requires for it)"""
+    if not header:
+        return False
+    if header.strip() == '*':
+        return True
+    tags = (tag.strip() for tag in header.split(','))
+    return etag in (tag[2:] if tag.startswith('W/') else tag for tag in tags)
+
+
+def parse_range(header, size):
+    """Parse a single-range 'bytes=' header against a body of `size` bytes.
+
+    Returns (start, end) inclusive, or None when the whole body should be sent
+    (no header, malformed or multi-range). Raises ValueError if unsatisfiable.
+    """
+    if not header or not header.startswith('bytes=') or ',' in header:
+        return None
+
+    start, sep, end = header[len('bytes='):].strip().partition('-')
+    if not sep or not (start.isdigit() or not start) or not (end.isdigit() or not end):
+        return None
+
+    if not start:
+        # Suffix range: the last N bytes
+        if not end:
+            return None
+        if int(end) == 0:
+            raise ValueError('empty suffix range')
+        return max(0, size - int(end)), size - 1
+
+    start = int(start)
+    end = int(end) if end else size - 1
+    if start >= size:
+        raise ValueError('range not satisfiable')
+    if end < start:
+        return None
+    return start, min(end, size - 1)
@@ -0,0 +1,171 @@
+// Persistent cache of parsed Lithtech models
+// Parsed geometry is stored in IndexedDB keyed by (parser kind, parser version,
+// file size, SHA-1 of the bytes), so reopening a model - or the same model after a
+// page reload - skips the parser entirely. Entries are evicted least recently used
+// first once the stored geometry exceeds maxBytes.
+// Without IndexedDB or crypto.subtle (e.g. opened from file://) every call parses.
+
+window.LithtechModelCache = (() => {
+    const DB_NAME = 'moms-model-cache';
+    const DB_VERSION = 1;
+    // `entries` holds { key, name, bytes, lastUsed } so eviction can walk it without
+    // loading geometry; `models` holds the parsed model under the same key
+    const ENTRIES = 'entries';
+    const MODELS = 'models';
+    const GEOMETRY_KEYS = ['vertices', 'indices', 'normals', 'uvs'];
+
+    let maxBytes = 256 * 1024 * 1024;
+    let dbPromise = null;
+    const stats = { hits: 0, misses: 0, evicted: 0, errors: 0 };
+
+    const available = () => typeof indexedDB !== 'undefined' && !!(window.crypto && window.crypto.subtle);
+
+    const request = (req) => new Promise((resolve, reject) => {
+        req.onsuccess = () => resolve(req.result);
+        req.onerror = () => reject(req.error);
+    });
+
+    const transactionDone = (tx) => new Promise((resolve, reject) => {
+        tx.oncomplete = () => resolve();
+        tx.onerror = tx.onabort = () => reject(tx.error);
+    });
+
+    const openDatabase = () => {
+        if (!dbPromise) {
+            const req = indexedDB.open(DB_NAME, DB_VERSION);
+            req.onupgradeneeded = () => {
+                const db = req.result;
+                if (!db.objectStoreNames.contains(ENTRIES)) {
+                    db.createObjectStore(ENTRIES, { keyPath: 'key' }).createIndex('lastUsed', 'lastUsed');
+                }
+                if (!db.objectStoreNames.contains(MODELS)) {
+                    db.createObjectStore(MODELS);
+                }
+            };
+            dbPromise = request(req);
+        }
+        return dbPromise;
+    };
+
+    const sha1Hex = async (buffer) => {
+        const digest = new Uint8Array(await crypto.subtle.digest('SHA-1', buffer));
+        return Array.from(digest, byte => byte.toString(16).padStart(2, '0')).join('');
+    };
+
+    // Geometry that is a subarray of a larger buffer would be stored with the whole
+    // buffer, so those views are compacted first
+    const compactModel = (model) => {
+        const stored = { ...model };
+        let bytes = 0;
+        GEOMETRY_KEYS.forEach(key => {
+            const array = stored[key];
+            if (ArrayBuffer.isView(array)) {
+                if (array.byteLength !== array.buffer.byteLength) {
+                    stored[key] = array.slice();
+                }
+                bytes += array.byteLength;
+            } else if (Array.isArray(array)) {
+                bytes += array.length * 8;
+            }
+        });
+        delete stored.thumbnail;
+        return { stored, bytes };
+    };
+
+    const lookup = async (key) => {
+        const db = await openDatabase();
+        const tx = db.transaction([ENTRIES, MODELS], 'readwrite');
+        const entries = tx.objectStore(ENTRIES);
+        const entry = await request(entries.get(key));
+        if (!entry) return null;
+
+        const model = await request(tx.objectStore(MODELS).get(key));
+        if (model) {
+            entry.lastUsed = Date.now();
+            entries.put(entry);
+        }
+        await transactionDone(tx);
+        return model || null;
+    };
+
+    // Walk entries newest first and drop everything past the size cap
+    const evict = async (db) => {
+        const tx = db.transaction([ENTRIES, MODELS], 'readwrite');
+        const models = tx.objectStore(MODELS);
+        const cursorRequest = tx.objectStore(ENTRIES).index('lastUsed').openCursor(null, 'prev');
+        let total = 0;
+        cursorRequest.onsuccess = () => {
+            const cursor = cursorRequest.result;
+            if (!cursor) return;
+            total += cursor.value.bytes;
+            if (total > maxBytes) {
+                models.delete(cursor.value.key);
+                cursor.delete();
+                stats.evicted++;
+            }
+            cursor.continue();
+        };
+        await transactionDone(tx);
+    };
+
+    const store = async (key, name, model) => {
+        const { stored, bytes } = compactModel(model);
+        if (bytes > maxBytes) return;
+
+        const db = await openDatabase();
+        const tx = db.transaction([ENTRIES, MODELS], 'readwrite');
+        tx.objectStore(MODELS).put(stored, key);
+        tx.objectStore(ENTRIES).put({ key, name, bytes, lastUsed: Date.now() });
+        await transactionDone(tx);
+        await evict(db);
+    };
+
+    // Cache failures never break loading: log, count and fall back to parsing
+    const guarded = (promise) => promise.catch(error => {
+        stats.errors++;
+        console.warn('⚠️ Model cache unavailable:', error && (error.message || error));
+        return null;
+    });
+
+    return {
+        // Parse a model File of the given kind ('moa', 'prop' or 'mga'), served from the cache when possible
+        parse: async (kind, file) => {
+            if (!available()) {
+                return window.LithtechWorkerPool.parse(kind, file);
+            }
+
+            const buffer = await file.arrayBuffer();
+            const hash = await guarded(sha1Hex(buffer));
+            if (!hash) {
+                return window.LithtechWorkerPool.parse(kind, file, buffer);
+            }
+
+            const key = `${kind}:${window.MXOModelParsers.version}:${buffer.byteLength}:${hash}`;
+            const cached = await guarded(lookup(key));
+            if (cached) {
+                stats.hits++;
+                return cached;
+            }
+
+            stats.misses++;
+            const model = await window.LithtechWorkerPool.parse(kind, file, buffer);
+            // Stored before returning, so in-place edits by the viewer never reach the cache
+            await guarded(store(key, file.name, model));
+            return model;
+        },
+        // Remove every cached model
+        clear: async () => {
+            if (!available()) return;
+            const db = await openDatabase();
+            const tx = db.transaction([ENTRIES, MODELS], 'readwrite');
+            tx.objectStore(ENTRIES).clear();
+            tx.objectStore(MODELS).clear();
+            await transactionDone(tx);
+        },
+        // Change the size cap (bytes of stored geometry); takes effect on the next store
+        setMaxBytes: (bytes) => {
+            maxBytes = bytes;
+        },
+        stats: () => ({ ...stats, maxBytes, available: available() })
+    };
+})();
@@ -0,0 +1,531 @@
+// Lithtech model geometry parsers (MOA / PROP / MGA) for Matrix Online
+// Pure ArrayBuffer -> model data functions with no DOM access, shared by the main
+// thread and lithtech_parser_worker.js
+
+(function(global) {
+    // Bump whenever parser output changes, so cached models (lithtech_model_cache.js) are re-parsed
+    const PARSER_VERSION = 1;
+
+    const modelFormat = (fileName) => {
+        const name = fileName.toLowerCase();
+        if (name.endsWith('.moa')) return 'MOA';
+        if (name.endsWith('.prop')) return 'PROP';
+        if (name.endsWith('.iprf')) return 'IPRF';
+        if (name.endsWith('.eprf')) return 'EPRF';
+        if (name.endsWith('.mga')) return 'MGA';
+        if (name.endsWith('.mgc')) return 'MGC';
+        return 'MXO';
+    };
+
+    const modelDescription = (fileName, placeholder) => {
+        const name = fileName.toLowerCase();
+        if (name.endsWith('.moa')) return placeholder ? 'Character model (placeholder)' : 'Character model/clothing/vehicle';
+        if (name.endsWith('.prop')) return placeholder ? 'Static prop (placeholder)' : 'Static prop/object';
+        if (name.endsWith('.mga') || name.endsWith('.mgc')) return placeholder ? 'Model group (placeholder)' : 'Model group/collection';
+        if (name.endsWith('.iprf') || name.endsWith('.eprf')) return placeholder ? 'Specialized model (placeholder)' : 'Specialized model data';
+        return placeholder ? 'Matrix Online model (placeholder)' : 'Matrix Online model';
+    };
+
+    // Enhanced MXO model format parsing - Based on Lithtech Discovery engine
+    // Scale: 1 unit = 1 centimeter
+    const analyzeHeader = (buffer) => {
+        const header = new Uint8Array(buffer, 0, Math.min(256, buffer.byteLength));
+
+        // Check for common Lithtech signatures
+        const signatures = [
+            { name: 'MOA', bytes: [0x4D, 0x4F, 0x41] },      // MOA files (character models)
+            { name: 'PROP', bytes: [0x50, 0x52, 0x4F, 0x50] }, // PROP files (static objects)
+            { name: 'IPRF', bytes: [0x49, 0x50, 0x52, 0x46] }, // IPRF specialized data
+            { name: 'EPRF', bytes: [0x45, 0x50, 0x52, 0x46] }, // EPRF specialized data
+            { name: 'MGA', bytes: [0x4D, 0x47, 0x41] },        // MGA model group
+            { name: 'MGC', bytes: [0x4D, 0x47, 0x43] },        // MGC model collection
+            { name: 'LTMP', bytes: [0x4C, 0x54, 0x4D, 0x50] }, // LithTech Model Pack
+            { name: 'LTB', bytes: [0x4C, 0x54, 0x42] },        // LithTech Binary
+            { name: 'ABC', bytes: [0x41, 0x42, 0x43] }         // Actor Binary Cache
+        ];
+
+        for (const sig of signatures) {
+            let match = true;
+            for (let i = 0; i < sig.bytes.length; i++) {
+                if (header[i] !== sig.bytes[i]) {
+                    match = false;
+                    break;
+                }
+            }
+            if (match) {
+                return { signature: sig.name, headerSize: 16 };
+            }
+        }
+
+        return { signature: null, headerSize: 0 };
+    };
+
+    // Geometry arrays are preallocated from the header counts (clamped to the bytes
+    // actually present) and trimmed to what passed validation; subarray() is a view, not a copy
+    const fitCount = (count, available, stride) => Math.min(count, Math.max(0, Math.floor(available / stride)));
+    const trimTo = (array, length) => length === array.length ? array : array.subarray(0, length);
+    const indexArrayFor = (vertexCount) => vertexCount <= 65536 ? Uint16Array : Uint32Array;
+
+    // Try to read header information following instructions.txt structure
+    const parseStructuredData = (buffer, dataView, offset) => {
+        try {
+            // Assume 16-byte header as per instructions
+            let currentOffset = Math.max(16, offset);
+
+            // Try to read vertex and face counts (following instructions.txt example)
+            if (currentOffset + 8 <= buffer.byteLength) {
+                const numVertices = dataView.getUint32(currentOffset, true);
+                const numFaces = dataView.getUint32(currentOffset + 4, true);
+                currentOffset += 8;
+
+                // Validate counts are reasonable
+                if (numVertices > 0 && numVertices < 100000 && numFaces > 0 && numFaces < 200000) {
+                    const vertices = new Float32Array(fitCount(numVertices, buffer.byteLength - currentOffset, 12) * 3);
+                    let vertexFloats = 0;
+                    let normals;
+                    let uvs;
+
+                    // Read vertices (3 floats: x, y, z) as per instructions.txt
+                    for (let i = 0; i < numVertices && currentOffset + 12 <= buffer.byteLength; i++) {
+                        const x = dataView.getFloat32(currentOffset, true);
+                        const y = dataView.getFloat32(currentOffset + 4, true);
+                        const z = dataView.getFloat32(currentOffset + 8, true);
+
+                        // Validate vertex data
+                        if (!isNaN(x) && !isNaN(y) && !isNaN(z) &&
+                            Math.abs(x) < 10000 && Math.abs(y) < 10000 && Math.abs(z) < 10000) {
+                            // Apply MXO scale: 1 unit = 1cm, convert to meters for Three.js
+                            vertices[vertexFloats++] = x * 0.01;
+                            vertices[vertexFloats++] = y * 0.01;
+                            vertices[vertexFloats++] = z * 0.01;
+                        }
+                        currentOffset += 12;
+                    }
+
+                    // Read faces (3 integers: vertex indices) as per instructions.txt
+                    const faces = new (indexArrayFor(numVertices))(fitCount(numFaces, buffer.byteLength - currentOffset, 12) * 3);
+                    let faceIndices = 0;
+                    for (let i = 0; i < numFaces && currentOffset + 12 <= buffer.byteLength; i++) {
+                        const a = dataView.getUint32(currentOffset, true);
+                        const b = dataView.getUint32(currentOffset + 4, true);
+                        const c = dataView.getUint32(currentOffset + 8, true);
+
+                        // Validate indices
+                        if (a < numVertices && b < numVertices && c < numVertices) {
+                            faces[faceIndices++] = a;
+                            faces[faceIndices++] = b;
+                            faces[faceIndices++] = c;
+                        }
+                        currentOffset += 12;
+                    }
+
+                    // Try to read additional data (normals, UVs)
+                    if (currentOffset + numVertices * 12 <= buffer.byteLength) {
+                        // Read normals
+                        normals = new Float32Array(numVertices * 3);
+                        let normalFloats = 0;
+                        for (let i = 0; i < numVertices; i++) {
+                            const nx = dataView.getFloat32(currentOffset, true);
+                            const ny = dataView.getFloat32(currentOffset + 4, true);
+                            const nz = dataView.getFloat32(currentOffset + 8, true);
+
+                            if (!isNaN(nx) && !isNaN(ny) && !isNaN(nz)) {
+                                normals[normalFloats++] = nx;
+                                normals[normalFloats++] = ny;
+                                normals[normalFloats++] = nz;
+                            }
+                            currentOffset += 12;
+                        }
+                        normals = trimTo(normals, normalFloats);
+                    }
+
+                    if (currentOffset + numVertices * 8 <= buffer.byteLength) {
+                        // Read UVs
+                        uvs = new Float32Array(numVertices * 2);
+                        let uvFloats = 0;
+                        for (let i = 0; i < numVertices; i++) {
+                            const u = dataView.getFloat32(currentOffset, true);
+                            const v = dataView.getFloat32(currentOffset + 4, true);
+
+                            if (!isNaN(u) && !isNaN(v)) {
+                                uvs[uvFloats++] = u;
+                                uvs[uvFloats++] = v;
+                            }
+                            currentOffset += 8;
+                        }
+                        uvs = trimTo(uvs, uvFloats);
+                    }
+
+                    return {
+                        vertices: trimTo(vertices, vertexFloats),
+                        indices: trimTo(faces, faceIndices),
+                        normals: normals && normals.length > 0 ? normals : undefined,
+                        uvs: uvs && uvs.length > 0 ? uvs : undefined,
+                        success: true
+                    };
+                }
+            }
+        } catch (error) {
+            // Structured parsing failed, fall through to the heuristics
+        }
+
+        return { success: false };
+    };
+
+    // MXO files often have data at specific offsets
+    // Try common offsets for Lithtech Discovery engine
+    const parseAtKnownOffsets = (buffer, dataView) => {
+        const tryOffsets = [0x40, 0x80, 0x100, 0x200, 0x400];
+
+        for (const testOffset of tryOffsets) {
+            if (testOffset + 8 <= buffer.byteLength) {
+                const possibleVertCount = dataView.getUint32(testOffset, true);
+                const possibleFaceCount = dataView.getUint32(testOffset + 4, true);
+
+                // Check if these are reasonable values
+                if (possibleVertCount > 3 && possibleVertCount < 50000 &&
+                    possibleFaceCount > 1 && possibleFaceCount < 100000) {
+
+                    // Try to parse from this offset
+                    let currentOffset = testOffset + 8;
+                    const vertices = new Float32Array(fitCount(possibleVertCount, buffer.byteLength - currentOffset, 12) * 3);
+                    let vertexFloats = 0;
+
+                    // Try to read vertices
+                    for (let i = 0; i < possibleVertCount && currentOffset + 12 <= buffer.byteLength; i++) {
+                        const x = dataView.getFloat32(currentOffset, true);
+                        const y = dataView.getFloat32(currentOffset + 4, true);
+                        const z = dataView.getFloat32(currentOffset + 8, true);
+
+                        if (!isNaN(x) && !isNaN(y) && !isNaN(z) &&
+                            Math.abs(x) < 10000 && Math.abs(y) < 10000 && Math.abs(z) < 10000) {
+                            // Apply MXO scale: 1 unit = 1cm, convert to meters for Three.js
+                            vertices[vertexFloats++] = x * 0.01;
+                            vertices[vertexFloats++] = y * 0.01;
+                            vertices[vertexFloats++] = z * 0.01;
+                            currentOffset += 12;
+                        } else {
+                            break;
+                        }
+                    }
+
+                    // If we got enough vertices, try reading faces
+                    if (vertexFloats / 3 >= possibleVertCount * 0.8) { // Allow some tolerance
+                        const faces = new (indexArrayFor(possibleVertCount))(
+                            fitCount(possibleFaceCount, buffer.byteLength - currentOffset, 12) * 3);
+                        let faceIndices = 0;
+                        for (let i = 0; i < possibleFaceCount && currentOffset + 12 <= buffer.byteLength; i++) {
+                            const a = dataView.getUint32(currentOffset, true);
+                            const b = dataView.getUint32(currentOffset + 4, true);
+                            const c = dataView.getUint32(currentOffset + 8, true);
+
+                            if (a < possibleVertCount && b < possibleVertCount && c < possibleVertCount) {
+                                faces[faceIndices++] = a;
+                                faces[faceIndices++] = b;
+                                faces[faceIndices++] = c;
+                                currentOffset += 12;
+                            } else {
+                                break;
+                            }
+                        }
+
+                        if (faceIndices / 3 >= possibleFaceCount * 0.5) { // Some tolerance for faces
+                            return {
+                                vertices: trimTo(vertices, vertexFloats),
+                                indices: trimTo(faces, faceIndices),
+                                success: true
+                            };
+                        }
+                    }
+                }
+            }
+        }
+
+        return { success: false };
+    };
+
+    // Scan for vertex data patterns when no structure could be recognised
+    const parseByPattern = (buffer, dataView) => {
+        const vertices = [];
+        const indices = [];
+
+        for (let i = 32; i < buffer.byteLength - 12; i += 4) {
+            const x = dataView.getFloat32(i, true);
+            const y = dataView.getFloat32(i + 4, true);
+            const z = dataView.getFloat32(i + 8, true);
+
+            // Look for reasonable vertex coordinates
+            if (!isNaN(x) && !isNaN(y) && !isNaN(z) &&
+                Math.abs(x) < 1000 && Math.abs(y) < 1000 && Math.abs(z) < 1000 &&
+                (Math.abs(x) > 0.001 || Math.abs(y) > 0.001 || Math.abs(z) > 0.001)) {
+                // Apply MXO scale: 1 unit = 1cm, convert to meters for Three.js
+                vertices.push(x * 0.01, y * 0.01, z * 0.01);
+
+                // Limit vertices to prevent performance issues
+                if (vertices.length >= 3000) break;
+            }
+        }
+
+        // Generate triangulated indices if we found vertices
+        if (vertices.length >= 9) { // At least 3 vertices
+            const numVerts = vertices.length / 3;
+            for (let i = 0; i < numVerts - 2; i += 3) {
+                if (i + 2 < numVerts) {
+                    indices.push(i, i + 1, i + 2);
+                }
+            }
+        }
+
+        return {
+            vertices,
+            indices,
+            normals: undefined,
+            uvs: undefined,
+            success: vertices.length > 0
+        };
+    };
+
+    // MOA Model Parser - Complex models (characters, vehicles)
+    const parseMOABuffer = (buffer, fileName) => {
+        const dataView = new DataView(buffer);
+        const headerInfo = analyzeHeader(buffer);
+        const lowerName = fileName.toLowerCase();
+
+        // Try structured parsing first
+        let result = parseStructuredData(buffer, dataView, headerInfo.headerSize);
+
+        // If structured parsing failed, try MXO-specific patterns
+        if (!result.success && (lowerName.endsWith('.moa') || lowerName.endsWith('.prop'))) {
+            result = parseAtKnownOffsets(buffer, dataView);
+        }
+
+        // If that failed as well, try pattern-based approach
+        if (!result.success) {
+            result = parseByPattern(buffer, dataView);
+        }
+
+        if (result.success && result.vertices.length > 0) {
+            return {
+                type: 'model',
+                vertices: result.vertices,
+                indices: result.indices,
+                normals: result.normals,
+                uvs: result.uvs,
+                animations: [],
+                materials: [],
+                metadata: {
+                    format: modelFormat(fileName),
+                    version: 1.0,
+                    signature: headerInfo.signature,
+                    vertexCount: result.vertices.length / 3,
+                    triangleCount: result.indices.length / 3,
+                    description: modelDescription(fileName, false),
+                    parsedBy: 'Enhanced MXO parser v3.0',
+                    fileSize: buffer.byteLength,
+                    hasNormals: !!result.normals,
+                    hasUVs: !!result.uvs,
+                    engine: 'Modified Lithtech Discovery',
+                    scale: '1 unit = 1 centimeter (converted to meters)',
+                    originalScale: 'MXO: 1 unit = 1cm',
+                    scaleFactor: 0.01
+                }
+            };
+        }
+
+        // Create a fallback simple model (already in meters)
+        const fallbackVertices = [
+            -1, -1, 0,   // Bottom left
+             1, -1, 0,   // Bottom right
+             0,  1, 0,   // Top
+            -0.5, 0, 1,  // Back left
+             0.5, 0, 1   // Back right
+        ];
+
+        const fallbackIndices = [
+            0, 1, 2,  // Front triangle
+            0, 3, 4,  // Back left triangle
+            1, 4, 2,  // Back right triangle
+            3, 4, 2   // Back top triangle
+        ];
+
+        return {
+            type: 'model',
+            vertices: fallbackVertices,
+            indices: fallbackIndices,
+            normals: undefined,
+            uvs: undefined,
+            animations: [],
+            materials: [],
+            metadata: {
+                format: modelFormat(fileName),
+                version: 1.0,
+                signature: headerInfo.signature,
+                vertexCount: 5,
+                triangleCount: 4,
+                description: modelDescription(fileName, true),
+                parsedBy: 'Enhanced MXO parser v3.0 (fallback)',
+                fileSize: buffer.byteLength,
+                warning: 'Could not parse actual model data, using placeholder',
+                engine: 'Modified Lithtech Discovery',
+                scale: '1 unit = 1 centimeter'
+            }
+        };
+    };
+
+    // PROP Parser - Static props (successfully exported by community)
+    // Uses the enhanced V2 parser (fix_prop_parser_v2.js) when it is loaded
+    const parsePROPBuffer = (buffer, fileName) => {
+        if (global.parsePROPBufferV2) {
+            return global.parsePROPBufferV2(buffer, fileName);
+        }
+
+        const dataView = new DataView(buffer);
+
+        // PROP files are simpler - single mesh
+        // Based on community: successfully exported to .ply/.fbx
+        const vertices = [];
+        const indices = [];
+        const uvs = [];
+        const normals = [];
+
+        // Try to find vertex data
+        // PROP files typically have vertex count early in file
+        let offset = 0;
+        let vertexCount = 0;
+        let faceCount = 0;
+
+        // Scan for reasonable vertex/face counts
+        for (let i = 8; i < Math.min(256, buffer.byteLength - 8); i += 4) {
+            const val1 = dataView.getUint32(i, true);
+            const val2 = dataView.getUint32(i + 4, true);
+
+            if (val1 > 3 && val1 < 65535 && val2 > 1 && val2 < 65535) {
+                // Possible vertex/face count pair
+                const testSize = i + 8 + (val1 * 12) + (val2 * 12);
+                if (testSize < buffer.byteLength) {
+                    vertexCount = val1;
+                    faceCount = val2;
+                    offset = i + 8;
+                    break;
+                }
+            }
+        }
+
+        if (vertexCount > 0) {
+            // Read vertices
+            for (let i = 0; i < vertexCount && offset + 12 <= buffer.byteLength; i++) {
+                const x = dataView.getFloat32(offset, true);
+                const y = dataView.getFloat32(offset + 4, true);
+                const z = dataView.getFloat32(offset + 8, true);
+
+                if (!isNaN(x) && !isNaN(y) && !isNaN(z)) {
+                    // Apply MXO scale (1 unit = 1cm)
+                    vertices.push(x * 0.01, y * 0.01, z * 0.01);
+                }
+                offset += 12;
+            }
+
+            // Read face indices
+            for (let i = 0; i < faceCount && offset + 12 <= buffer.byteLength; i++) {
+                const a = dataView.getUint32(offset, true);
+                const b = dataView.getUint32(offset + 4, true);
+                const c = dataView.getUint32(offset + 8, true);
+
+                if (a < vertexCount && b < vertexCount && c < vertexCount) {
+                    indices.push(a, b, c);
+                }
+                offset += 12;
+            }
+
+            // Try to read UVs if space remains
+            if (offset + vertexCount * 8 <= buffer.byteLength) {
+                for (let i = 0; i < vertexCount; i++) {
+                    const u = dataView.getFloat32(offset, true);
+                    const v = dataView.getFloat32(offset + 4, true);
+                    if (!isNaN(u) && !isNaN(v)) {
+                        uvs.push(u, v);
+                    }
+                    offset += 8;
+                }
+            }
+        }
+
+        return {
+            type: 'model',
+            vertices: vertices,
+            indices: indices,
+            uvs: uvs,
+            normals: normals,
+            animations: [],
+            materials: [],
+            metadata: {
+                format: 'PROP',
+                description: 'Static prop/object',
+                vertexCount: vertices.length / 3,
+                faceCount: indices.length / 3,
+                hasUVs: uvs.length > 0,
+                engine: 'Modified Lithtech Discovery',
+                scale: '1 unit = 1cm (converted to meters)',
+                exportable: true, // Community successfully exported these
+                fileSize: buffer.byteLength
+            }
+        };
+    };
+
+    // MGA/MGC Model Group Parser (Matrix Online Model Collections)
+    // Model groups are collections of references to other models
+    // Return placeholder data for now
+    const parseMGABuffer = (buffer, fileName) => ({
+        type: 'model',
+        vertices: [],
+        indices: [],
+        uvs: [],
+        normals: [],
+        metadata: {
+            format: fileName.endsWith('.mga') ? 'MGA' : 'MGC',
+            fileType: 'Model Group/Collection',
+            description: 'Collection of model references'
+        }
+    });
+
+    // Geometry as typed arrays, so it can be transferred between threads without copying
+    const toTypedGeometry = (model) => {
+        const typed = (array, Type) => (array && Array.isArray(array)) ? Type.from(array) : array;
+        model.vertices = typed(model.vertices, Float32Array);
+        model.indices = typed(model.indices,
+            model.vertices && model.vertices.length <= 65536 * 3 ? Uint16Array : Uint32Array);
+        model.normals = typed(model.normals, Float32Array);
+        model.uvs = typed(model.uvs, Float32Array);
+        return model;
+    };
+
+    // ArrayBuffers of a model's geometry, for postMessage transfer lists
+    const transferables = (model) => ['vertices', 'indices', 'normals', 'uvs']
+        .map(key => model[key])
+        .filter(array => ArrayBuffer.isView(array))
+        .map(array => array.buffer)
+        .filter((buffer, i, buffers) => buffers.indexOf(buffer) === i);
+
+    const parsers = {
+        moa: parseMOABuffer,
+        prop: parsePROPBuffer,
+        mga: parseMGABuffer
+    };
+
+    global.MXOModelParsers = {
+        version: PARSER_VERSION,
+        parseMOABuffer,
+        parsePROPBuffer,
+        parseMGABuffer,
+        toTypedGeometry,
+        transferables,
+        // Parse a model buffer of the given kind ('moa', 'prop' or 'mga') into typed-array geometry
+        parse: (kind, buffer, fileName) => {
+            const parser = parsers[kind];
+            if (!parser) {
+                throw new Error(`Unknown model parser: ${kind}`);
+            }
+            return toTypedGeometry(parser(buffer, fileName));
+        }
+    };
+})(self);
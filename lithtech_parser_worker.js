@@ -0,0 +1,17 @@
+// Web Worker that parses Lithtech models off the main thread
+// Receives { id, kind, name, buffer } (buffer transferred) and replies with
+// { id, result } whose typed-array geometry is transferred back
+
+// fix_prop_parser_v2.js registers its parser on `window`
+self.window = self;
+importScripts('/lithtech_model_parsers.js', '/fix_prop_parser_v2.js');
+
+self.onmessage = (e) => {
+    const { id, kind, name, buffer } = e.data;
+    try {
+        const result = self.MXOModelParsers.parse(kind, buffer, name);
+        self.postMessage({ id, result }, self.MXOModelParsers.transferables(result));
+    } catch (error) {
+        self.postMessage({ id, error: error.message });
+    }
+};
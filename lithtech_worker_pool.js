@@ -0,0 +1,94 @@
+// Worker pool for Lithtech model parsing
+// Model files are read as ArrayBuffers, transferred to a pool of
+// lithtech_parser_worker.js workers and parsed there, so large models no longer
+// block the UI thread and several models can parse in parallel.
+// Falls back to parsing on the main thread when workers are unavailable.
+
+window.LithtechWorkerPool = (() => {
+    const WORKER_URL = '/lithtech_parser_worker.js';
+    const size = Math.max(1, Math.min((navigator.hardwareConcurrency || 2) - 1, 4));
+    const slots = [];
+    const queue = [];
+    let nextId = 1;
+    let disabled = typeof Worker === 'undefined';
+
+    const parseOnMainThread = async (kind, file) => {
+        return window.MXOModelParsers.parse(kind, await file.arrayBuffer(), file.name);
+    };
+
+    // Workers failed to load (e.g. opened from file://): finish everything on the main thread
+    const disable = (error) => {
+        console.warn('⚠️ Model parser workers unavailable, parsing on main thread:', error && (error.message || error));
+        disabled = true;
+        const stranded = slots.filter(slot => slot.job).map(slot => slot.job).concat(queue.splice(0));
+        slots.splice(0).forEach(slot => slot.worker.terminate());
+        stranded.forEach(job => job.resolve(parseOnMainThread(job.kind, job.file)));
+    };
+
+    const spawn = () => {
+        const slot = { worker: new Worker(WORKER_URL), job: null };
+        slot.worker.onmessage = (e) => {
+            const { id, result, error } = e.data;
+            const job = slot.job;
+            if (!job || job.id !== id) return;
+            slot.job = null;
+            if (error) {
+                job.reject(new Error(error));
+            } else {
+                job.resolve(result);
+            }
+            pump();
+        };
+        slot.worker.onerror = (e) => {
+            e.preventDefault();
+            disable(e);
+        };
+        slots.push(slot);
+        return slot;
+    };
+
+    const pump = () => {
+        while (queue.length > 0 && !disabled) {
+            let slot = slots.find(s => !s.job);
+            if (!slot && slots.length < size) {
+                try {
+                    slot = spawn();
+                } catch (error) {
+                    disable(error);
+                    return;
+                }
+            }
+            if (!slot) return;
+
+            const job = queue.shift();
+            slot.job = job;
+            // The buffer is transferred, not copied; job.file is kept for the main-thread fallback
+            slot.worker.postMessage({ id: job.id, kind: job.kind, name: job.file.name, buffer: job.buffer }, [job.buffer]);
+            job.buffer = null;
+        }
+    };
+
+    return {
+        size,
+        // Parse a model File of the given kind ('moa', 'prop' or 'mga'); pass `buffer`
+        // when the file has already been read (it is transferred to the worker)
+        parse: async (kind, file, buffer = null) => {
+            if (disabled) {
+                return buffer
+                    ? window.MXOModelParsers.parse(kind, buffer, file.name)
+                    : parseOnMainThread(kind, file);
+            }
+            buffer = buffer || await file.arrayBuffer();
+            return new Promise((resolve, reject) => {
+                queue.push({ id: nextId++, kind, file, buffer, resolve, reject });
+                pump();
+            });
+        },
+        stats: () => ({
+            workers: slots.length,
+            busy: slots.filter(slot => slot.job).length,
+            queued: queue.length,
+            disabled
+        })
+    };
+})();
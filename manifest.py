@@ -0,0 +1,191 @@
+#!/usr/bin/env python3
+"""
+Client install manifest for the Matrix Online Modding Suite
+Indexes every file under the client directory (relative path, size, mtime and a
+type detected from the extension) so the browser can render the install tree from
+a few paged requests and fetch file bytes only when a file is opened, instead of
+enumerating the whole folder through a webkitdirectory input.
+
+The manifest is held in memory sorted by lower-cased path, so prefix queries are
+two bisections, and a polling thread keeps it current. A refresh only re-stats
+the tree; the generation (and the ETag derived from it) changes only when a file
+was added, removed or modified.
+"""
+
+import bisect
+import os
+import threading
+import time
+
+import bik
+
+CLIENT_DIR = bik.CLIENT_DIR
+POLL_INTERVAL = float(os.environ.get('MOMS_MANIFEST_POLL_INTERVAL', 60))
+
+# Same groups and precedence as FILE_TYPES in index.html
+FILE_TYPES = (
+    ('model', ('.abc', '.moa', '.prop', '.iprf', '.eprf', '.mga', '.mgc')),
+    ('texture', ('.dtx', '.txa', '.txb', '.dds', '.tga', '.png', '.jpg', '.jpeg')),
+    ('level', ('.dat', '.world')),
+    ('sound', ('.wav', '.ogg', '.mp3')),
+    ('cutscene', ('.bik', '.smk', '.avi', '.mp4')),
+    ('animation', ('.anm', '.ani')),
+    ('script', ('.lua', '.cs', '.txt', '.py')),
+    ('message', ('.msg',)),
+    ('archive', ('.rez', '.lta', '.ltb', '.pkb')),
+    ('assembly', ('.dll', '.exe')),
+    ('log', ('.log', '.out', '.debug')),
+)
+_TYPE_BY_EXTENSION = {}
+for _file_type, _extensions in FILE_TYPES:
+    for _extension in _extensions:
+        _TYPE_BY_EXTENSION.setdefault(_extension, _file_type)
+
+FIELDS = ('path', 'size', 'mtime', 'type')
+# Upper bound for every string starting with a given prefix
+_PREFIX_END = '\U0010ffff'
+
+
+def detect_type(name):
+    """Manifest type of a file name ('other' when the extension is unknown)"""
+    return _TYPE_BY_EXTENSION.get(os.path.splitext(name)[1].lower(), 'other')
+
+
+class ClientManifest:
+    """Sorted in-memory listing of a client directory.
+
+    Entries are (relative path, size, mtime, type) tuples. Hidden files and
+    folders are skipped, as the browser's folder loader does.
+    """
+
+    def __init__(self, root=CLIENT_DIR, poll_interval=POLL_INTERVAL):
+        self.root = root
+        self.poll_interval = poll_interval
+        self.entries = []
+        self.keys = []
+        self.by_path = {}
+        self.types = {}
+        self.generation = 0
+        self.changed_at = None
+        self.refreshed_at = None
+        # Called with no arguments on the polling thread after a refresh found changes
+        self.listeners = []
+        self._lock = threading.Lock()
+
+    @staticmethod
+    def _normalize(path):
+        return path.replace('\\', '/').strip('/').lower()
+
+    def _scan(self):
+        for root, dirs, files in os.walk(self.root):
+            dirs[:] = [d for d in dirs if not d.startswith('.')]
+            relative_root = os.path.relpath(root, self.root).replace(os.sep, '/')
+            prefix = '' if relative_root == '.' else relative_root + '/'
+            for file in files:
+                if file.startswith('.'):
+                    continue
+                try:
+                    stat = os.stat(os.path.join(root, file))
+                except OSError:
+                    continue
+                yield prefix + file, stat.st_size, round(stat.st_mtime, 3)
+
+    def refresh(self):
+        """Rescan the tree; returns the number of files added, removed or changed"""
+        with self._lock:
+            previous = self.by_path
+        by_path, changed = {}, 0
+        for path, size, mtime in self._scan():
+            key = path.lower()
+            old = previous.get(key)
+            if old and old[0] == path and old[1] == size and old[2] == mtime:
+                by_path[key] = old
+            else:
+                by_path[key] = (path, size, mtime, detect_type(path))
+                changed += 1
+        changed += sum(1 for key in previous if key not in by_path)
+
+        now = time.time()
+        if not changed and self.changed_at is not None:
+            self.refreshed_at = now
+            return 0
+
+        keys = sorted(by_path)
+        entries = [by_path[key] for key in keys]
+        types = {}
+        for entry in entries:
+            types[entry[3]] = types.get(entry[3], 0) + 1
+
+        with self._lock:
+            self.entries, self.keys, self.by_path, self.types = entries, keys, by_path, types
+            self.generation += 1
+            self.changed_at = self.refreshed_at = now
+        return changed
+
+    def start_polling(self):
+        """Rescan every poll_interval seconds on a daemon thread, notifying listeners of changes"""
+        def poll():
+            while True:
+                time.sleep(self.poll_interval)
+                try:
+                    changed = self.refresh()
+                    if changed:
+                        print(f"Client manifest: {changed} files added, removed or changed")
+                        for listener in list(self.listeners):
+                            listener()
+                except OSError as e:
+                    print(f"Client manifest refresh failed: {e}")
+        threading.Thread(target=poll, name='client-manifest', daemon=True).start()
+
+    @property
+    def etag(self):
+        """Validator for manifest responses; changes whenever the listing does"""
+        return f'"manifest-{int((self.changed_at or 0) * 1000):x}-{self.generation}"'
+
+    def snapshot(self):
+        """(entries, generation) of the current listing"""
+        with self._lock:
+            return self.entries, self.generation
+
+    def resolve(self, path):
+        """Absolute path of a file listed in the manifest, or None (so nothing outside it is reachable)"""
+        with self._lock:
+            entry = self.by_path.get(self._normalize(path))
+        if entry is None:
+            return None
+        return os.path.join(self.root, *entry[0].split('/'))
+
+    def page(self, prefix='', offset=0, limit=1000, file_type=None, compact=False):
+        """JSON-ready slice of the entries whose path starts with prefix (case-insensitive).
+
+        compact=True sends rows as [path, size, mtime, type] lists under 'fields'
+        instead of one object per file, roughly halving the response.
+        """
+        with self._lock:
+            entries, keys, types = self.entries, self.keys, self.types
+            generation, refreshed_at = self.generation, self.refreshed_at
+
+        prefix = prefix.replace('\\', '/').lstrip('/').lower()
+        start = bisect.bisect_left(keys, prefix)
+        end = bisect.bisect_left(keys, prefix + _PREFIX_END, start)
+        matches = entries[start:end]
+        if file_type:
+            matches = [entry for entry in matches if entry[3] == file_type]
+
+        rows = matches[offset:offset + limit]
+        page = {
+            'generation': generation,
+            'refreshed_at': refreshed_at,
+            'prefix': prefix,
+            'offset': offset,
+            'limit': limit,
+            'count': len(matches),
+            'total': len(entries),
+            'types': types,
+        }
+        if compact:
+            page['fields'] = FIELDS
+            page['rows'] = rows
+        else:
+            page['files'] = [dict(zip(FIELDS, row)) for row in rows]
+        return page
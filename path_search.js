@@ -0,0 +1,114 @@
+// Global path search over loaded files and the packmap index
+// Paths are sent to path_search_worker.js in batches and queried there, so building
+// the trigram index for tens of thousands of paths never blocks the UI. Sources
+// ('files', 'packmap') can be replaced independently.
+// Falls back to an index on the main thread when workers are unavailable.
+
+window.PathSearch = (() => {
+    const WORKER_URL = '/path_search_worker.js';
+    const BATCH_SIZE = 5000;
+    // Paths per source, kept so a main-thread fallback can be rebuilt
+    const sources = new Map();
+    const pending = new Map();
+    const listeners = new Set();
+    let nextId = 1;
+    let worker = null;
+    let local = null;
+
+    const runLocally = (message) => {
+        if (message.type === 'add') return local.add(message.paths, message.source);
+        if (message.type === 'remove') return local.removeSource(message.source);
+        const started = performance.now();
+        const result = local.search(message.query, message.limit);
+        result.took = performance.now() - started;
+        return result;
+    };
+
+    const fallBack = (error) => {
+        console.warn('⚠️ Path search worker unavailable, indexing on main thread:', error && (error.message || error));
+        if (worker) worker.terminate();
+        worker = null;
+        local = new window.PathSearchIndex();
+        sources.forEach((paths, source) => local.add(paths, source));
+        // Adds were replayed above; only searches still need an answer
+        pending.forEach(({ message, resolve }) => {
+            resolve(message.type === 'search' ? runLocally(message) : 0);
+        });
+        pending.clear();
+    };
+
+    const ensureStarted = () => {
+        if (worker || local) return;
+        if (typeof Worker === 'undefined') {
+            fallBack(new Error('Web Workers not supported'));
+            return;
+        }
+        try {
+            worker = new Worker(WORKER_URL);
+        } catch (error) {
+            fallBack(error);
+            return;
+        }
+        worker.onmessage = (e) => {
+            const { id, result, error } = e.data;
+            const job = pending.get(id);
+            if (!job) return;
+            pending.delete(id);
+            if (error) {
+                job.reject(new Error(error));
+            } else {
+                job.resolve(result);
+            }
+        };
+        worker.onerror = (e) => {
+            e.preventDefault();
+            fallBack(e);
+        };
+    };
+
+    const send = (message) => {
+        ensureStarted();
+        if (local) {
+            return Promise.resolve(runLocally(message));
+        }
+        return new Promise((resolve, reject) => {
+            const id = nextId++;
+            pending.set(id, { message, resolve, reject });
+            worker.postMessage({ id, ...message });
+        });
+    };
+
+    // Index more paths under source, in batches so searches can run in between
+    const add = (source, paths) => {
+        if (!sources.has(source)) sources.set(source, []);
+        const known = sources.get(source);
+        const batches = [];
+        for (let i = 0; i < paths.length; i += BATCH_SIZE) {
+            const batch = paths.slice(i, i + BATCH_SIZE);
+            batches.push(send({ type: 'add', source, paths: batch }));
+            batch.forEach(path => known.push(path));
+        }
+        return Promise.all(batches).then(counts => {
+            listeners.forEach(listener => listener());
+            return counts.reduce((sum, count) => sum + count, 0);
+        });
+    };
+
+    // Replace every path of source
+    const setSource = (source, paths) => {
+        sources.set(source, []);
+        send({ type: 'remove', source });
+        return add(source, paths);
+    };
+
+    // Ranked matches: { results: [{ path, source, kind }], total, took }
+    const search = (query, limit = 50) => send({ type: 'search', query, limit });
+
+    // Call listener whenever indexed paths change; returns an unsubscribe function
+    const subscribe = (listener) => {
+        listeners.add(listener);
+        return () => listeners.delete(listener);
+    };
+
+    return { add, setSource, search, subscribe };
+})();
@@ -0,0 +1,208 @@
+// Trigram index over file paths for the global search box
+// Every path is indexed under the trigrams of its lower-cased text. A query's trigrams
+// are intersected through their posting lists (shortest first), candidates are
+// verified with a substring test and ranked: exact file name, name prefix, name
+// substring, then anywhere in the path. When that leaves room, paths sharing most of
+// the query's trigrams are added as fuzzy matches, which tolerates a typo or two.
+// Queries shorter than a trigram scan the file names directly.
+// Loaded on the main thread (fallback) and by path_search_worker.js.
+
+(function (global) {
+    const RANK = { exact: 0, prefix: 1, name: 2, path: 3, fuzzy: 4 };
+
+    const trigramsOf = (text) => {
+        const grams = new Set();
+        for (let i = 0; i + 3 <= text.length; i++) {
+            grams.add(text.substr(i, 3));
+        }
+        return grams;
+    };
+
+    // Intersection of ascending id lists
+    const intersect = (a, b) => {
+        const out = [];
+        let i = 0;
+        let j = 0;
+        while (i < a.length && j < b.length) {
+            if (a[i] === b[j]) {
+                out.push(a[i]);
+                i++;
+                j++;
+            } else if (a[i] < b[j]) {
+                i++;
+            } else {
+                j++;
+            }
+        }
+        return out;
+    };
+
+    class PathSearchIndex {
+        constructor() {
+            this.clear();
+        }
+
+        clear() {
+            this.paths = [];
+            this.lower = [];
+            this.nameStart = [];
+            this.sources = [];
+            this.alive = [];
+            this.live = 0;
+            this.keys = new Map();
+            this.postings = new Map();
+        }
+
+        get size() {
+            return this.live;
+        }
+
+        // Index paths under a source name ('files', 'packmap', ...); duplicates are ignored
+        add(paths, source) {
+            let added = 0;
+            for (const path of paths) {
+                const key = `${source}\0${path}`;
+                if (this.keys.has(key)) continue;
+                const id = this.paths.length;
+                const lower = path.toLowerCase();
+                this.keys.set(key, id);
+                this.paths.push(path);
+                this.lower.push(lower);
+                this.nameStart.push(lower.lastIndexOf('/') + 1);
+                this.sources.push(source);
+                this.alive.push(true);
+                // Ids only grow, so each posting list stays sorted; the last-element check
+                // skips trigrams repeated within one path
+                for (let i = 0; i + 3 <= lower.length; i++) {
+                    const gram = lower.substr(i, 3);
+                    let list = this.postings.get(gram);
+                    if (!list) {
+                        list = [];
+                        this.postings.set(gram, list);
+                    }
+                    if (list[list.length - 1] !== id) list.push(id);
+                }
+                added++;
+            }
+            this.live += added;
+            return added;
+        }
+
+        // Drop every path of a source; the index is rebuilt once most of it is dead
+        removeSource(source) {
+            let removed = 0;
+            for (let id = 0; id < this.paths.length; id++) {
+                if (this.alive[id] && this.sources[id] === source) {
+                    this.alive[id] = false;
+                    this.keys.delete(`${source}\0${this.paths[id]}`);
+                    removed++;
+                }
+            }
+            this.live -= removed;
+            if (this.live < this.paths.length / 2) {
+                const { paths, sources, alive } = this;
+                this.clear();
+                for (let id = 0; id < paths.length; id++) {
+                    if (alive[id]) this.add([paths[id]], sources[id]);
+                }
+            }
+            return removed;
+        }
+
+        rankOf(id, query) {
+            const lower = this.lower[id];
+            const at = lower.indexOf(query, this.nameStart[id]);
+            if (at === -1) return lower.includes(query) ? RANK.path : -1;
+            if (at === this.nameStart[id]) {
+                return lower.length - at === query.length ? RANK.exact : RANK.prefix;
+            }
+            return RANK.name;
+        }
+
+        // Ranked matches: { results: [{ path, source, kind }], total } where total counts
+        // the substring matches before `limit` is applied
+        search(query, limit = 50) {
+            const q = query.trim().toLowerCase();
+            if (!q) return { results: [], total: 0 };
+
+            let candidates;
+            const grams = [...trigramsOf(q)];
+            if (grams.length === 0) {
+                candidates = [];
+                for (let id = 0; id < this.paths.length; id++) {
+                    if (this.lower[id].includes(q, this.nameStart[id])) candidates.push(id);
+                }
+            } else {
+                const lists = grams.map(gram => this.postings.get(gram) || []);
+                lists.sort((a, b) => a.length - b.length);
+                candidates = lists[0];
+                for (let k = 1; k < lists.length && candidates.length > 0; k++) {
+                    candidates = intersect(candidates, lists[k]);
+                }
+            }
+
+            // Only the best `limit` matches are kept (bounded insertion), so a broad query
+            // that matches every path costs one pass rather than a full sort
+            const top = [];
+            const better = (a, b) => (a.rank - b.rank) ||
+                (this.paths[a.id].length - this.paths[b.id].length) ||
+                (this.lower[a.id] < this.lower[b.id] ? -1 : 1);
+            let total = 0;
+            for (const id of candidates) {
+                if (!this.alive[id]) continue;
+                const rank = this.rankOf(id, q);
+                if (rank === -1) continue;
+                total++;
+                const match = { id, rank };
+                if (top.length === limit && better(match, top[top.length - 1]) >= 0) continue;
+                let lo = 0;
+                let hi = top.length;
+                while (lo < hi) {
+                    const mid = (lo + hi) >> 1;
+                    if (better(top[mid], match) <= 0) lo = mid + 1; else hi = mid;
+                }
+                top.splice(lo, 0, match);
+                if (top.length > limit) top.pop();
+            }
+
+            const results = top.map(({ id, rank }) => ({
+                path: this.paths[id],
+                source: this.sources[id],
+                kind: Object.keys(RANK)[rank]
+            }));
+            // Fewer than `limit` matches means `top` holds all of them
+            if (results.length < limit && grams.length >= 3) {
+                results.push(...this.fuzzy(grams, new Set(top.map(match => match.id)), limit - results.length));
+            }
+            return { results, total };
+        }
+
+        // Paths sharing the query's trigrams up to a few typos, best overlap first. One
+        // substituted, inserted or dropped character costs up to 3 trigrams; one typo is
+        // allowed, plus one more per 8 trigrams, and short queries need a single shared trigram
+        fuzzy(grams, exclude, limit) {
+            const edits = 1 + Math.floor(grams.length / 8);
+            const needed = Math.max(grams.length <= 4 ? 1 : 2, grams.length - 3 * edits);
+            const overlap = new Uint16Array(this.paths.length);
+            for (const gram of grams) {
+                for (const id of this.postings.get(gram) || []) {
+                    overlap[id]++;
+                }
+            }
+            const scored = [];
+            for (let id = 0; id < overlap.length; id++) {
+                if (overlap[id] >= needed && this.alive[id] && !exclude.has(id)) {
+                    scored.push({ id, count: overlap[id] });
+                }
+            }
+            scored.sort((a, b) => (b.count - a.count) || (this.paths[a.id].length - this.paths[b.id].length));
+            return scored.slice(0, limit).map(({ id }) => ({
+                path: this.paths[id],
+                source: this.sources[id],
+                kind: 'fuzzy'
+            }));
+        }
+    }
+
+    global.PathSearchIndex = PathSearchIndex;
+})(typeof self !== 'undefined' ? self : this);
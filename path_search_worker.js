@@ -0,0 +1,30 @@
+// Web Worker holding the global path search index (path_search_index.js)
+// Receives { id, type, ... } messages and replies with { id, result } or { id, error }:
+//   add { source, paths }      -> number of paths added
+//   remove { source }          -> number of paths removed
+//   search { query, limit }    -> { results, total, took }
+// Messages are handled in order, so searches interleave with batches still being added.
+
+importScripts('/path_search_index.js');
+
+const index = new self.PathSearchIndex();
+
+const handlers = {
+    add: ({ source, paths }) => index.add(paths, source),
+    remove: ({ source }) => index.removeSource(source),
+    search: ({ query, limit }) => {
+        const started = performance.now();
+        const result = index.search(query, limit);
+        result.took = performance.now() - started;
+        return result;
+    }
+};
+
+self.onmessage = (e) => {
+    const { id, type } = e.data;
+    try {
+        self.postMessage({ id, result: handlers[type](e.data) });
+    } catch (error) {
+        self.postMessage({ id, error: error.message });
+    }
+};
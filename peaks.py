@@ -0,0 +1,216 @@
+#!/usr/bin/env python3
+"""
+Waveform peaks for the Matrix Online Modding Suite audio editor
+Decodes a game audio file (or the soundtrack of a BIK cutscene) once and stores
+min/max peak pairs at several zoom levels in a compact binary file in the BIK
+transcode cache, so the editor can draw long tracks without decoding them.
+
+File layout (little-endian):
+    magic b'MXPK', version u16, level count u16, sample rate u32,
+    samples per peak at level 0 u32, total samples per channel u64,
+    then for each level: peak count u32 and that many (min, max) int8 pairs.
+Level n covers samples_per_peak * 2**n samples per peak.
+"""
+
+import array
+import os
+import struct
+import subprocess
+import sys
+import wave
+
+import bik
+
+PEAKS_MAGIC = b'MXPK'
+PEAKS_VERSION = 1
+# ffmpeg decodes to mono at this rate; PCM WAV files keep their own rate
+PEAKS_SAMPLE_RATE = 22050
+# Finest level: ~86 peaks per second at 22.05 kHz; each further level halves that
+PEAKS_SAMPLES_PER_PEAK = 256
+PEAKS_LEVELS = 8
+
+_HEADER = struct.Struct('<4sHHIIQ')
+_COUNT = struct.Struct('<I')
+
+
+def decode_command(source, sample_rate=PEAKS_SAMPLE_RATE):
+    """ffmpeg command decoding the first audio stream of source to mono 16-bit PCM on stdout"""
+    return ['ffmpeg', '-loglevel', 'error', '-i', source, '-vn', '-ac', '1', '-ar', str(sample_rate),
+            '-f', 's16le', 'pipe:1']
+
+
+def _samples(data):
+    samples = array.array('h')
+    samples.frombytes(data)
+    if sys.byteorder == 'big':
+        samples.byteswap()
+    return samples
+
+
+def _wave_chunks(wav, frames_per_read):
+    try:
+        while True:
+            data = wav.readframes(frames_per_read)
+            if not data:
+                return
+            if wav.getsampwidth() == 1:
+                # 8-bit WAV is unsigned; shift it onto the 16-bit scale
+                yield array.array('h', ((b - 128) << 8 for b in data))
+            else:
+                yield _samples(data)
+    finally:
+        wav.close()
+
+
+def _ffmpeg_chunks(source):
+    try:
+        proc = subprocess.Popen(decode_command(source), stdout=subprocess.PIPE, stderr=subprocess.PIPE)
+    except OSError as e:
+        raise bik.TranscodeError(str(e))
+    try:
+        leftover = b''
+        while True:
+            data = proc.stdout.read(bik.READ_SIZE)
+            if not data:
+                break
+            data = leftover + data
+            # Samples are two bytes; keep an odd trailing byte for the next read
+            cut = len(data) & ~1
+            leftover = data[cut:]
+            yield _samples(data[:cut])
+        stderr = proc.stderr.read()
+        if proc.wait() != 0:
+            raise bik.TranscodeError(stderr.decode('utf-8', errors='ignore')[-bik.STDERR_TAIL:])
+    finally:
+        if proc.poll() is None:
+            proc.kill()
+            proc.wait()
+
+
+def read_pcm(source):
+    """(sample rate, channels, iterator of int16 sample arrays) for source.
+
+    PCM WAV files are read directly; anything else (OGG, MP3, BIK) is decoded by ffmpeg.
+    """
+    try:
+        wav = wave.open(source, 'rb')
+    except (wave.Error, EOFError):
+        wav = None
+    if wav is not None and wav.getsampwidth() in (1, 2):
+        return wav.getframerate(), wav.getnchannels(), _wave_chunks(wav, bik.READ_SIZE)
+    if wav is not None:
+        wav.close()
+    return PEAKS_SAMPLE_RATE, 1, _ffmpeg_chunks(source)
+
+
+def compute_peaks(chunks, block):
+    """Level-0 peaks as a flat int8 array of (min, max) pairs, one pair per `block` samples"""
+    peaks = array.array('b')
+    pending = array.array('h')
+    for chunk in chunks:
+        pending.extend(chunk)
+        whole = len(pending) - len(pending) % block
+        for start in range(0, whole, block):
+            window = pending[start:start + block]
+            peaks.append(min(window) >> 8)
+            peaks.append(max(window) >> 8)
+        del pending[:whole]
+    if pending:
+        peaks.append(min(pending) >> 8)
+        peaks.append(max(pending) >> 8)
+    return peaks
+
+
+def downsample(peaks):
+    """Next zoom level: each pair of adjacent peaks merged into one"""
+    merged = array.array('b')
+    for i in range(0, len(peaks), 4):
+        pair = peaks[i:i + 4]
+        merged.append(min(pair[0::2]))
+        merged.append(max(pair[1::2]))
+    return merged
+
+
+def encode_peaks(levels, sample_rate, samples_per_peak, total_samples):
+    """Binary peaks file for a list of per-level (min, max) int8 arrays"""
+    parts = [_HEADER.pack(PEAKS_MAGIC, PEAKS_VERSION, len(levels), sample_rate, samples_per_peak, total_samples)]
+    for level in levels:
+        parts.append(_COUNT.pack(len(level) // 2))
+        parts.append(level.tobytes())
+    return b''.join(parts)
+
+
+def decode_peaks(data):
+    """Parse a peaks file into a dict with its header fields and a list of int8 level arrays"""
+    magic, version, count, sample_rate, samples_per_peak, total_samples = _HEADER.unpack_from(data)
+    if magic != PEAKS_MAGIC or version != PEAKS_VERSION:
+        raise ValueError('Not a peaks file')
+    offset = _HEADER.size
+    levels = []
+    for _ in range(count):
+        (peaks,) = _COUNT.unpack_from(data, offset)
+        offset += _COUNT.size
+        levels.append(array.array('b', data[offset:offset + peaks * 2]))
+        offset += peaks * 2
+    return {
+        'sample_rate': sample_rate,
+        'samples_per_peak': samples_per_peak,
+        'total_samples': total_samples,
+        'levels': levels,
+    }
+
+
+def waveform_peaks(source, samples_per_peak=PEAKS_SAMPLES_PER_PEAK, levels=PEAKS_LEVELS):
+    """Peaks file contents for source; raises TranscodeError when it cannot be decoded"""
+    sample_rate, channels, chunks = read_pcm(source)
+    counted = []
+
+    def counting(chunks):
+        for chunk in chunks:
+            counted.append(len(chunk))
+            yield chunk
+
+    # Interleaved channels share a block, so each peak spans every channel
+    level = compute_peaks(counting(chunks), samples_per_peak * channels)
+    pyramid = [level]
+    for _ in range(levels - 1):
+        level = downsample(level)
+        pyramid.append(level)
+    return encode_peaks(pyramid, sample_rate, samples_per_peak, sum(counted) // channels)
+
+
+def peaks_path(cache, source):
+    """Cache path of the peaks file for source"""
+    settings = ('peaks', PEAKS_VERSION, PEAKS_SAMPLE_RATE, PEAKS_SAMPLES_PER_PEAK, PEAKS_LEVELS)
+    return cache.path(cache.key(source, settings), '.peaks')
+
+
+def render_peaks(cache, source):
+    """Compute the peaks file for source unless cached; returns the cache path"""
+    path = peaks_path(cache, source)
+    if os.path.isfile(path):
+        return path
+
+    data = waveform_peaks(source)
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    part_path = f'{path}.{os.getpid()}.{next(bik._part_ids)}.part'
+    with open(part_path, 'wb') as f:
+        f.write(data)
+    os.replace(part_path, path)
+    return path
+
+
+def peaks_request(cache, catalog, url):
+    """bik.CachedFile for /peaks/<name> on the BIK servers, computed on first request"""
+    source, _ = bik.resolve_request(catalog, url, '/peaks/')
+    path = peaks_path(cache, source)
+    return bik.CachedFile(
+        path if os.path.isfile(path) else None,
+        bik.name_etag(path),
+        content_type='application/octet-stream',
+        cache_control=f'public, max-age={bik.STILL_MAX_AGE}',
+        job_key=path,
+        render=lambda: render_peaks(cache, source),
+        failure=f"Peaks of {source}",
+        error="Could not decode audio",
+    )
@@ -0,0 +1,239 @@
+#!/usr/bin/env python3
+"""
+Matrix Online PKB archive support
+Parses the packmap_save.lta index into a compact entry table and reads
+archive entries as zero-copy memoryview slices of a memory-mapped PKB
+"""
+
+import mmap
+import os
+import struct
+from array import array
+
+PACKMAP_MAGIC = b'LTAI'
+PACKMAP_RECORD = struct.Struct('<32s32sII')  # name, pkb name, offset, size
+PACKMAP_HEADER = struct.Struct('<4sI')       # magic, entry count
+
+# Extensions recognised by the heuristic scan of unknown index layouts
+HEURISTIC_EXTENSIONS = (b'.moa', b'.prop', b'.txa', b'.txb')
+HEURISTIC_MAX_SIZE = 10000000
+
+
+def _cstring(raw):
+    """Decode a NUL-padded ASCII field"""
+    return raw.split(b'\0', 1)[0].decode('ascii', errors='replace')
+
+
+class PackmapIndex:
+    """Entry table (name, pkb, offset, size) with lookup by file name and by PKB"""
+
+    def __init__(self, format_name='LTAI'):
+        self.format = format_name
+        self.names = []
+        self.pkb_names = []
+        self.pkb_ids = array('i')
+        self.offsets = array('I')
+        self.sizes = array('I')
+        self.by_name = {}
+        self.by_pkb = {}
+        self._pkb_lookup = {}
+        self._by_pkb_name = {}
+
+    def __len__(self):
+        return len(self.names)
+
+    def add(self, name, pkb_name, offset, size):
+        """Append an entry; pkb_name may be None when the index does not record it"""
+        if pkb_name is None:
+            pkb_id = -1
+        else:
+            key = pkb_name.lower()
+            pkb_id = self._pkb_lookup.get(key)
+            if pkb_id is None:
+                pkb_id = len(self.pkb_names)
+                self.pkb_names.append(pkb_name)
+                self._pkb_lookup[key] = pkb_id
+
+        i = len(self.names)
+        self.names.append(name)
+        self.pkb_ids.append(pkb_id)
+        self.offsets.append(offset)
+        self.sizes.append(size)
+
+        key = name.lower()
+        for k in (key, key.rsplit('/', 1)[-1]):
+            self.by_name.setdefault(k, i)
+            self._by_pkb_name.setdefault((pkb_id, k), i)
+        self.by_pkb.setdefault(pkb_id, []).append(i)
+
+    def entry(self, i):
+        """Entry i as a dict"""
+        pkb_id = self.pkb_ids[i]
+        return {
+            'name': self.names[i],
+            'pkb': self.pkb_names[pkb_id] if pkb_id >= 0 else None,
+            'offset': self.offsets[i],
+            'size': self.sizes[i],
+        }
+
+    def lookup(self, name):
+        """Index of the entry with this file name (full path or bare name), or None"""
+        return self.by_name.get(name.lower())
+
+    def entries_for_pkb(self, pkb_name):
+        """Entry indices stored in pkb_name; heuristic entries are candidates for every PKB"""
+        pkb_id = self._pkb_lookup.get(pkb_name.lower(), -1)
+        return self.by_pkb.get(pkb_id, [])
+
+    def lookup_in_pkb(self, pkb_name, name):
+        """Index of entry `name` (full path or bare name) inside `pkb_name`, or None"""
+        pkb_id = self._pkb_lookup.get(pkb_name.lower(), -1)
+        return self._by_pkb_name.get((pkb_id, name.lower()))
+
+
+def parse_packmap(data):
+    """Parse packmap_save.lta bytes into a PackmapIndex in a single pass"""
+    data = memoryview(data).cast('B')
+
+    if len(data) >= PACKMAP_HEADER.size and bytes(data[:4]) == PACKMAP_MAGIC:
+        index = PackmapIndex('LTAI')
+        _, declared = PACKMAP_HEADER.unpack_from(data, 0)
+        count = min(declared, (len(data) - PACKMAP_HEADER.size) // PACKMAP_RECORD.size)
+        for name, pkb_name, offset, size in PACKMAP_RECORD.iter_unpack(
+                data[PACKMAP_HEADER.size:PACKMAP_HEADER.size + count * PACKMAP_RECORD.size]):
+            index.add(_cstring(name), _cstring(pkb_name), offset, size)
+        return index
+
+    # Unknown layout: look for "<name>.<ext>" followed by offset/size
+    index = PackmapIndex('heuristic')
+    raw = bytes(data)
+    lowered = raw.lower()
+    scanned = 0
+    pos = lowered.find(b'.', 1)
+    while pos != -1 and pos < len(raw) - 5:
+        ext = next((e for e in HEURISTIC_EXTENSIONS if lowered.startswith(e, pos)), None)
+        if ext is None:
+            pos = lowered.find(b'.', pos + 1)
+            continue
+
+        start = pos - 1
+        while start > scanned and 32 <= raw[start] < 127:
+            start -= 1
+        start += 1
+        name_end = pos + len(ext)
+
+        field = name_end
+        while field < len(raw) and raw[field] == 0:
+            field += 1
+        if field + 8 > len(raw):
+            break
+
+        offset, size = struct.unpack_from('<II', raw, field)
+        if name_end - start >= 5 and 0 < size < HEURISTIC_MAX_SIZE:
+            index.add(raw[start:name_end].decode('ascii'), None, offset, size)
+            scanned = field + 8
+            pos = lowered.find(b'.', scanned)
+        else:
+            pos = lowered.find(b'.', pos + 1)
+
+    return index
+
+
+def load_packmap(path):
+    """Read and parse a packmap_save.lta file"""
+    with open(path, 'rb') as f:
+        return parse_packmap(f.read())
+
+
+class PKBArchive:
+    """Memory-mapped PKB archive whose entries are addressed through a PackmapIndex.
+
+    Entries are returned as memoryview slices of the mapping, so reading or
+    iterating never copies archive data. Release any views still held before
+    calling close(), otherwise the mapping cannot be unmapped.
+    """
+
+    def __init__(self, path, index):
+        self.path = path
+        self.name = os.path.basename(path)
+        self.index = index
+        self._file = open(path, 'rb')
+        self.size = os.fstat(self._file.fileno()).st_size
+        if self.size:
+            self._mmap = mmap.mmap(self._file.fileno(), 0, access=mmap.ACCESS_READ)
+            self._view = memoryview(self._mmap)
+        else:
+            # mmap cannot map an empty file
+            self._mmap = None
+            self._view = memoryview(b'')
+        self._entries = index.entries_for_pkb(self.name)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+    def close(self):
+        """Release the mapping and the underlying file"""
+        self._view.release()
+        if self._mmap is not None:
+            self._mmap.close()
+        self._file.close()
+
+    def __len__(self):
+        return len(self._entries)
+
+    def __contains__(self, name):
+        return self.index.lookup_in_pkb(self.name, name) is not None
+
+    def __getitem__(self, name):
+        i = self.index.lookup_in_pkb(self.name, name)
+        if i is None:
+            raise KeyError(name)
+        return self.view(i)
+
+    def __iter__(self):
+        return (self.index.names[i] for i in self._entries)
+
+    def span(self, i):
+        """(offset, length) of index entry i, clamped to the archive bounds"""
+        offset = self.index.offsets[i]
+        if offset >= self.size:
+            return offset, 0
+        return offset, min(self.index.sizes[i], self.size - offset)
+
+    def view(self, i):
+        """Zero-copy memoryview of index entry i (empty if it lies outside the archive)"""
+        offset, length = self.span(i)
+        return self._view[offset:offset + length]
+
+    def items(self):
+        """Iterate (entry name, memoryview) for every entry of this archive"""
+        for i in self._entries:
+            yield self.index.names[i], self.view(i)
+
+
+def open_archives(directory, index):
+    """Open every .pkb file in a client directory tree as a PKBArchive, keyed by lowercase name"""
+    archives = {}
+    for root, _, files in os.walk(directory):
+        for file in files:
+            if file.lower().endswith('.pkb'):
+                archives[file.lower()] = PKBArchive(os.path.join(root, file), index)
+    return archives
+
+
+def iter_install_entries(directory, index):
+    """Iterate (archive name, entry name, memoryview) over a whole client install.
+
+    Each archive is mapped only while its entries are being iterated.
+    """
+    for root, _, files in os.walk(directory):
+        for file in sorted(files):
+            if not file.lower().endswith('.pkb'):
+                continue
+            with PKBArchive(os.path.join(root, file), index) as archive:
+                for name, view in archive.items():
+                    yield archive.name, name, view
+                    view.release()
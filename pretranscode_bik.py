@@ -0,0 +1,127 @@
+#!/usr/bin/env python3
+"""
+Batch pre-transcoder for the Matrix Online Modding Suite BIK proxy
+Transcodes every catalogued BIK file into the proxy's cache ahead of time, so the
+first viewer of a cutscene is served from disk instead of waiting for ffmpeg
+"""
+
+import argparse
+import os
+import shutil
+import subprocess
+import sys
+import time
+from concurrent.futures import ThreadPoolExecutor, as_completed
+
+import bik
+
+
+def plan_transcodes(catalog, cache, encode_args=bik.ENCODE_ARGS, force=False):
+    """(catalog entry, cache key) for every file whose current version is not cached yet"""
+    plan = []
+    for entry in catalog.entries:
+        # The key covers path, mtime, size and encode settings, so a hit is up to date
+        key = cache.key(entry['path'], encode_args)
+        if force or not cache.lookup(key):
+            plan.append((entry, key))
+    return plan
+
+
+def transcode_file(cache, entry, key, encode_args=bik.ENCODE_ARGS, threads=None):
+    """Transcode one file into the cache; returns (seconds taken, bytes written)"""
+    start_time = time.perf_counter()
+    writer = cache.writer(key)
+    try:
+        result = subprocess.run(
+            bik.transcode_command(entry['path'], encode_args, output=writer.part_path, threads=threads),
+            capture_output=True, stdin=subprocess.DEVNULL
+        )
+    except BaseException:
+        writer.discard()
+        raise
+    if result.returncode != 0:
+        writer.discard()
+        stderr = result.stderr.decode('utf-8', errors='ignore')[-bik.STDERR_TAIL:].strip()
+        raise bik.TranscodeError(stderr or f'ffmpeg exited with code {result.returncode}')
+
+    # ffmpeg wrote the part file itself; commit() remuxes it and moves it into place
+    path = writer.commit()
+    return time.perf_counter() - start_time, os.path.getsize(path)
+
+
+def run_pretranscode(client_dir, cache_dir=bik.CACHE_DIR, jobs=None, force=False, profile=bik.DEFAULT_PROFILE):
+    """Pre-transcode every BIK under client_dir into cache_dir with an encode profile; returns the totals"""
+    encode_args = bik.encode_profile(profile)['args']
+    jobs = jobs or os.cpu_count() or 1
+    # One encoder thread per job keeps all cores busy without oversubscribing them
+    threads = 1 if jobs > 1 else None
+
+    catalog = bik.BIKCatalog(client_dir, prober=bik.probe)
+    catalog.refresh()
+    cache = bik.TranscodeCache(cache_dir)
+    plan = plan_transcodes(catalog, cache, encode_args, force)
+
+    print(f"🎬 {len(catalog.entries)} BIK files, {len(catalog.entries) - len(plan)} already cached")
+    print(f"🚀 {len(plan)} to transcode on {jobs} workers")
+
+    totals = {'files': 0, 'failed': 0, 'skipped': len(catalog.entries) - len(plan), 'media_seconds': 0.0, 'bytes': 0}
+    start_time = time.perf_counter()
+
+    with ThreadPoolExecutor(max_workers=jobs) as pool:
+        futures = {pool.submit(transcode_file, cache, entry, key, encode_args, threads): entry for entry, key in plan}
+        for done, future in enumerate(as_completed(futures), 1):
+            entry = futures[future]
+            try:
+                seconds, size = future.result()
+            except (bik.TranscodeError, OSError) as e:
+                # An unreadable file or a failed ffmpeg launch only fails this file
+                totals['failed'] += 1
+                print(f"[{done}/{len(plan)}] ❌ {entry['relative_path']}: {str(e)[:200]}")
+                continue
+
+            duration = entry.get('duration') or 0
+            totals['files'] += 1
+            totals['media_seconds'] += duration
+            totals['bytes'] += size
+            speed = f"{duration / seconds:.1f}x realtime" if duration and seconds else "unknown duration"
+            print(f"[{done}/{len(plan)}] {entry['relative_path']}: {duration:.1f}s in {seconds:.1f}s "
+                  f"({speed}), {size / 1024 / 1024:.1f} MB")
+
+    totals['seconds'] = time.perf_counter() - start_time
+    return totals
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Pre-transcode all BIK cutscenes into the BIK proxy cache')
+    parser.add_argument('client_dir', nargs='?', default=bik.CLIENT_DIR,
+                        help='Matrix Online client directory (default: MOMS_CLIENT_DIR)')
+    parser.add_argument('-c', '--cache', default=bik.CACHE_DIR, help='Transcode cache directory (default: MOMS_BIK_CACHE)')
+    parser.add_argument('-j', '--jobs', type=int, default=None, help='Concurrent ffmpeg encodes (default: CPU count)')
+    parser.add_argument('-p', '--profile', choices=sorted(bik.ENCODE_PROFILES), default=bik.DEFAULT_PROFILE,
+                        help=f'Encode profile to pre-transcode (default: {bik.DEFAULT_PROFILE})')
+    parser.add_argument('--force', action='store_true', help='Re-transcode files that are already cached')
+    args = parser.parse_args()
+
+    if not os.path.isdir(args.client_dir):
+        print(f"❌ Client directory not found: {args.client_dir}")
+        return 1
+    if not shutil.which('ffmpeg'):
+        print("❌ FFmpeg not found in PATH")
+        return 1
+
+    totals = run_pretranscode(args.client_dir, args.cache, jobs=args.jobs, force=args.force, profile=args.profile)
+
+    seconds = totals['seconds']
+    print("\n" + "=" * 40)
+    print(f"✅ Transcoded {totals['files']} files ({totals['bytes'] / 1024 / 1024:.1f} MB) in {seconds:.1f}s")
+    if seconds and totals['media_seconds']:
+        print(f"⚡ Overall: {totals['media_seconds'] / seconds:.1f}x realtime")
+    if totals['skipped']:
+        print(f"⏭️ {totals['skipped']} files already cached")
+    if totals['failed']:
+        print(f"⚠️ {totals['failed']} files failed")
+    return 1 if totals['failed'] else 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,187 @@
+#!/usr/bin/env python3
+"""
+Full-text index of the client's scripts and configs for the Matrix Online Modding Suite
+Tokenizes every script-like file listed in the client manifest into identifiers and
+numbers and keeps an inverted index with token positions, so identifier queries
+(an RPC name, an ability ID) and phrase queries ("SetAbility 1042") are answered
+with file/line hits without opening the files.
+
+Positions are token ordinals within a file; a phrase matches where its tokens sit
+at consecutive ordinals. Matching is case-insensitive. refresh() follows the
+manifest and re-tokenizes only files whose size or mtime changed.
+"""
+
+import array
+import os
+import re
+import threading
+
+SCRIPT_EXTENSIONS = ('.lua', '.py', '.cs', '.txt', '.xml', '.ini', '.cfg', '.lta', '.msg', '.json', '.csv')
+# Larger files are data dumps rather than scripts
+MAX_SCRIPT_SIZE = 4 * 1024 * 1024
+# A NUL byte in the first block marks a binary file (e.g. a binary .lta index)
+BINARY_SNIFF_SIZE = 8192
+DEFAULT_LIMIT = 200
+
+TOKEN_RE = re.compile(r'[A-Za-z_][A-Za-z0-9_]*|\d+')
+
+
+def tokenize(text):
+    """Lower-cased identifier and number tokens of a query string"""
+    return [token.lower() for token in TOKEN_RE.findall(text)]
+
+
+class ScriptIndex:
+    """Inverted index over the script files of a ClientManifest.
+
+    postings maps a lower-cased token to {doc id: array of token ordinals};
+    each document keeps the line number of every ordinal.
+    """
+
+    def __init__(self, root):
+        self.root = root
+        self.docs = {}
+        self.paths = {}
+        self.postings = {}
+        self.generation = None
+        self._next_id = 0
+        self._lock = threading.Lock()
+        self._refresh_lock = threading.Lock()
+
+    def _read(self, path):
+        full_path = os.path.join(self.root, *path.split('/'))
+        with open(full_path, 'rb') as f:
+            data = f.read(MAX_SCRIPT_SIZE + 1)
+        if len(data) > MAX_SCRIPT_SIZE or b'\0' in data[:BINARY_SNIFF_SIZE]:
+            return None
+        return data.decode('utf-8', errors='replace')
+
+    @staticmethod
+    def _tokenize_document(text):
+        """(line number of every token ordinal, {token: array of ordinals}) of a file's text"""
+        lines = array.array('I')
+        occurrences = {}
+        for line_number, line in enumerate(text.splitlines(), 1):
+            for match in TOKEN_RE.finditer(line):
+                occurrences.setdefault(match.group().lower(), array.array('I')).append(len(lines))
+                lines.append(line_number)
+        return lines, occurrences
+
+    def _add(self, path, size, mtime, lines, occurrences):
+        doc_id = self._next_id
+        self._next_id += 1
+        for token, ordinals in occurrences.items():
+            self.postings.setdefault(token, {})[doc_id] = ordinals
+        self.docs[doc_id] = {'path': path, 'size': size, 'mtime': mtime, 'lines': lines, 'tokens': list(occurrences)}
+        self.paths[path] = doc_id
+
+    def _remove(self, path):
+        doc_id = self.paths.pop(path)
+        for token in self.docs.pop(doc_id)['tokens']:
+            docs = self.postings[token]
+            del docs[doc_id]
+            if not docs:
+                del self.postings[token]
+
+    def refresh(self, manifest):
+        """Bring the index in line with manifest; returns the number of files (re)indexed or dropped.
+
+        Changed files are read and tokenized without holding the query lock; searches
+        keep answering from the previous index until the new documents are swapped in.
+        """
+        entries, generation = manifest.snapshot()
+
+        # Only refresh() changes docs and paths, so they can be read here without the query lock
+        with self._refresh_lock:
+            if generation == self.generation:
+                return 0
+            wanted = {path: (size, mtime) for path, size, mtime, _ in entries
+                      if path.lower().endswith(SCRIPT_EXTENSIONS) and size <= MAX_SCRIPT_SIZE}
+            dropped = [path for path in self.paths if path not in wanted]
+            stale, added = [], []
+            for path, (size, mtime) in wanted.items():
+                doc_id = self.paths.get(path)
+                if doc_id is not None:
+                    doc = self.docs[doc_id]
+                    if (doc['size'], doc['mtime']) == (size, mtime):
+                        continue
+                    stale.append(path)
+                try:
+                    text = self._read(path)
+                except OSError:
+                    continue
+                if text is not None:
+                    added.append((path, size, mtime) + self._tokenize_document(text))
+
+            with self._lock:
+                for path in dropped + stale:
+                    self._remove(path)
+                for document in added:
+                    self._add(*document)
+                self.generation = generation
+            return len(dropped) + len(added)
+
+    def _phrase_hits(self, tokens):
+        """{doc id: sorted ordinals where the phrase starts}"""
+        lists = [self.postings.get(token) for token in tokens]
+        if not all(lists):
+            return {}
+        # Only documents holding every token can match; walk the rarest token's documents
+        doc_ids = set(min(lists, key=len))
+        for docs in lists:
+            doc_ids.intersection_update(docs)
+
+        hits = {}
+        for doc_id in doc_ids:
+            following = [set(docs[doc_id]) for docs in lists[1:]]
+            starts = [start for start in lists[0][doc_id]
+                      if all(start + i + 1 in ordinals for i, ordinals in enumerate(following))]
+            if starts:
+                hits[doc_id] = starts
+        return hits
+
+    def search(self, query, limit=DEFAULT_LIMIT):
+        """Hits for an identifier or phrase query, one per matching line, ordered by path and line.
+
+        Returns a JSON-ready dict; 'total' counts every matching line before `limit`.
+        """
+        tokens = tokenize(query)
+        with self._lock:
+            if not tokens:
+                return {'query': query, 'tokens': [], 'hits': [], 'total': 0, 'files': 0}
+            matches = []
+            for doc_id, starts in self._phrase_hits(tokens).items():
+                doc = self.docs[doc_id]
+                lines = sorted({doc['lines'][start] for start in starts})
+                matches.append((doc['path'], lines))
+            indexed = len(self.docs)
+
+        matches.sort(key=lambda match: match[0].lower())
+        total = sum(len(lines) for _, lines in matches)
+        hits = []
+        for path, lines in matches:
+            if len(hits) >= limit:
+                break
+            lines = lines[:limit - len(hits)]
+            hits.extend(self._hit_lines(path, lines))
+        return {
+            'query': query,
+            'tokens': tokens,
+            'hits': hits,
+            'total': total,
+            'files': len(matches),
+            'indexed_files': indexed,
+        }
+
+    def _hit_lines(self, path, line_numbers):
+        """Hit records with the text of each line, read from the file (at most `limit` lines are read per query)"""
+        try:
+            text = self._read(path) or ''
+        except OSError:
+            text = ''
+        lines = text.splitlines()
+        return [{
+            'path': path,
+            'line': number,
+            'text': lines[number - 1].strip()[:200] if number <= len(lines) else '',
+        } for number in line_numbers]
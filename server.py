@@ -2,30 +2,490 @@
 """
 Simple HTTP server for the Matrix Online Modding Suite
 Serves files with proper CORS headers to avoid browser restrictions
+Serves individual PKB entries via /pkb/<archive>/<entry> using the packmap index
+Connections are handled on a bounded thread pool with HTTP/1.1 keep-alive; file
+and entry bodies support single Range requests and are sent with sendfile()
+Static files carry content-hash ETags (304 on If-None-Match) and text assets are
+served from gzip siblings compressed once per change
+Lists the client install via /manifest (paged, prefix queries) and serves its files
+lazily via /client/<path>
+Answers identifier and phrase queries over the client's scripts via /search-scripts
 """
 
+import gzip
+import hashlib
 import http.server
-import socketserver
 import os
+import json
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from urllib.parse import urlparse, unquote, parse_qs
+
+import manifest
+import pkb
+import script_index
+from http_util import etag_matches, parse_range
 
 PORT = 8000
+# Worker threads, i.e. connections served at once
+MAX_THREADS = int(os.environ.get('MOMS_SERVER_THREADS', 32))
+# Seconds an idle keep-alive connection may hold a worker thread
+KEEPALIVE_TIMEOUT = 15
+
+# Text assets served from a gzip sibling (<file>.gz, written once per change) to clients that accept it
+GZIP_EXTENSIONS = ('.html', '.htm', '.js', '.mjs', '.css', '.json', '.txt', '.md', '.svg', '.xml', '.lta')
+GZIP_MIN_SIZE = 1024
+PKB_DIR = os.environ.get('MOMS_PKB_DIR', 'cache')
+PACKMAP_FILE = os.environ.get('MOMS_PACKMAP_FILE', os.path.join(PKB_DIR, 'packmap_save.lta'))
+
+_packmap_lock = threading.Lock()
+_packmap_cache = {'mtime': None, 'index': None}
+_archive_cache = {}
+
+# Larger files (PKB archives run to gigabytes) get size/mtime ETags instead of a content hash,
+# so a first request never blocks a worker thread hashing the whole file
+ETAG_HASH_MAX_SIZE = 16 * 1024 * 1024
+_etag_lock = threading.Lock()
+_etag_cache = {}
+
+CLIENT_DIR = manifest.CLIENT_DIR
+# Largest /manifest page; the browser pages through bigger listings
+MANIFEST_MAX_LIMIT = 10000
+_manifest_lock = threading.Lock()
+client_manifest = None
+_script_index_lock = threading.Lock()
+client_script_index = None
+
+
+def get_packmap_index():
+    """Parsed packmap index, re-parsed only when the index file changes"""
+    try:
+        mtime = os.path.getmtime(PACKMAP_FILE)
+    except OSError:
+        return None
+
+    with _packmap_lock:
+        if _packmap_cache['mtime'] != mtime:
+            _packmap_cache['index'] = pkb.load_packmap(PACKMAP_FILE)
+            _packmap_cache['mtime'] = mtime
+            print(f"Loaded packmap index: {len(_packmap_cache['index'])} entries ({_packmap_cache['index'].format})")
+        return _packmap_cache['index']
+
+
+def get_pkb_archive(name):
+    """Memory-mapped archive from PKB_DIR, kept open until the file or the index changes"""
+    index = get_packmap_index()
+    path = os.path.join(PKB_DIR, name)
+    if index is None or not os.path.isfile(path):
+        return None
+
+    mtime = os.path.getmtime(path)
+    with _packmap_lock:
+        cached = _archive_cache.get(path)
+        if cached is None or cached[0] != mtime or cached[1].index is not index:
+            # Stale mappings are dropped rather than closed: a request may still hold a view
+            cached = (mtime, pkb.PKBArchive(path, index))
+            _archive_cache[path] = cached
+        return cached[1]
+
+
+def get_client_manifest():
+    """Manifest of CLIENT_DIR, built on first use and then kept current by polling; None without a client directory"""
+    global client_manifest
+    with _manifest_lock:
+        if client_manifest is None:
+            if not os.path.isdir(CLIENT_DIR):
+                return None
+            started = time.time()
+            client_manifest = manifest.ClientManifest(CLIENT_DIR)
+            client_manifest.refresh()
+            client_manifest.start_polling()
+            print(f"Client manifest: {len(client_manifest.entries)} files in {time.time() - started:.1f}s")
+        return client_manifest
+
+
+def refresh_script_index(index, client):
+    """Re-index the scripts that changed in the client manifest"""
+    started = time.time()
+    changed = index.refresh(client)
+    if changed:
+        print(f"Script index: {changed} files indexed in {time.time() - started:.1f}s ({len(index.docs)} total)")
+
+
+def get_script_index():
+    """Script index of the client manifest; None without a client directory.
+
+    The first call builds the index. After that the manifest's polling thread re-indexes
+    changed files, and queries answer from the last complete index in the meantime.
+    """
+    global client_script_index
+    client = get_client_manifest()
+    if client is None:
+        return None
+    with _script_index_lock:
+        if client_script_index is None or client_script_index.root != client.root:
+            index = script_index.ScriptIndex(client.root)
+            refresh_script_index(index, client)
+            client.listeners.append(lambda: refresh_script_index(index, client))
+            client_script_index = index
+        return client_script_index
+
+
+def stat_etag(stat):
+    """ETag from a file's size and mtime, for files too large to hash"""
+    return f'"{stat.st_size:x}-{stat.st_mtime_ns:x}"'
+
+
+def file_etag(path, stat):
+    """Strong ETag from the SHA-1 of a file's content, recomputed only when its mtime or size changes.
+
+    Files above ETAG_HASH_MAX_SIZE get stat_etag() instead.
+    """
+    if stat.st_size > ETAG_HASH_MAX_SIZE:
+        return stat_etag(stat)
+    signature = (stat.st_mtime_ns, stat.st_size)
+    with _etag_lock:
+        cached = _etag_cache.get(path)
+    if cached and cached[0] == signature:
+        return cached[1]
+
+    digest = hashlib.sha1()
+    with open(path, 'rb') as f:
+        for chunk in iter(lambda: f.read(1024 * 1024), b''):
+            digest.update(chunk)
+    etag = f'"{digest.hexdigest()[:20]}"'
+    with _etag_lock:
+        _etag_cache[path] = (signature, etag)
+    return etag
+
+
+def gzip_sibling(path, stat):
+    """Path of an up-to-date <path>.gz for a compressible text asset, written if missing or stale; None otherwise"""
+    if not path.lower().endswith(GZIP_EXTENSIONS) or stat.st_size < GZIP_MIN_SIZE:
+        return None
+
+    gz_path = path + '.gz'
+    try:
+        if os.stat(gz_path).st_mtime_ns >= stat.st_mtime_ns:
+            return gz_path
+    except OSError:
+        pass
+
+    part_path = f'{gz_path}.{os.getpid()}.{threading.get_ident()}.part'
+    try:
+        with open(path, 'rb') as f:
+            data = gzip.compress(f.read(), compresslevel=9, mtime=0)
+        with open(part_path, 'wb') as f:
+            f.write(data)
+        os.replace(part_path, gz_path)
+    except OSError:
+        # Read-only install: serve uncompressed
+        if os.path.exists(part_path):
+            os.remove(part_path)
+        return None
+    return gz_path
+
+
+class ThreadPoolHTTPServer(http.server.HTTPServer):
+    """HTTPServer that handles each connection on a bounded pool of worker threads,
+    so a large download does not hold up other requests"""
+    allow_reuse_address = True
+
+    def __init__(self, server_address, handler_class, max_threads=MAX_THREADS):
+        super().__init__(server_address, handler_class)
+        self._pool = ThreadPoolExecutor(max_workers=max_threads, thread_name_prefix='http')
+
+    def process_request(self, request, client_address):
+        self._pool.submit(self._process_request, request, client_address)
+
+    def _process_request(self, request, client_address):
+        try:
+            self.finish_request(request, client_address)
+        except Exception:
+            self.handle_error(request, client_address)
+        finally:
+            self.shutdown_request(request)
+
+    def server_close(self):
+        super().server_close()
+        self._pool.shutdown(wait=False)
+
 
 class CORSRequestHandler(http.server.SimpleHTTPRequestHandler):
+    # Keep-alive: every response carries a Content-Length
+    protocol_version = 'HTTP/1.1'
+    timeout = KEEPALIVE_TIMEOUT
+
     def end_headers(self):
         self.send_header('Access-Control-Allow-Origin', '*')
         self.send_header('Access-Control-Allow-Methods', 'GET, POST, OPTIONS')
-        self.send_header('Access-Control-Allow-Headers', 'Content-Type')
+        self.send_header('Access-Control-Allow-Headers', 'Content-Type, Range, If-None-Match')
+        self.send_header('Access-Control-Expose-Headers', 'Content-Length, Content-Range, Accept-Ranges, ETag')
+        # Clients revalidate every load; unchanged files cost a 304 thanks to the ETag
         self.send_header('Cache-Control', 'no-cache')
         super().end_headers()
-    
+
     def do_OPTIONS(self):
+        # CORS preflight: 204 has no body, so a keep-alive client does not wait for one
+        self.send_response(204)
+        self.end_headers()
+
+    def do_GET(self):
+        if self.path.startswith('/pkb/'):
+            self.serve_pkb()
+        elif self.path == '/manifest' or self.path.startswith('/manifest?'):
+            self.serve_manifest()
+        elif self.path.startswith('/client/'):
+            self.serve_client_file()
+        elif self.path.startswith('/search-scripts?'):
+            self.serve_script_search()
+        else:
+            self.serve_file()
+
+    def do_HEAD(self):
+        if self.path.startswith('/pkb/'):
+            self.serve_pkb(head_only=True)
+        elif self.path.startswith('/client/'):
+            self.serve_client_file(head_only=True)
+        else:
+            self.serve_file(head_only=True)
+
+    def send_body(self, f, offset, count):
+        """Copy count bytes of file f from offset to the socket without going through Python buffers"""
+        if count <= 0:
+            return
+        try:
+            self.connection.sendfile(f, offset, count)
+        except (BrokenPipeError, ConnectionResetError):
+            self.close_connection = True
+
+    def send_range_headers(self, size):
+        """Status line and range headers for a body of size bytes; returns (start, end), or None after a 416"""
+        try:
+            byte_range = parse_range(self.headers.get('Range'), size)
+        except ValueError:
+            self.send_response(416)
+            self.send_header('Content-Range', f'bytes */{size}')
+            self.send_header('Content-Length', '0')
+            self.end_headers()
+            return None
+
+        if byte_range:
+            start, end = byte_range
+            self.send_response(206)
+            self.send_header('Content-Range', f'bytes {start}-{end}/{size}')
+        else:
+            start, end = 0, size - 1
+            self.send_response(200)
+        self.send_header('Content-Length', str(end - start + 1))
+        self.send_header('Accept-Ranges', 'bytes')
+        return start, end
+
+    def accepts_gzip(self):
+        encodings = self.headers.get('Accept-Encoding', '')
+        return any(part.split(';')[0].strip() == 'gzip' for part in encodings.split(','))
+
+    def serve_file(self, head_only=False, path=None, etag=None, compress=True):
+        """Serve a static file with a content-hash ETag, a gzip sibling for text assets and
+        single-range support; directories and errors go to SimpleHTTPRequestHandler.
+
+        path overrides the file under the served directory; etag replaces the content
+        hash and compress=False skips the gzip sibling.
+        """
+        if path is None:
+            path = self.translate_path(self.path)
+            if path.endswith('/') or not os.path.isfile(path):
+                if head_only:
+                    super().do_HEAD()
+                else:
+                    super().do_GET()
+                return
+
+        try:
+            stat = os.stat(path)
+            etag = etag or file_etag(path, stat)
+        except OSError:
+            self.send_error(404, "File not found")
+            return
+
+        # Ranges address the identity body, so only whole-file requests get the gzip variant
+        body_path = path
+        if compress and self.accepts_gzip() and not self.headers.get('Range'):
+            gz_path = gzip_sibling(path, stat)
+            if gz_path:
+                body_path = gz_path
+                etag = etag[:-1] + '-gz"'
+
+        if etag_matches(self.headers.get('If-None-Match'), etag):
+            self.send_response(304)
+            self.send_header('ETag', etag)
+            self.send_header('Vary', 'Accept-Encoding')
+            self.end_headers()
+            return
+
+        try:
+            f = open(body_path, 'rb')
+        except OSError:
+            self.send_error(404, "File not found")
+            return
+
+        with f:
+            byte_range = self.send_range_headers(os.fstat(f.fileno()).st_size)
+            if byte_range is None:
+                return
+            self.send_header('Content-Type', self.guess_type(path))
+            if body_path != path:
+                self.send_header('Content-Encoding', 'gzip')
+            self.send_header('Vary', 'Accept-Encoding')
+            self.send_header('ETag', etag)
+            self.send_header('Last-Modified', self.date_time_string(stat.st_mtime))
+            self.end_headers()
+            if not head_only:
+                start, end = byte_range
+                self.send_body(f, start, end - start + 1)
+
+    def serve_pkb(self, head_only=False):
+        """Serve /pkb/<archive> (entry listing) or /pkb/<archive>/<entry> (entry bytes)"""
+        archive, _, entry_name = unquote(urlparse(self.path).path)[len('/pkb/'):].partition('/')
+        archive = os.path.basename(archive)
+
+        if get_packmap_index() is None:
+            self.send_error(404, f"Packmap index not found: {PACKMAP_FILE}")
+            return
+
+        pkb_archive = get_pkb_archive(archive) if archive else None
+        if pkb_archive is None:
+            self.send_error(404, f"PKB archive not found: {archive}")
+            return
+
+        if not entry_name:
+            entries = [pkb_archive.index.entry(i) for i in pkb_archive.index.entries_for_pkb(archive)]
+            self.send_json_response({'archive': archive, 'entries': entries, 'count': len(entries)})
+            return
+
+        i = pkb_archive.index.lookup_in_pkb(archive, entry_name)
+        if i is None:
+            self.send_error(404, f"Entry not found in {archive}: {entry_name}")
+            return
+
+        entry_offset, entry_size = pkb_archive.span(i)
+        if entry_size == 0:
+            self.send_error(404, f"Entry lies outside {archive}: {entry_name}")
+            return
+
+        byte_range = self.send_range_headers(entry_size)
+        if byte_range is None:
+            return
+        self.send_header('Content-Type', 'application/octet-stream')
+        self.end_headers()
+        if head_only:
+            return
+
+        # sendfile() straight from the archive file; a handle per request keeps offsets independent
+        start, end = byte_range
+        with open(pkb_archive.path, 'rb') as f:
+            self.send_body(f, entry_offset + start, end - start + 1)
+
+    def serve_manifest(self):
+        """Serve /manifest?prefix=&offset=&limit=&type=&format=compact from the in-memory client manifest"""
+        client = get_client_manifest()
+        if client is None:
+            self.send_error(404, f"Client directory not found: {CLIENT_DIR}")
+            return
+
+        query = parse_qs(urlparse(self.path).query)
+        try:
+            offset = max(0, int(query.get('offset', ['0'])[0]))
+            limit = min(MANIFEST_MAX_LIMIT, max(1, int(query.get('limit', ['1000'])[0])))
+        except ValueError:
+            self.send_error(400, "offset and limit must be integers")
+            return
+
+        # One validator for every page: a 304 means the whole listing is unchanged
+        etag = client.etag
+        if etag_matches(self.headers.get('If-None-Match'), etag):
+            self.send_response(304)
+            self.send_header('ETag', etag)
+            self.end_headers()
+            return
+
+        page = client.page(
+            prefix=query.get('prefix', [''])[0],
+            offset=offset,
+            limit=limit,
+            file_type=query.get('type', [None])[0],
+            compact=query.get('format', [''])[0] == 'compact',
+        )
+        self.send_json_response(page, etag=etag)
+
+    def serve_client_file(self, head_only=False):
+        """Serve /client/<path>, a file listed in the client manifest, with Range support"""
+        client = get_client_manifest()
+        relative = unquote(urlparse(self.path).path)[len('/client/'):]
+        path = client.resolve(relative) if client else None
+        if path is None:
+            self.send_error(404, f"Not in client manifest: {relative}")
+            return
+
+        try:
+            stat = os.stat(path)
+        except OSError:
+            self.send_error(404, f"File not found: {relative}")
+            return
+        # Archives run to gigabytes, so client files are validated by size and mtime rather
+        # than hashed, and no .gz siblings are written into the install
+        etag = stat_etag(stat)
+        self.serve_file(head_only, path=path, etag=etag, compress=False)
+
+    def serve_script_search(self):
+        """Serve /search-scripts?q=<identifier or phrase>&limit= with file/line hits"""
+        query = parse_qs(urlparse(self.path).query)
+        text = query.get('q', [''])[0]
+        try:
+            limit = min(MANIFEST_MAX_LIMIT, max(1, int(query.get('limit', [script_index.DEFAULT_LIMIT])[0])))
+        except ValueError:
+            self.send_error(400, "limit must be an integer")
+            return
+        if not script_index.tokenize(text):
+            self.send_error(400, "q must contain an identifier or number")
+            return
+
+        index = get_script_index()
+        if index is None:
+            self.send_error(404, f"Client directory not found: {CLIENT_DIR}")
+            return
+        started = time.time()
+        result = index.search(text, limit)
+        result['took_ms'] = round((time.time() - started) * 1000, 2)
+        self.send_json_response(result)
+
+    def send_json_response(self, data, etag=None):
+        """Send JSON response (CORS headers added by end_headers), gzip-compressed when
+        it is large and the client accepts it"""
+        response = json.dumps(data, separators=(',', ':')).encode('utf-8')
+        compressed = len(response) >= GZIP_MIN_SIZE and self.accepts_gzip()
+        if compressed:
+            response = gzip.compress(response, compresslevel=6)
         self.send_response(200)
+        self.send_header('Content-Type', 'application/json')
+        if compressed:
+            self.send_header('Content-Encoding', 'gzip')
+        self.send_header('Vary', 'Accept-Encoding')
+        if etag:
+            self.send_header('ETag', etag)
+        self.send_header('Content-Length', str(len(response)))
         self.end_headers()
+        self.wfile.write(response)
+
 
-os.chdir(os.path.dirname(os.path.abspath(__file__)))
+if __name__ == '__main__':
+    os.chdir(os.path.dirname(os.path.abspath(__file__)))
 
-with socketserver.TCPServer(("", PORT), CORSRequestHandler) as httpd:
-    print(f"Server running at http://localhost:{PORT}")
-    print(f"Serving directory: {os.getcwd()}")
-    print("Press Ctrl+C to stop")
-    httpd.serve_forever()
\ No newline at end of file
+    with ThreadPoolHTTPServer(("", PORT), CORSRequestHandler) as httpd:
+        print(f"Server running at http://localhost:{PORT} ({MAX_THREADS} worker threads)")
+        print(f"Serving directory: {os.getcwd()}")
+        # Build the client manifest and script index in the background so the first requests find them ready
+        threading.Thread(target=get_script_index, name='client-index-build', daemon=True).start()
+        print("Press Ctrl+C to stop")
+        httpd.serve_forever()
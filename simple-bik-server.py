@@ -1,45 +1,79 @@
 #!/usr/bin/env python3
 """
 Simple BIK to MP4 streaming server using only Python standard library
+Transcoded cutscenes are cached on disk (bik.TranscodeCache), so repeat playback
+is served from the cache with ETag and Range support instead of re-encoding.
+Encodes run in a bounded pool (bik.TranscodePool); identical requests share one.
+/hls/ serves the same cutscenes as fixed-length fMP4 segments, encoded on first request.
 """
 
-import os
 import subprocess
 import http.server
 import socketserver
-import json
-from urllib.parse import urlparse, parse_qs
+from urllib.parse import urlparse
 import threading
 import time
 
+import bik
+import peaks
+
 PORT = 8002
 
+catalog = bik.BIKCatalog()
+transcode_cache = bik.TranscodeCache()
+transcode_pool = bik.TranscodePool(transcode_cache)
+
 class BIKHandler(http.server.BaseHTTPRequestHandler):
+    """Routes requests to the shared handling in bik.py and peaks.py, and sends what they return"""
+
     def do_OPTIONS(self):
         """Handle CORS preflight"""
         self.send_response(200)
         self.send_header('Access-Control-Allow-Origin', '*')
         self.send_header('Access-Control-Allow-Methods', 'GET, POST, OPTIONS')
-        self.send_header('Access-Control-Allow-Headers', 'Content-Type')
+        self.send_header('Access-Control-Allow-Headers', 'Content-Type, Range, If-None-Match')
         self.end_headers()
     
     def do_GET(self):
         """Handle GET requests"""
-        if self.path == '/status':
-            self.send_json_response({'status': 'running', 'service': 'bik-proxy'})
-        elif self.path == '/test-ffmpeg':
-            self.test_ffmpeg()
-        elif self.path == '/list-bik-files':
-            self.list_bik_files()
-        elif self.path.startswith('/stream/'):
-            self.stream_bik()
-        else:
-            self.send_error(404, "Not Found")
+        path = urlparse(self.path).path
+        try:
+            if path in ('/status', '/health'):
+                self.send_json_response({
+                    'status': 'running',
+                    'service': 'bik-proxy',
+                    'catalog': len(catalog.entries),
+                    'transcodes': transcode_pool.stats()
+                })
+            elif path == '/test-ffmpeg':
+                self.test_ffmpeg()
+            elif path == '/list-bik-files':
+                self.send_json_response(catalog.page(*bik.page_request(self.path)))
+            elif path.startswith('/stream/') or path == '/convert':
+                self.stream_bik()
+            elif path.startswith('/keyframes/'):
+                self.send_json_response(bik.keyframes_request(transcode_cache, catalog, self.path))
+            elif path.startswith('/hls/'):
+                self.send_result(bik.hls_request(transcode_cache, catalog, self.path))
+            elif path.startswith('/thumb/'):
+                self.send_result(bik.still_request(transcode_cache, catalog, self.path, 'thumb'))
+            elif path.startswith('/sprite/'):
+                self.send_result(bik.still_request(transcode_cache, catalog, self.path, 'sprite'))
+            elif path.startswith('/peaks/'):
+                self.send_result(peaks.peaks_request(transcode_cache, catalog, self.path))
+            else:
+                self.send_error(404, "Not Found")
+        except bik.RequestError as e:
+            self.send_error(e.status, str(e))
     
     def do_POST(self):
         """Handle POST requests"""
         if self.path == '/proxy-url':
-            self.get_proxy_url()
+            post_data = self.rfile.read(int(self.headers.get('Content-Length', 0)))
+            try:
+                self.send_json_response(bik.proxy_urls(post_data, PORT))
+            except bik.RequestError as e:
+                self.send_error(e.status, str(e))
         else:
             self.send_error(404, "Not Found")
     
@@ -61,163 +95,142 @@ class BIKHandler(http.server.BaseHTTPRequestHandler):
         
         self.send_json_response(response)
     
-    def list_bik_files(self):
-        """List available BIK files"""
-        bik_files = []
-        base_path = '/Users/pascaldisse/Sync/SOE_Matrix_Online_Win_EN'
-        
-        for root, dirs, files in os.walk(base_path):
-            for file in files:
-                if file.lower().endswith('.bik'):
-                    full_path = os.path.join(root, file)
-                    relative_path = os.path.relpath(full_path, base_path)
-                    bik_files.append({
-                        'name': file,
-                        'path': full_path,
-                        'relative_path': relative_path,
-                        'size': os.path.getsize(full_path)
-                    })
-        
-        self.send_json_response({'files': bik_files, 'count': len(bik_files)})
-    
-    def get_proxy_url(self):
-        """Generate proxy URL for BIK file"""
-        content_length = int(self.headers.get('Content-Length', 0))
-        post_data = self.rfile.read(content_length)
-        
-        try:
-            data = json.loads(post_data)
-            file_path = data.get('path', '')
-            
-            if file_path == 'test':
-                self.send_json_response({'status': 'ok', 'message': 'Proxy server is running'})
-                return
-            
-            if not file_path:
-                self.send_error(400, "No file path provided")
-                return
-            
-            filename = os.path.basename(file_path)
-            proxy_url = f'http://localhost:{PORT}/stream/{filename}?path={file_path}'
-            
-            self.send_json_response({'url': proxy_url})
-        except json.JSONDecodeError:
-            self.send_error(400, "Invalid JSON")
-    
     def stream_bik(self):
-        """Stream BIK file as MP4"""
-        # Parse the path and query string
-        parsed = urlparse(self.path)
-        filename = parsed.path.split('/stream/')[-1]
-        query_params = parse_qs(parsed.query)
-        bik_path = query_params.get('path', [''])[0]
-        
-        if not bik_path:
-            self.send_error(400, "No path provided")
+        """Stream a cutscene as MP4 (see bik.stream_request): from the cache once encoded,
+        otherwise live from an ffmpeg shared by identical requests"""
+        live = bik.stream_request(transcode_cache, catalog, self.path)
+        if isinstance(live, bik.CachedFile):
+            self.serve_cached(live)
             return
-        
-        # Find the actual file path
-        if not os.path.exists(bik_path):
-            possible_paths = [
-                bik_path,
-                os.path.join('/Users/pascaldisse/Sync/SOE_Matrix_Online_Win_EN', bik_path),
-                os.path.join('/Users/pascaldisse/Sync/SOE_Matrix_Online_Win_EN', 'resource/Bink', filename),
-                os.path.join('/Users/pascaldisse/Sync/SOE_Matrix_Online_Win_EN', 'cinematics', filename)
-            ]
-            
-            actual_path = None
-            for path in possible_paths:
-                if os.path.exists(path):
-                    actual_path = path
-                    break
-            
-            if not actual_path:
-                self.send_error(404, f"File not found: {bik_path}")
-                return
-        else:
-            actual_path = bik_path
-        
-        print(f"Streaming BIK file: {actual_path}")
-        
-        # FFmpeg command
-        cmd = [
-            'ffmpeg',
-            '-i', actual_path,
-            '-c:v', 'libx264',
-            '-preset', 'ultrafast',
-            '-tune', 'zerolatency',
-            '-c:a', 'aac',
-            '-movflags', 'frag_keyframe+empty_moov+faststart',
-            '-f', 'mp4',
-            '-loglevel', 'warning',  # Reduce FFmpeg verbosity
-            'pipe:1'
-        ]
-        
-        # Start FFmpeg process
-        proc = subprocess.Popen(cmd, stdout=subprocess.PIPE, stderr=subprocess.PIPE)
+
+        try:
+            transcode = transcode_pool.transcode(live.key, live.command, keep=live.keep)
+        except bik.PoolSaturated as e:
+            self.send_busy(str(e))
+            return
+
+        reader = transcode.attach() if transcode else None
+        if reader is None:
+            # The encode finished between the cache check and now
+            cached = live.cached()
+            if cached:
+                self.serve_cached(cached)
+            else:
+                self.send_error(502, "Transcode failed")
+            return
+
+        print(f"Streaming BIK file: {live.source} ({transcode_pool.stats()['running']} transcodes running)")
         
         # Send response headers
         self.send_response(200)
-        self.send_header('Content-Type', 'video/mp4')
+        for name, value in live.headers:
+            self.send_header(name, value)
         self.send_header('Access-Control-Allow-Origin', '*')
-        self.send_header('Cache-Control', 'no-cache')
         self.end_headers()
         
-        # Stream the output
+        # Follow the shared encode from the start; identical requests share one ffmpeg
         try:
             bytes_sent = 0
-            while True:
-                chunk = proc.stdout.read(4096)
-                if not chunk:
-                    break
+            for chunk in transcode.follow(reader):
                 self.wfile.write(chunk)
                 bytes_sent += len(chunk)
-                if bytes_sent % (1024 * 100) < 4096:  # Log every ~100KB
-                    print(f"Streamed {bytes_sent / 1024:.1f} KB")
             
             print(f"Streaming complete. Total: {bytes_sent / 1024:.1f} KB")
             
             # Check for FFmpeg errors
-            proc.wait()
-            if proc.returncode != 0:
-                stderr_output = proc.stderr.read().decode('utf-8', errors='ignore')
-                print(f"FFmpeg error (code {proc.returncode}): {stderr_output}")
+            if transcode.returncode != 0 and not transcode.cancelled:
+                stderr_output = transcode.stderr.decode('utf-8', errors='ignore')
+                print(f"FFmpeg error (code {transcode.returncode}): {stderr_output}")
+            elif transcode.cached_path:
+                print(f"Cached transcode: {transcode.cached_path}")
                 
-        except BrokenPipeError:
+        except (BrokenPipeError, ConnectionResetError):
             print("Client disconnected")
         except Exception as e:
             print(f"Streaming error: {e}")
         finally:
-            proc.terminate()
-            proc.wait()
+            transcode.detach(reader)
     
-    def send_json_response(self, data):
-        """Send JSON response with CORS headers"""
-        response = json.dumps(data).encode('utf-8')
-        self.send_response(200)
-        self.send_header('Content-Type', 'application/json')
-        self.send_header('Content-Length', len(response))
+    def send_busy(self, reason):
+        self.send_body(bik.busy_response(reason, transcode_pool.stats()))
+    
+    def send_result(self, result):
+        """Send a bik.Response, or serve a bik.CachedFile"""
+        if isinstance(result, bik.CachedFile):
+            self.serve_cached(result)
+        else:
+            self.send_body(result)
+    
+    def serve_cached(self, cached):
+        """Serve a bik.CachedFile, rendering it in the transcode pool first if needed"""
+        if cached.path is None:
+            try:
+                cached.path = transcode_pool.run(cached.job_key, cached.render)
+            except bik.PoolSaturated as e:
+                self.send_busy(str(e))
+                return
+            except bik.TranscodeError as e:
+                print(f"{cached.failure} failed: {e}")
+                self.send_error(502, cached.error)
+                return
+
+        status, headers, offset, length = cached.head(self.headers.get('If-None-Match'), self.headers.get('Range'))
+        self.send_response(status)
+        for name, value in headers:
+            self.send_header(name, value)
+        self.send_header('Access-Control-Allow-Origin', '*')
+        self.end_headers()
+        if not length:
+            return
+
+        with open(cached.path, 'rb') as f:
+            try:
+                self.connection.sendfile(f, offset, length)
+            except (BrokenPipeError, ConnectionResetError):
+                pass
+    
+    def send_body(self, response):
+        """Send a complete bik.Response with CORS headers"""
+        self.send_response(response.status)
+        for name, value in response.headers:
+            self.send_header(name, value)
+        self.send_header('Content-Length', str(len(response.body)))
         self.send_header('Access-Control-Allow-Origin', '*')
         self.end_headers()
-        self.wfile.write(response)
+        self.wfile.write(response.body)
+    
+    def send_json_response(self, data):
+        """Send JSON response with CORS headers"""
+        self.send_body(bik.json_response(data))
     
     def log_message(self, format, *args):
         """Custom log format"""
         print(f"[{self.log_date_time_string()}] {format % args}")
 
 class ThreadedTCPServer(socketserver.ThreadingMixIn, socketserver.TCPServer):
-    """Handle requests in separate threads"""
+    """Handle requests in separate threads (ffmpeg concurrency is bounded by transcode_pool)"""
     allow_reuse_address = True
+    daemon_threads = True
 
 if __name__ == '__main__':
     print(f"Simple BIK Proxy Server starting on http://localhost:{PORT}")
     print("This server streams BIK files as MP4 in real-time")
     print("Available endpoints:")
     print("  POST /proxy-url - Get streaming URL for a BIK file")
-    print("  GET /stream/<filename> - Stream BIK as MP4")
-    print("  GET /list-bik-files - List available BIK files")
+    print("  GET /stream/<filename>?t=<seconds>&profile=<preview|full|audio> - Stream BIK as MP4, optionally from a time offset")
+    print("  GET /keyframes/<filename> - Duration and keyframes, for /stream/<filename>?t=<seconds>")
+    print("  GET /hls/<filename>/index.m3u8 - HLS playlist of lazily encoded fMP4 segments")
+    print("  GET /thumb/<filename> - Poster frame (JPEG)")
+    print("  GET /sprite/<filename> - Scrub sprite sheet (JPEG, ?layout=1 for its geometry)")
+    print("  GET /peaks/<filename> - Waveform peaks of an audio file or BIK soundtrack (binary)")
+    print("  GET /list-bik-files?offset=&limit= - List available BIK files")
     print("  GET /test-ffmpeg - Test FFmpeg availability")
     
+    print(f"Cataloguing BIK files in {catalog.root}...")
+    catalog.refresh()
+    catalog.start_polling()
+    print(f"Catalogued {len(catalog.entries)} BIK files")
+    
     with ThreadedTCPServer(("", PORT), BIKHandler) as httpd:
         print(f"Server listening on port {PORT}")
         httpd.serve_forever()
\ No newline at end of file
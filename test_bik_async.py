@@ -0,0 +1,175 @@
+#!/usr/bin/env python3
+"""
+Test the asyncio BIK transcode pool and streaming server
+"""
+
+import asyncio
+import importlib.util
+import os
+import sys
+import tempfile
+import time
+
+import bik
+from test_bik_pool import fake_command
+
+
+def load_async_server():
+    """Import async-bik-server.py (not importable by name because of the hyphens)"""
+    path = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'async-bik-server.py')
+    spec = importlib.util.spec_from_file_location('async_bik_server', path)
+    module = importlib.util.module_from_spec(spec)
+    spec.loader.exec_module(module)
+    return module
+
+
+async def read_all(transcode):
+    reader = transcode.attach()
+    try:
+        return b''.join([chunk async for chunk in transcode.follow(reader)])
+    finally:
+        transcode.detach(reader)
+
+
+def test_async_coalescing():
+    """Test that identical requests share one asyncio encode and the output is cached"""
+    print("🔗 Testing asyncio request coalescing...")
+
+    async def scenario(directory):
+        pool = bik.AsyncTranscodePool(bik.TranscodeCache(directory), max_jobs=1, queue_timeout=0.1)
+        first = await pool.transcode('aa' * 20, fake_command())
+        second = await pool.transcode('aa' * 20, fake_command())
+        reading = asyncio.gather(read_all(first), read_all(second))
+        try:
+            await pool.transcode('bb' * 20, fake_command())
+            saturated = False
+        except bik.PoolSaturated:
+            saturated = True
+        results = await reading
+        # Followers reach EOF when ffmpeg exits; the cache entry is committed after that
+        committed = await first.wait(5)
+        return pool, first, second, results, saturated and committed
+
+    with tempfile.TemporaryDirectory() as directory:
+        pool, first, second, results, saturated = asyncio.run(scenario(directory))
+        expected = b''.join(bytes([i]) * 1000 for i in range(8))
+        checks = [
+            ('Same encode joined', first is second),
+            ('Both clients got everything', results == [expected, expected]),
+            ('Output cached', first.cached_path is not None and first.cached_path == pool.cache.lookup('aa' * 20)),
+            ('Second encode rejected while the pool is full', saturated),
+            ('Slot released', pool.stats()['running'] == 0),
+        ]
+        for name, check in checks:
+            print(f"{'✅' if check else '❌'} {name}")
+        assert all(check for _, check in checks)
+
+
+def test_disconnect_kills_encode():
+    """Test that closing a streaming connection kills ffmpeg while it is still waiting for output"""
+    print("\n✂️ Testing disconnect handling...")
+    server_module = load_async_server()
+
+    async def scenario(directory, source):
+        server = await asyncio.start_server(
+            lambda r, w: server_module.BIKConnection(r, w).handle(), '127.0.0.1', 0)
+        port = server.sockets[0].getsockname()[1]
+        async with server:
+            reader, writer = await asyncio.open_connection('127.0.0.1', port)
+            writer.write(f'GET /stream/intro.bik?path={source} HTTP/1.1\r\nHost: localhost\r\n\r\n'.encode('ascii'))
+            await writer.drain()
+            head = await reader.readuntil(b'\r\n\r\n')
+            await reader.readexactly(1000)
+            transcode = next(iter(server_module.transcode_pool._inflight.values()))
+            # The encoder now sleeps between chunks; the server must notice the close at once
+            writer.close()
+            closed_at = time.monotonic()
+            await asyncio.wait_for(transcode.wait(), 5)
+            return head, transcode, time.monotonic() - closed_at
+
+    with tempfile.TemporaryDirectory() as directory:
+        source = os.path.join(directory, 'intro.bik')
+        with open(source, 'wb') as f:
+            f.write(b'BIKi' + b'\0' * 60)
+        server_module.transcode_cache = bik.TranscodeCache(os.path.join(directory, 'cache'))
+        server_module.transcode_pool = bik.AsyncTranscodePool(server_module.transcode_cache, max_jobs=1)
+        original = bik.transcode_command
+        bik.transcode_command = lambda *args, **kwargs: fake_command(count=10, size=1000, delay=2)
+        try:
+            head, transcode, elapsed = asyncio.run(scenario(directory, source))
+        finally:
+            bik.transcode_command = original
+
+        checks = [
+            ('Stream started', head.startswith(b'HTTP/1.1 200')),
+            ('Encode cancelled', transcode.cancelled and transcode.returncode != 0),
+            ('Killed before the next chunk', elapsed < 1.5),
+            ('Nothing cached', transcode.cached_path is None),
+            ('Slot released', server_module.transcode_pool.stats()['running'] == 0),
+        ]
+        for name, check in checks:
+            print(f"{'✅' if check else '❌'} {name}")
+        assert all(check for _, check in checks)
+
+
+def test_async_serve_cached():
+    """Test Range requests against a cached transcode on the asyncio server"""
+    print("\n🎬 Testing asyncio cached serving...")
+    server_module = load_async_server()
+
+    async def request(port, target, headers=''):
+        reader, writer = await asyncio.open_connection('127.0.0.1', port)
+        writer.write(f'GET {target} HTTP/1.1\r\nHost: localhost\r\n{headers}\r\n'.encode('ascii'))
+        response = await reader.read()
+        writer.close()
+        head, _, body = response.partition(b'\r\n\r\n')
+        return head.decode('iso-8859-1'), body
+
+    async def scenario(source):
+        server = await asyncio.start_server(
+            lambda r, w: server_module.BIKConnection(r, w).handle(), '127.0.0.1', 0)
+        port = server.sockets[0].getsockname()[1]
+        async with server:
+            full = await request(port, f'/stream/intro.bik?path={source}')
+            partial = await request(port, f'/stream/intro.bik?path={source}', 'Range: bytes=256-259\r\n')
+            status = await request(port, '/status')
+        return full, partial, status
+
+    with tempfile.TemporaryDirectory() as directory:
+        source = os.path.join(directory, 'intro.bik')
+        with open(source, 'wb') as f:
+            f.write(b'BIKi' + b'\0' * 60)
+        server_module.transcode_cache = bik.TranscodeCache(os.path.join(directory, 'cache'))
+        writer = server_module.transcode_cache.writer(server_module.transcode_cache.key(source))
+        writer.write(bytes(range(256)) * 4)
+        writer.commit(remux=False)
+
+        full, partial, status = asyncio.run(scenario(source))
+        checks = [
+            ('Full body from cache', full[0].startswith('HTTP/1.1 200') and full[1] == bytes(range(256)) * 4),
+            ('Range request', 'Content-Range: bytes 256-259/1024' in partial[0] and partial[1] == bytes([0, 1, 2, 3])),
+            ('Status endpoint', '"server": "asyncio"' in status[1].decode('utf-8')),
+        ]
+        for name, check in checks:
+            print(f"{'✅' if check else '❌'} {name}")
+        assert all(check for _, check in checks)
+
+
+def run_bik_async_tests():
+    """Run all asyncio BIK proxy tests"""
+    print("🧪 ASYNCIO BIK PROXY TESTS")
+    print("=" * 40)
+    try:
+        test_async_coalescing()
+        test_disconnect_kills_encode()
+        test_async_serve_cached()
+    except AssertionError as e:
+        print(f"❌ asyncio BIK proxy tests failed {e}")
+        return False
+    print("\n✅ All asyncio BIK proxy tests passed!")
+    return True
+
+
+if __name__ == "__main__":
+    success = run_bik_async_tests()
+    sys.exit(0 if success else 1)
@@ -0,0 +1,292 @@
+#!/usr/bin/env python3
+"""
+Test the BIK transcode cache and cached MP4 serving
+"""
+
+import importlib.util
+import os
+import sys
+import tempfile
+import threading
+import urllib.request
+from urllib.error import HTTPError
+from urllib.parse import quote
+
+import bik
+
+
+def load_bik_server():
+    """Import simple-bik-server.py (not importable by name because of the hyphens)"""
+    path = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'simple-bik-server.py')
+    spec = importlib.util.spec_from_file_location('simple_bik_server', path)
+    module = importlib.util.module_from_spec(spec)
+    spec.loader.exec_module(module)
+    return module
+
+
+def test_cache_keys():
+    """Test that keys follow the source file and encode settings"""
+    print("🔑 Testing transcode cache keys...")
+    with tempfile.TemporaryDirectory() as directory:
+        source = os.path.join(directory, 'intro.bik')
+        with open(source, 'wb') as f:
+            f.write(b'BIKi' + b'\0' * 60)
+        cache = bik.TranscodeCache(os.path.join(directory, 'cache'))
+
+        key = cache.key(source)
+        same = cache.key(source)
+        other_settings = cache.key(source, ('-c:v', 'libx264', '-crf', '30'))
+        os.utime(source, ns=(0, 1_000_000_000))
+        touched = cache.key(source)
+
+        checks = [
+            ('Stable key', key == same),
+            ('Settings change key', key != other_settings),
+            ('Mtime changes key', key != touched),
+            ('Nothing cached yet', cache.lookup(key) is None),
+        ]
+        for name, check in checks:
+            print(f"{'✅' if check else '❌'} {name}")
+        assert all(check for _, check in checks)
+
+
+def test_cache_writer():
+    """Test committing and discarding teed transcode output"""
+    print("\n💾 Testing cache writer...")
+    with tempfile.TemporaryDirectory() as directory:
+        cache = bik.TranscodeCache(directory)
+
+        writer = cache.writer('ab' * 20)
+        writer.write(b'partial')
+        writer.discard()
+        assert cache.lookup('ab' * 20) is None
+        print("✅ Discarded output not cached")
+
+        writer = cache.writer('cd' * 20)
+        writer.write(b'\0\0\0\x18ftypmp42')
+        writer.write(b'rest')
+        path = writer.commit(remux=False)
+        assert cache.lookup('cd' * 20) == path
+        with open(path, 'rb') as f:
+            assert f.read() == b'\0\0\0\x18ftypmp42rest'
+        assert not [name for name in os.listdir(os.path.dirname(path)) if name.endswith('.part')]
+        print("✅ Committed output cached")
+
+        # A client following the fragmented part file keeps reading it while the remux is moved in
+        writer = cache.writer('ef' * 20)
+        writer.write(b'fragmented')
+        follower = open(writer.part_path, 'rb')
+        original = bik.remux_command
+        bik.remux_command = lambda source, output: [
+            sys.executable, '-c',
+            "import sys; open(sys.argv[2], 'wb').write(b'moov' + open(sys.argv[1], 'rb').read())",
+            source, output]
+        try:
+            path = writer.commit()
+        finally:
+            bik.remux_command = original
+        with follower:
+            followed = follower.read(len(b'fragmented'))
+        with open(path, 'rb') as f:
+            assert f.read() == b'moovfragmented'
+        assert followed == b'fragmented'
+        assert not [name for name in os.listdir(os.path.dirname(path)) if '.part' in name]
+        print("✅ Remux leaves the followed part file intact")
+
+
+def test_keyframe_index():
+    """Test keyframe lookup and the cached keyframe index"""
+    print("\n⏩ Testing keyframe index...")
+    with tempfile.TemporaryDirectory() as directory:
+        source = os.path.join(directory, 'intro.bik')
+        with open(source, 'wb') as f:
+            f.write(b'BIKi' + b'\0' * 60)
+        cache = bik.TranscodeCache(os.path.join(directory, 'cache'))
+
+        probes = []
+        original = bik.probe, bik.probe_keyframes
+        bik.probe = lambda path: {'duration': 300.0, 'width': 640, 'height': 480}
+        bik.probe_keyframes = lambda path: probes.append(path) or [0.0, 10.0, 20.0, 240.0]
+        try:
+            index = cache.keyframes(source)
+            reloaded = bik.TranscodeCache(cache.directory).keyframes(source)
+        finally:
+            bik.probe, bik.probe_keyframes = original
+
+        command = bik.transcode_command(source, start=240.0)
+        checks = [
+            ('Duration probed', index['duration'] == 300.0),
+            ('Index persisted and reused', reloaded == index and len(probes) == 1),
+            ('Seek before first keyframe', bik.nearest_keyframe(index['keyframes'], 5) == 0.0),
+            ('Seek between keyframes', bik.nearest_keyframe(index['keyframes'], 239.9) == 20.0),
+            ('Seek past last keyframe', bik.nearest_keyframe(index['keyframes'], 299) == 240.0),
+            ('Empty index', bik.nearest_keyframe([], 12) == 0.0),
+            ('Input seek before -i', command.index('-ss') < command.index('-i') and '240.000' in command),
+            ('Start changes cache key', cache.key(source, start=240.0) != cache.key(source)),
+        ]
+        for name, check in checks:
+            print(f"{'✅' if check else '❌'} {name}")
+        assert all(check for _, check in checks)
+
+
+def test_encode_profiles():
+    """Test that encode profiles are validated and cached separately"""
+    print("\n🎚️ Testing encode profiles...")
+    with tempfile.TemporaryDirectory() as directory:
+        source = os.path.join(directory, 'intro.bik')
+        with open(source, 'wb') as f:
+            f.write(b'BIKi' + b'\0' * 60)
+        cache = bik.TranscodeCache(os.path.join(directory, 'cache'))
+
+        keys = {name: cache.key(source, profile['args']) for name, profile in bik.ENCODE_PROFILES.items()}
+        preview = bik.transcode_command(source, bik.encode_profile('preview')['args'])
+        try:
+            bik.encode_profile('4k')
+            rejected = False
+        except ValueError:
+            rejected = True
+
+        checks = [
+            ('Default profile is full', bik.encode_profile('') is bik.ENCODE_PROFILES['full']),
+            ('Full profile keeps existing cache', keys['full'] == cache.key(source)),
+            ('Each profile cached separately', len(set(keys.values())) == len(bik.ENCODE_PROFILES)),
+            ('Preview scaled to 360p', 'scale=-2:360' in preview),
+            ('Audio profile drops video', '-vn' in bik.encode_profile('audio')['args']),
+            ('Unknown profile rejected', rejected),
+        ]
+        for name, check in checks:
+            print(f"{'✅' if check else '❌'} {name}")
+        assert all(check for _, check in checks)
+
+
+def test_stills():
+    """Test poster/sprite rendering into the cache"""
+    print("\n🖼️ Testing cached stills...")
+    with tempfile.TemporaryDirectory() as directory:
+        source = os.path.join(directory, 'intro.bik')
+        with open(source, 'wb') as f:
+            f.write(b'BIKi' + b'\0' * 60)
+        cache = bik.TranscodeCache(os.path.join(directory, 'cache'))
+
+        renders = []
+
+        def fake_render(output):
+            renders.append(output)
+            return [sys.executable, '-c', f"open({output!r}, 'wb').write(b'JPEG')"]
+
+        path = cache.render_still(source, 'thumb', fake_render)
+        again = cache.render_still(source, 'thumb', fake_render)
+        try:
+            cache.render_still(source, 'sprite', lambda output: [sys.executable, '-c', 'raise SystemExit(1)'])
+            failed = False
+        except bik.TranscodeError:
+            failed = True
+
+        layout = bik.sprite_layout(250.0, frames=100, columns=10, tile=(160, 90))
+        command = bik.sprite_command(source, 250.0, 'sprite.jpg')
+        checks = [
+            ('Still cached', os.path.isfile(path) and path == cache.still_path(source, 'thumb')),
+            ('Rendered once', again == path and len(renders) == 1),
+            ('Failed render raises', failed and not os.path.exists(cache.still_path(source, 'sprite'))),
+            ('Sprite layout', layout['rows'] == 10 and layout['interval'] == 2.5),
+            ('Sprite filter', 'fps=1/2.500000' in command[command.index('-vf') + 1] and 'tile=10x10' in command[command.index('-vf') + 1]),
+        ]
+        for name, check in checks:
+            print(f"{'✅' if check else '❌'} {name}")
+        assert all(check for _, check in checks)
+
+
+def test_serve_cached():
+    """Test ETag revalidation and Range requests against a cached transcode"""
+    print("\n🎬 Testing cached MP4 serving...")
+    server_module = load_bik_server()
+    with tempfile.TemporaryDirectory() as directory:
+        source = os.path.join(directory, 'intro.bik')
+        with open(source, 'wb') as f:
+            f.write(b'BIKi' + b'\0' * 60)
+        server_module.transcode_cache = bik.TranscodeCache(os.path.join(directory, 'cache'))
+        key = server_module.transcode_cache.key(source)
+        writer = server_module.transcode_cache.writer(key)
+        writer.write(bytes(range(256)) * 4)
+        writer.commit(remux=False)
+        writer = server_module.transcode_cache.writer(
+            server_module.transcode_cache.key(source, bik.encode_profile('audio')['args']))
+        writer.write(b'AUDIO')
+        writer.commit(remux=False)
+
+        httpd = server_module.ThreadedTCPServer(('127.0.0.1', 0), server_module.BIKHandler)
+        server_module.BIKHandler.log_message = lambda *args: None
+        thread = threading.Thread(target=httpd.serve_forever, daemon=True)
+        thread.start()
+        url = f'http://127.0.0.1:{httpd.server_address[1]}/stream/intro.bik?path={quote(source)}'
+        original = bik.probe, bik.probe_keyframes
+        bik.probe = lambda path: {'duration': 30.0}
+        bik.probe_keyframes = lambda path: [0.0, 10.0, 20.0]
+
+        try:
+            with urllib.request.urlopen(url) as response:
+                etag = response.headers['ETag']
+                body = response.read()
+            with urllib.request.urlopen(urllib.request.Request(url, headers={'Range': 'bytes=256-259'})) as response:
+                partial = (response.status, response.headers['Content-Range'], response.read())
+            try:
+                urllib.request.urlopen(urllib.request.Request(url, headers={'If-None-Match': etag}))
+                revalidated = None
+            except HTTPError as e:
+                revalidated = e.code
+            try:
+                urllib.request.urlopen(urllib.request.Request(url, headers={'If-None-Match': f'"other", W/{etag}'}))
+                revalidated_list = None
+            except HTTPError as e:
+                revalidated_list = e.code
+            with urllib.request.urlopen(url + '&t=15') as response:
+                seek = (response.headers['X-Start-Time'], response.headers['Accept-Ranges'], response.read())
+            with urllib.request.urlopen(url + '&profile=audio') as response:
+                audio = (response.headers['Content-Type'], response.read())
+            try:
+                urllib.request.urlopen(url + '&profile=4k')
+                bad_profile = None
+            except HTTPError as e:
+                bad_profile = e.code
+        finally:
+            bik.probe, bik.probe_keyframes = original
+            httpd.shutdown()
+            httpd.server_close()
+
+        checks = [
+            ('Full body from cache', body == bytes(range(256)) * 4),
+            ('Seek served from the whole cached transcode', seek == ('0.000', 'bytes', body)),
+            ('No seek encode started', server_module.transcode_pool.stats()['running'] == 0),
+            ('ETag is the cache key', etag == f'"{key}"'),
+            ('Range request', partial == (206, 'bytes 256-259/1024', bytes([0, 1, 2, 3]))),
+            ('If-None-Match gives 304', revalidated == 304),
+            ('Tag lists and weak tags match', revalidated_list == 304),
+            ('Audio profile cached separately', audio == ('audio/mp4', b'AUDIO')),
+            ('Unknown profile gives 400', bad_profile == 400),
+        ]
+        for name, check in checks:
+            print(f"{'✅' if check else '❌'} {name}")
+        assert all(check for _, check in checks)
+
+
+def run_bik_cache_tests():
+    """Run all BIK transcode cache tests"""
+    print("🧪 BIK TRANSCODE CACHE TESTS")
+    print("=" * 40)
+    try:
+        test_cache_keys()
+        test_cache_writer()
+        test_keyframe_index()
+        test_encode_profiles()
+        test_stills()
+        test_serve_cached()
+    except AssertionError as e:
+        print(f"❌ BIK cache tests failed {e}")
+        return False
+    print("\n✅ All BIK cache tests passed!")
+    return True
+
+
+if __name__ == "__main__":
+    success = run_bik_cache_tests()
+    sys.exit(0 if success else 1)
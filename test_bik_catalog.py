@@ -0,0 +1,103 @@
+#!/usr/bin/env python3
+"""
+Test the in-memory BIK catalog
+"""
+
+import os
+import sys
+import tempfile
+
+import bik
+
+BIK_FILES = ['resource/Bink/intro.bik', 'cinematics/Chapter1.BIK', 'cinematics/chapter2.bik']
+
+
+def create_bik_tree(directory):
+    """Write placeholder BIK files (and one non-BIK file) under directory"""
+    for relative_path in BIK_FILES + ['resource/readme.txt']:
+        path = os.path.join(directory, *relative_path.split('/'))
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        with open(path, 'wb') as f:
+            f.write(b'BIKi' + relative_path.encode('ascii'))
+
+
+def test_catalog_lookup():
+    """Test catalog contents and path resolution"""
+    print("🗂️ Testing BIK catalog lookup...")
+    with tempfile.TemporaryDirectory() as directory:
+        create_bik_tree(directory)
+        probed = []
+
+        def fake_probe(path):
+            probed.append(path)
+            return {'duration': 12.5, 'width': 640, 'height': 480}
+
+        catalog = bik.BIKCatalog(directory, prober=fake_probe)
+        catalog.refresh()
+        intro = os.path.join(directory, 'resource', 'Bink', 'intro.bik')
+
+        checks = [
+            ('Only BIK files', len(catalog.entries) == 3),
+            ('Sorted by relative path', [e['relative_path'] for e in catalog.entries] == sorted(BIK_FILES, key=str.lower)),
+            ('Probe results stored', catalog.entries[0]['duration'] == 12.5 and catalog.entries[0]['width'] == 640),
+            ('Resolve relative path', catalog.resolve('resource/Bink/intro.bik') == intro),
+            ('Resolve from picked folder', catalog.resolve('SOE_Matrix_Online/resource/Bink/intro.bik') == intro),
+            ('Resolve bare name', catalog.resolve('CHAPTER1.bik').endswith('Chapter1.BIK')),
+            ('Unknown file', catalog.resolve('missing.bik') is None),
+        ]
+        for name, check in checks:
+            print(f"{'✅' if check else '❌'} {name}")
+        assert all(check for _, check in checks)
+
+
+def test_catalog_refresh():
+    """Test that refresh only re-probes new or changed files"""
+    print("\n🔄 Testing BIK catalog refresh...")
+    with tempfile.TemporaryDirectory() as directory:
+        create_bik_tree(directory)
+        catalog = bik.BIKCatalog(directory, prober=lambda path: {'duration': None, 'width': None, 'height': None})
+        assert catalog.refresh() == 3
+        assert catalog.refresh() == 0
+        print("✅ Unchanged files not re-probed")
+
+        with open(os.path.join(directory, 'cinematics', 'chapter2.bik'), 'ab') as f:
+            f.write(b'more')
+        with open(os.path.join(directory, 'cinematics', 'chapter3.bik'), 'wb') as f:
+            f.write(b'BIKi')
+        assert catalog.refresh() == 2
+        assert len(catalog.entries) == 4
+        print("✅ Changed and new files probed")
+
+
+def test_catalog_pages():
+    """Test catalog pagination"""
+    print("\n📄 Testing BIK catalog pagination...")
+    with tempfile.TemporaryDirectory() as directory:
+        create_bik_tree(directory)
+        catalog = bik.BIKCatalog(directory, prober=lambda path: {})
+        catalog.refresh()
+        page = catalog.page(offset=1, limit=1)
+        assert page['count'] == 3 and len(page['files']) == 1
+        assert page['files'][0]['relative_path'] == 'cinematics/chapter2.bik'
+        assert catalog.page(offset=10)['files'] == []
+        print("✅ Pages slice the sorted catalog")
+
+
+def run_bik_catalog_tests():
+    """Run all BIK catalog tests"""
+    print("🧪 BIK CATALOG TESTS")
+    print("=" * 40)
+    try:
+        test_catalog_lookup()
+        test_catalog_refresh()
+        test_catalog_pages()
+    except AssertionError as e:
+        print(f"❌ BIK catalog tests failed {e}")
+        return False
+    print("\n✅ All BIK catalog tests passed!")
+    return True
+
+
+if __name__ == "__main__":
+    success = run_bik_catalog_tests()
+    sys.exit(0 if success else 1)
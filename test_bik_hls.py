@@ -0,0 +1,87 @@
+#!/usr/bin/env python3
+"""
+Test HLS playlists and segment caching for BIK cutscenes
+"""
+
+import os
+import sys
+import tempfile
+
+import bik
+
+
+def test_playlist():
+    """Test the VOD playlist layout"""
+    print("📜 Testing HLS playlist...")
+    playlist = bik.hls_playlist(20.5, 6, '?path=intro.bik&v=abc')
+    lines = playlist.splitlines()
+    durations = [line for line in lines if line.startswith('#EXTINF')]
+
+    checks = [
+        ('Header', lines[0] == '#EXTM3U' and '#EXT-X-TARGETDURATION:6' in lines),
+        ('Segment count', bik.segment_count(20.5, 6) == 4 and len(durations) == 4),
+        ('Exact multiple', bik.segment_count(18, 6) == 3),
+        ('Last segment shorter', durations[-1] == '#EXTINF:2.500,'),
+        ('Per-segment init', '#EXT-X-MAP:URI="3.init.mp4?path=intro.bik&v=abc"' in lines),
+        ('Segment URIs keep the query', '0.m4s?path=intro.bik&v=abc' in lines),
+        ('VOD playlist ends', lines[-1] == '#EXT-X-ENDLIST'),
+    ]
+    for name, check in checks:
+        print(f"{'✅' if check else '❌'} {name}")
+    assert all(check for _, check in checks)
+
+
+def test_segment_command():
+    """Test the per-segment ffmpeg command"""
+    print("\n🎞️ Testing segment command...")
+    command = bik.segment_command('intro.bik', 3, 6, '/tmp/work')
+    checks = [
+        ('Seeks to the segment start', command[command.index('-ss') + 1] == '18.000'),
+        ('Limited to one segment', command[command.index('-t') + 1] == '6.000'),
+        ('Timestamps offset to the segment start', command[command.index('-output_ts_offset') + 1] == '18.000'),
+        ('fMP4 segments', command[command.index('-hls_segment_type') + 1] == 'fmp4'),
+    ]
+    for name, check in checks:
+        print(f"{'✅' if check else '❌'} {name}")
+    assert all(check for _, check in checks)
+
+
+def test_failed_segment():
+    """Test that a failed encode raises TranscodeError and caches nothing"""
+    print("\n💥 Testing failed segment encode...")
+    with tempfile.TemporaryDirectory() as directory:
+        source = os.path.join(directory, 'broken.bik')
+        with open(source, 'wb') as f:
+            f.write(b'not a video')
+        cache = bik.TranscodeCache(os.path.join(directory, 'cache'))
+        try:
+            cache.encode_segment(source, 0)
+        except bik.TranscodeError:
+            print("✅ TranscodeError raised")
+        else:
+            raise AssertionError("encoding a broken file should fail")
+
+        assert cache.segment(source, 0) is None
+        leftovers = [name for _, _, files in os.walk(cache.directory) for name in files]
+        assert leftovers == [], leftovers
+        print("✅ Nothing left in the cache")
+
+
+def run_bik_hls_tests():
+    """Run all BIK HLS tests"""
+    print("🧪 BIK HLS TESTS")
+    print("=" * 40)
+    try:
+        test_playlist()
+        test_segment_command()
+        test_failed_segment()
+    except AssertionError as e:
+        print(f"❌ BIK HLS tests failed {e}")
+        return False
+    print("\n✅ All BIK HLS tests passed!")
+    return True
+
+
+if __name__ == "__main__":
+    success = run_bik_hls_tests()
+    sys.exit(0 if success else 1)
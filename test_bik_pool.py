@@ -0,0 +1,228 @@
+#!/usr/bin/env python3
+"""
+Test the bounded BIK transcode pool and request coalescing
+"""
+
+import os
+import sys
+import tempfile
+import threading
+import time
+
+import bik
+
+# Stand-in for ffmpeg: writes `count` chunks of `size` bytes, `delay` seconds apart
+FAKE_ENCODER = (
+    "import sys, time\n"
+    "count, size, delay = int(sys.argv[1]), int(sys.argv[2]), float(sys.argv[3])\n"
+    "for i in range(count):\n"
+    "    sys.stdout.buffer.write(bytes([i % 256]) * size)\n"
+    "    sys.stdout.buffer.flush()\n"
+    "    time.sleep(delay)\n"
+)
+
+
+def fake_command(count=8, size=1000, delay=0.01):
+    return [sys.executable, '-c', FAKE_ENCODER, str(count), str(size), str(delay)]
+
+
+def read_all(transcode, results, slot):
+    reader = transcode.attach()
+    try:
+        results[slot] = b''.join(transcode.follow(reader))
+    finally:
+        transcode.detach(reader)
+
+
+def test_coalescing():
+    """Test that identical requests share one encode and the output is cached"""
+    print("🔗 Testing request coalescing...")
+    with tempfile.TemporaryDirectory() as directory:
+        pool = bik.TranscodePool(bik.TranscodeCache(directory), max_jobs=2, queue_timeout=1)
+        first = pool.transcode('aa' * 20, fake_command())
+        second = pool.transcode('aa' * 20, fake_command())
+
+        results = {}
+        threads = [threading.Thread(target=read_all, args=(t, results, i)) for i, t in enumerate((first, second))]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join(10)
+        # Followers reach EOF when ffmpeg exits; the cache entry is committed after that
+        first.wait(5)
+
+        expected = b''.join(bytes([i]) * 1000 for i in range(8))
+        checks = [
+            ('Same encode joined', first is second),
+            ('First client got everything', results.get(0) == expected),
+            ('Second client got everything', results.get(1) == expected),
+            ('Output cached', first.cached_path is not None and first.cached_path == pool.cache.lookup('aa' * 20)),
+            ('Slot released', pool.stats()['running'] == 0),
+        ]
+        for name, check in checks:
+            print(f"{'✅' if check else '❌'} {name}")
+        assert all(check for _, check in checks)
+
+
+def test_uncached_stream():
+    """Test that an encode started with keep=False is shared but not cached"""
+    print("\n⏩ Testing uncached seek encodes...")
+    with tempfile.TemporaryDirectory() as directory:
+        pool = bik.TranscodePool(bik.TranscodeCache(directory), max_jobs=2, queue_timeout=1)
+        first = pool.transcode('ee' * 20, fake_command(), keep=False)
+        second = pool.transcode('ee' * 20, fake_command(), keep=False)
+
+        results = {}
+        threads = [threading.Thread(target=read_all, args=(t, results, i)) for i, t in enumerate((first, second))]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join(10)
+        first.wait(5)
+
+        expected = b''.join(bytes([i]) * 1000 for i in range(8))
+        leftovers = [name for _, _, files in os.walk(directory) for name in files]
+        checks = [
+            ('Same encode joined', first is second),
+            ('Both clients got everything', results.get(0) == expected and results.get(1) == expected),
+            ('Output not cached', first.cached_path is None and pool.cache.lookup('ee' * 20) is None),
+            ('Spool file removed', leftovers == []),
+        ]
+        for name, check in checks:
+            print(f"{'✅' if check else '❌'} {name}")
+        assert all(check for _, check in checks)
+
+
+def test_eof_before_remux():
+    """Test that followers reach EOF when ffmpeg exits, while the remux is still running"""
+    print("\n🏁 Testing end of stream before the remux...")
+    with tempfile.TemporaryDirectory() as directory:
+        pool = bik.TranscodePool(bik.TranscodeCache(directory), max_jobs=1, queue_timeout=1)
+        original = bik.remux_command
+        bik.remux_command = lambda source, output: [
+            sys.executable, '-c',
+            "import sys, time; time.sleep(1); open(sys.argv[2], 'wb').write(b'moov' + open(sys.argv[1], 'rb').read())",
+            source, output]
+        try:
+            transcode = pool.transcode('ff' * 20, fake_command(count=4))
+            results = {}
+            read_all(transcode, results, 'first')
+            first_committed = transcode.done
+            # Joining during the remux still streams the complete encode
+            read_all(transcode, results, 'late')
+            late_committed = transcode.done
+            transcode.wait(5)
+        finally:
+            bik.remux_command = original
+
+        expected = b''.join(bytes([i]) * 1000 for i in range(4))
+        with open(transcode.cached_path, 'rb') as f:
+            cached = f.read()
+        checks = [
+            ('Follower finished before the remux', results.get('first') == expected and not first_committed),
+            ('Late joiner got the whole encode', results.get('late') == expected and not late_committed),
+            ('Remuxed output cached afterwards', cached == b'moov' + expected),
+        ]
+        for name, check in checks:
+            print(f"{'✅' if check else '❌'} {name}")
+        assert all(check for _, check in checks)
+
+
+def test_saturation():
+    """Test that requests beyond max_jobs time out with PoolSaturated"""
+    print("\n🚦 Testing admission control...")
+    with tempfile.TemporaryDirectory() as directory:
+        pool = bik.TranscodePool(bik.TranscodeCache(directory), max_jobs=1, queue_timeout=0.1)
+        busy = pool.transcode('bb' * 20, fake_command(count=50, delay=0.02))
+        reader = busy.attach()
+        try:
+            pool.transcode('cc' * 20, fake_command())
+        except bik.PoolSaturated:
+            print("✅ Second encode rejected while the pool is full")
+        else:
+            raise AssertionError("second encode should be rejected")
+        finally:
+            busy.detach(reader)
+            busy.wait(5)
+
+
+def test_cancel_on_detach():
+    """Test that the last client leaving cancels the encode and caches nothing"""
+    print("\n✂️ Testing cancellation on disconnect...")
+    with tempfile.TemporaryDirectory() as directory:
+        pool = bik.TranscodePool(bik.TranscodeCache(directory), max_jobs=1, queue_timeout=1)
+        transcode = pool.transcode('dd' * 20, fake_command(count=200, delay=0.02))
+        reader = transcode.attach()
+        next(transcode.follow(reader))
+        transcode.detach(reader)
+
+        replacement = pool.transcode('dd' * 20, fake_command(count=1))
+        read_all(replacement, {}, 0)
+        replacement.wait(5)
+        checks = [
+            ('Encode cancelled', transcode.cancelled),
+            ('Nothing cached', transcode.cached_path is None),
+            ('New request starts a fresh encode', replacement is not transcode),
+        ]
+        for name, check in checks:
+            print(f"{'✅' if check else '❌'} {name}")
+        assert all(check for _, check in checks)
+
+
+def test_run_coalescing():
+    """Test that concurrent run() calls with one key execute the job once"""
+    print("\n🧮 Testing coalesced jobs...")
+    pool = bik.TranscodePool(None, max_jobs=2, queue_timeout=1)
+    started = threading.Event()
+    release = threading.Event()
+    calls = []
+
+    def job():
+        calls.append(1)
+        started.set()
+        release.wait(5)
+        return 'segment'
+
+    results = {}
+    first = threading.Thread(target=lambda: results.setdefault('first', pool.run('seg:0', job)))
+    first.start()
+    started.wait(5)
+    second = threading.Thread(target=lambda: results.setdefault('second', pool.run('seg:0', job)))
+    second.start()
+    while pool.stats()['waiting'] == 0:
+        time.sleep(0.01)
+    release.set()
+    first.join(5)
+    second.join(5)
+
+    checks = [
+        ('Job ran once', len(calls) == 1),
+        ('Both callers got the result', results == {'first': 'segment', 'second': 'segment'}),
+        ('Nothing left running', pool.stats()['running'] == 0 and pool.stats()['waiting'] == 0),
+    ]
+    for name, check in checks:
+        print(f"{'✅' if check else '❌'} {name}")
+    assert all(check for _, check in checks)
+
+
+def run_bik_pool_tests():
+    """Run all BIK transcode pool tests"""
+    print("🧪 BIK TRANSCODE POOL TESTS")
+    print("=" * 40)
+    try:
+        test_coalescing()
+        test_uncached_stream()
+        test_eof_before_remux()
+        test_saturation()
+        test_cancel_on_detach()
+        test_run_coalescing()
+    except AssertionError as e:
+        print(f"❌ BIK pool tests failed {e}")
+        return False
+    print("\n✅ All BIK pool tests passed!")
+    return True
+
+
+if __name__ == "__main__":
+    success = run_bik_pool_tests()
+    sys.exit(0 if success else 1)
@@ -0,0 +1,78 @@
+#!/usr/bin/env python3
+"""
+Test the parallel bulk PKB extractor
+"""
+
+import json
+import os
+import sys
+import tempfile
+
+import extract_pkb
+from test_pkb_archive import FILES, create_client_install
+
+
+def test_extract_to_directory():
+    """Test extraction into a directory tree"""
+    print("📂 Testing extraction to directory...")
+    with tempfile.TemporaryDirectory() as directory:
+        create_client_install(directory)
+        output = os.path.join(directory, 'out')
+        index_path = extract_pkb.find_packmap(directory)
+        totals = extract_pkb.run_extraction(directory, index_path, output, jobs=2)
+
+        for name, content in FILES:
+            with open(os.path.join(output, 'worlds_3g', *name.split('/')), 'rb') as f:
+                assert f.read() == content, name
+            print(f"✅ {name}")
+        assert totals['entries'] == len(FILES) + 1
+
+        again = extract_pkb.run_extraction(directory, index_path, output, jobs=2, skip_existing=True)
+        print(f"⏭️ Second run skipped {again['skipped']} entries")
+        assert again['skipped'] == again['entries']
+
+
+def test_extract_to_store():
+    """Test extraction into a content-addressed store"""
+    print("\n🗃️ Testing extraction to content-addressed store...")
+    with tempfile.TemporaryDirectory() as directory:
+        create_client_install(directory)
+        output = os.path.join(directory, 'store')
+        extract_pkb.run_extraction(directory, extract_pkb.find_packmap(directory), output, store=True, jobs=1)
+
+        with open(os.path.join(output, 'manifest.json')) as f:
+            manifest = json.load(f)
+        for name, content in FILES:
+            digest = manifest['worlds_3g.pkb'][name]
+            with open(os.path.join(output, 'objects', digest[:2], digest[2:]), 'rb') as f:
+                assert f.read() == content, name
+            print(f"✅ {name} -> {digest[:12]}")
+
+
+def test_unsafe_names():
+    """Test that entry names cannot escape the output directory"""
+    print("\n🛡️ Testing unsafe entry names...")
+    assert extract_pkb.safe_entry_path('out', '../../etc/passwd') is None
+    assert extract_pkb.safe_entry_path('out', '/') is None
+    assert extract_pkb.safe_entry_path('out', 'models\\car.moa') == os.path.join('out', 'models', 'car.moa')
+    print("✅ Unsafe names rejected")
+
+
+def run_extract_tests():
+    """Run all bulk extractor tests"""
+    print("🧪 BULK PKB EXTRACTOR TESTS")
+    print("=" * 40)
+    try:
+        test_extract_to_directory()
+        test_extract_to_store()
+        test_unsafe_names()
+    except AssertionError as e:
+        print(f"❌ Extractor tests failed {e}")
+        return False
+    print("\n✅ All extractor tests passed!")
+    return True
+
+
+if __name__ == "__main__":
+    success = run_extract_tests()
+    sys.exit(0 if success else 1)
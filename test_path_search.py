@@ -0,0 +1,82 @@
+#!/usr/bin/env python3
+"""
+Test the trigram path search index (path_search_index.js) under node
+"""
+
+import json
+import os
+import shutil
+import subprocess
+import sys
+
+PATHS = [
+    'resource/models/x/neo.moa',
+    'resource/models/x/neo_coat.prop',
+    'resource/models/trinity.moa',
+    'resource/textures/neon_sign.dtx',
+    'resource/worlds/richland.dat',
+    'worlds_3g.pkb/characters/agent_smith.abc',
+]
+
+QUERIES = {
+    'exact': 'neo.moa',
+    'substitution': 'nea.moa',
+    'long_substitution': 'resource/models/trinitx.moa',
+    'unrelated': 'qqqq.zzz',
+}
+
+SEARCH_SCRIPT = r"""
+require('vm').runInThisContext(require('fs').readFileSync(process.argv[1], 'utf8'));
+const index = new PathSearchIndex();
+index.add(JSON.parse(process.argv[2]), 'files');
+const results = {};
+for (const [name, query] of Object.entries(JSON.parse(process.argv[3]))) {
+    results[name] = index.search(query, 10).results.map(({ path, kind }) => [path, kind]);
+}
+console.log(JSON.stringify(results));
+"""
+
+
+def test_path_search():
+    """Test ranking and typo-tolerant fuzzy matches"""
+    print("🔎 Testing path search index...")
+    node = shutil.which('node')
+    if not node:
+        print("⚠️ node not found, skipping")
+        return
+    script = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'path_search_index.js')
+    result = subprocess.run(
+        [node, '-e', SEARCH_SCRIPT, script, json.dumps(PATHS), json.dumps(QUERIES)],
+        capture_output=True, text=True, timeout=30)
+    if result.returncode != 0:
+        print(result.stderr)
+    found = json.loads(result.stdout) if result.returncode == 0 else {}
+
+    checks = [
+        ('Exact file name first', found.get('exact', [[None]])[0] == ['resource/models/x/neo.moa', 'exact']),
+        ('Single substitution in a short name', ['resource/models/x/neo.moa', 'fuzzy'] in found.get('substitution', [])),
+        ('Single substitution in a long path', found.get('long_substitution', [[None]])[0] == [
+            'resource/models/trinity.moa', 'fuzzy']),
+        ('Unrelated query finds nothing', found.get('unrelated') == []),
+    ]
+    for name, check in checks:
+        print(f"{'✅' if check else '❌'} {name}")
+    assert all(check for _, check in checks)
+
+
+def run_path_search_tests():
+    """Run all path search tests"""
+    print("🧪 PATH SEARCH TESTS")
+    print("=" * 40)
+    try:
+        test_path_search()
+    except AssertionError as e:
+        print(f"❌ Path search tests failed {e}")
+        return False
+    print("\n✅ All path search tests passed!")
+    return True
+
+
+if __name__ == "__main__":
+    success = run_path_search_tests()
+    sys.exit(0 if success else 1)
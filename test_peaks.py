@@ -0,0 +1,124 @@
+#!/usr/bin/env python3
+"""
+Test waveform peak computation and the /peaks/ endpoint
+"""
+
+import array
+import os
+import sys
+import tempfile
+import threading
+import urllib.request
+import wave
+from urllib.parse import quote
+
+import bik
+import peaks
+from test_bik_cache import load_bik_server
+
+
+def write_wav(path, samples, channels=1, rate=22050):
+    """Write 16-bit PCM samples (interleaved when channels > 1)"""
+    data = array.array('h', samples)
+    if sys.byteorder == 'big':
+        data.byteswap()
+    with wave.open(path, 'wb') as wav:
+        wav.setnchannels(channels)
+        wav.setsampwidth(2)
+        wav.setframerate(rate)
+        wav.writeframes(data.tobytes())
+
+
+def test_peak_levels():
+    """Test peak values and the zoom pyramid for a PCM WAV file"""
+    print("〰️ Testing waveform peaks...")
+    with tempfile.TemporaryDirectory() as directory:
+        source = os.path.join(directory, 'voice.wav')
+        # 1024 quiet frames, then 1024 loud ones, then a partial block
+        samples = [100, -100] * 512 + [32000, -32000] * 512 + [5000] * 100
+        write_wav(source, samples)
+
+        track = peaks.decode_peaks(peaks.waveform_peaks(source, samples_per_peak=256, levels=4))
+        level0, level1, level3 = track['levels'][0], track['levels'][1], track['levels'][3]
+        checks = [
+            ('Header fields', (track['sample_rate'], track['samples_per_peak'], track['total_samples']) == (22050, 256, 2148)),
+            ('One peak per block (last one partial)', len(level0) == 2 * 9),
+            ('Quiet block', tuple(level0[0:2]) == (-1, 0)),
+            ('Loud block', tuple(level0[8:10]) == (-125, 125)),
+            ('Partial block', tuple(level0[16:18]) == (19, 19)),
+            ('Levels halve', len(level1) == 2 * 5 and len(level3) == 2 * 2),
+            ('Coarse level keeps extremes', min(level3[0::2]) == -125 and max(level3[1::2]) == 125),
+        ]
+        for name, check in checks:
+            print(f"{'✅' if check else '❌'} {name}")
+        assert all(check for _, check in checks)
+
+
+def test_stereo_peaks():
+    """Test that a peak spans every channel of interleaved audio"""
+    print("\n🎧 Testing stereo peaks...")
+    with tempfile.TemporaryDirectory() as directory:
+        source = os.path.join(directory, 'music.wav')
+        write_wav(source, [0, 16384] * 512, channels=2)
+        track = peaks.decode_peaks(peaks.waveform_peaks(source, samples_per_peak=256, levels=1))
+        assert track['total_samples'] == 512
+        assert list(track['levels'][0]) == [0, 64, 0, 64]
+        print("✅ Two stereo peaks covering both channels")
+
+
+def test_peaks_endpoint():
+    """Test that /peaks/ resolves client-relative paths and caches the result"""
+    print("\n📡 Testing /peaks/ endpoint...")
+    server_module = load_bik_server()
+    with tempfile.TemporaryDirectory() as directory:
+        client_dir = os.path.join(directory, 'client')
+        os.makedirs(os.path.join(client_dir, 'resource', 'sound'))
+        source = os.path.join(client_dir, 'resource', 'sound', 'door.wav')
+        write_wav(source, [1000, -1000] * 2048)
+
+        server_module.catalog = bik.BIKCatalog(client_dir, prober=lambda path: {})
+        server_module.transcode_cache = bik.TranscodeCache(os.path.join(directory, 'cache'))
+        server_module.transcode_pool = bik.TranscodePool(server_module.transcode_cache, max_jobs=1, queue_timeout=1)
+        httpd = server_module.ThreadedTCPServer(('127.0.0.1', 0), server_module.BIKHandler)
+        server_module.BIKHandler.log_message = lambda *args: None
+        threading.Thread(target=httpd.serve_forever, daemon=True).start()
+        # The browser sends the path relative to whichever folder the user picked
+        url = (f'http://127.0.0.1:{httpd.server_address[1]}/peaks/door.wav'
+               f'?path={quote("SOE_Matrix_Online/resource/sound/door.wav")}')
+
+        try:
+            with urllib.request.urlopen(url) as response:
+                content_type = response.headers['Content-Type']
+                body = response.read()
+        finally:
+            httpd.shutdown()
+            httpd.server_close()
+
+        checks = [
+            ('Binary response', content_type == 'application/octet-stream'),
+            ('Peaks file', peaks.decode_peaks(body)['total_samples'] == 4096),
+            ('Cached on disk', os.path.isfile(peaks.peaks_path(server_module.transcode_cache, source))),
+        ]
+        for name, check in checks:
+            print(f"{'✅' if check else '❌'} {name}")
+        assert all(check for _, check in checks)
+
+
+def run_peaks_tests():
+    """Run all waveform peaks tests"""
+    print("🧪 WAVEFORM PEAKS TESTS")
+    print("=" * 40)
+    try:
+        test_peak_levels()
+        test_stereo_peaks()
+        test_peaks_endpoint()
+    except AssertionError as e:
+        print(f"❌ Waveform peaks tests failed {e}")
+        return False
+    print("\n✅ All waveform peaks tests passed!")
+    return True
+
+
+if __name__ == "__main__":
+    success = run_peaks_tests()
+    sys.exit(0 if success else 1)
@@ -0,0 +1,113 @@
+#!/usr/bin/env python3
+"""
+Test the memory-mapped PKB archive reader
+"""
+
+import os
+import struct
+import sys
+import tempfile
+
+import pkb
+
+FILES = [
+    ('building1.prop', b'PROP' + bytes(range(96))),
+    ('models/vehicle.moa', b'MOA\0' * 64),
+    ('character.moa', b'\x42' * 300),
+]
+
+
+def create_client_install(directory):
+    """Write packmaps/worlds_3g.pkb and an LTAI packmap_save.lta into directory, return the parsed index"""
+    os.makedirs(os.path.join(directory, 'packmaps'), exist_ok=True)
+    data = b'PKB\0' + b'\0' * 12
+    index_data = b'LTAI' + struct.pack('<I', len(FILES) + 1)
+    for name, content in FILES:
+        index_data += struct.pack('<32s32sII', name.encode('ascii'), b'worlds_3g.pkb', len(data), len(content))
+        data += content
+    # An entry whose size runs past the end of the archive
+    index_data += struct.pack('<32s32sII', b'truncated.prop', b'worlds_3g.pkb', len(data) - 10, 100)
+
+    with open(os.path.join(directory, 'packmaps', 'worlds_3g.pkb'), 'wb') as f:
+        f.write(data)
+    with open(os.path.join(directory, 'packmap_save.lta'), 'wb') as f:
+        f.write(index_data)
+    return pkb.parse_packmap(index_data)
+
+
+def test_archive_entries():
+    """Test zero-copy entry access"""
+    print("📦 Testing PKB archive entry access...")
+    with tempfile.TemporaryDirectory() as directory:
+        index = create_client_install(directory)
+        with pkb.PKBArchive(os.path.join(directory, 'packmaps', 'worlds_3g.pkb'), index) as archive:
+            vehicle = archive['vehicle.moa']
+            checks = [
+                ('Entry count', len(archive) == 4),
+                ('Membership', 'character.moa' in archive and 'missing.moa' not in archive),
+                ('Entry is a memoryview', isinstance(vehicle, memoryview)),
+                ('Entry contents', vehicle == FILES[1][1]),
+                ('Truncated entry clamped', len(archive['truncated.prop']) == 10),
+                ('Iteration order', list(archive)[:3] == [name for name, _ in FILES]),
+            ]
+            vehicle.release()
+
+            for name, view in archive.items():
+                view.release()
+
+        for name, check in checks:
+            print(f"{'✅' if check else '❌'} {name}")
+        assert all(check for _, check in checks)
+
+
+def test_install_iteration():
+    """Test iterating every entry of a client install"""
+    print("\n🗂️ Testing client install iteration...")
+    with tempfile.TemporaryDirectory() as directory:
+        index = create_client_install(directory)
+        seen = {}
+        for archive_name, entry_name, view in pkb.iter_install_entries(directory, index):
+            seen[entry_name] = (archive_name, len(view))
+
+        print(f"📊 Iterated {len(seen)} entries")
+        assert seen['building1.prop'] == ('worlds_3g.pkb', len(FILES[0][1]))
+        assert len(seen) == 4
+
+        archives = pkb.open_archives(directory, index)
+        assert list(archives) == ['worlds_3g.pkb']
+        for archive in archives.values():
+            archive.close()
+
+
+def test_missing_entry():
+    """Test that unknown entries raise KeyError"""
+    print("\n❓ Testing missing entry lookup...")
+    with tempfile.TemporaryDirectory() as directory:
+        index = create_client_install(directory)
+        with pkb.PKBArchive(os.path.join(directory, 'packmaps', 'worlds_3g.pkb'), index) as archive:
+            try:
+                archive['missing.moa']
+            except KeyError:
+                print("✅ KeyError raised")
+            else:
+                raise AssertionError("missing entry should raise KeyError")
+
+
+def run_pkb_archive_tests():
+    """Run all PKB archive reader tests"""
+    print("🧪 PKB ARCHIVE READER TESTS")
+    print("=" * 40)
+    try:
+        test_archive_entries()
+        test_install_iteration()
+        test_missing_entry()
+    except AssertionError as e:
+        print(f"❌ PKB archive tests failed {e}")
+        return False
+    print("\n✅ All PKB archive tests passed!")
+    return True
+
+
+if __name__ == "__main__":
+    success = run_pkb_archive_tests()
+    sys.exit(0 if success else 1)
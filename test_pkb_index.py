@@ -0,0 +1,122 @@
+#!/usr/bin/env python3
+"""
+Test packmap index parsing and PKB entry range handling
+"""
+
+import struct
+import sys
+
+import pkb
+from http_util import parse_range
+
+ENTRIES = [
+    ('building1.prop', 'worlds_3g.pkb', 176, 500),
+    ('models/vehicle.moa', 'worlds_3g.pkb', 676, 1200),
+    ('agent_smith.moa', 'char_npc.pkb', 112, 800),
+]
+
+
+def build_ltai_index(entries):
+    """Build a packmap_save.lta in the LTAI test format"""
+    data = b'LTAI' + struct.pack('<I', len(entries))
+    for name, pkb_name, offset, size in entries:
+        data += struct.pack('<32s32sII', name.encode('ascii'), pkb_name.encode('ascii'), offset, size)
+    return data
+
+
+def test_ltai_index():
+    """Test LTAI index parsing and lookups"""
+    print("📇 Testing LTAI packmap index...")
+    index = pkb.parse_packmap(build_ltai_index(ENTRIES))
+
+    checks = [
+        ('Format detected', index.format == 'LTAI'),
+        ('Entry count', len(index) == 3),
+        ('PKB names', index.pkb_names == ['worlds_3g.pkb', 'char_npc.pkb']),
+        ('Lookup by full path', index.lookup('MODELS/Vehicle.moa') == 1),
+        ('Lookup by bare name', index.lookup('vehicle.moa') == 1),
+        ('Entries for PKB', list(index.entries_for_pkb('WORLDS_3G.PKB')) == [0, 1]),
+        ('Lookup in PKB', index.lookup_in_pkb('char_npc.pkb', 'agent_smith.moa') == 2),
+        ('Lookup in wrong PKB', index.lookup_in_pkb('worlds_3g.pkb', 'agent_smith.moa') is None),
+        ('Entry fields', index.entry(2) == {'name': 'agent_smith.moa', 'pkb': 'char_npc.pkb', 'offset': 112, 'size': 800}),
+    ]
+
+    for name, check in checks:
+        print(f"{'✅' if check else '❌'} {name}")
+    assert all(check for _, check in checks)
+
+
+def test_truncated_index():
+    """Test that a declared count larger than the file is clamped"""
+    print("\n✂️ Testing truncated index...")
+    data = build_ltai_index(ENTRIES)[:-10]
+    index = pkb.parse_packmap(data)
+    print(f"📊 Parsed {len(index)} of {len(ENTRIES)} entries")
+    assert len(index) == 2
+
+
+def test_heuristic_index():
+    """Test the single-pass scan of unknown index layouts"""
+    print("\n🔍 Testing heuristic packmap index...")
+    data = b'\x01\x02' + b'props/crate.prop' + b'\0\0' + struct.pack('<II', 64, 128)
+    data += b'\xff' + b'neo.moa' + struct.pack('<II', 300, 32) + b'\0' * 16
+    index = pkb.parse_packmap(data)
+
+    checks = [
+        ('Format detected', index.format == 'heuristic'),
+        ('Names found', index.names == ['props/crate.prop', 'neo.moa']),
+        ('Offsets', list(index.offsets) == [64, 300]),
+        ('Sizes', list(index.sizes) == [128, 32]),
+        ('Unassigned entries match any PKB', list(index.entries_for_pkb('worlds_1.pkb')) == [0, 1]),
+        ('Lookup in any PKB', index.lookup_in_pkb('worlds_1.pkb', 'crate.prop') == 0),
+    ]
+
+    for name, check in checks:
+        print(f"{'✅' if check else '❌'} {name}")
+    assert all(check for _, check in checks)
+
+
+def test_range_parsing():
+    """Test single-range Range header parsing"""
+    print("\n📏 Testing Range header parsing...")
+    checks = [
+        ('No header', parse_range(None, 100) is None),
+        ('Explicit range', parse_range('bytes=10-19', 100) == (10, 19)),
+        ('Open-ended range', parse_range('bytes=90-', 100) == (90, 99)),
+        ('Suffix range', parse_range('bytes=-5', 100) == (95, 99)),
+        ('End clamped', parse_range('bytes=50-500', 100) == (50, 99)),
+        ('Multi-range ignored', parse_range('bytes=0-1,5-6', 100) is None),
+        ('Malformed ignored', parse_range('bytes=abc', 100) is None),
+    ]
+    for name, check in checks:
+        print(f"{'✅' if check else '❌'} {name}")
+    assert all(check for _, check in checks)
+
+    for header in ('bytes=100-', 'bytes=-0'):
+        try:
+            parse_range(header, 100)
+        except ValueError:
+            print(f"✅ Unsatisfiable: {header}")
+        else:
+            raise AssertionError(f"{header} should be unsatisfiable")
+
+
+def run_pkb_index_tests():
+    """Run all packmap index tests"""
+    print("🧪 PKB INDEX TESTS")
+    print("=" * 40)
+    try:
+        test_ltai_index()
+        test_truncated_index()
+        test_heuristic_index()
+        test_range_parsing()
+    except AssertionError as e:
+        print(f"❌ PKB index tests failed {e}")
+        return False
+    print("\n✅ All PKB index tests passed!")
+    return True
+
+
+if __name__ == "__main__":
+    success = run_pkb_index_tests()
+    sys.exit(0 if success else 1)
@@ -0,0 +1,84 @@
+#!/usr/bin/env python3
+"""
+Test the batch BIK pre-transcoder
+"""
+
+import os
+import sys
+import tempfile
+
+import bik
+import pretranscode_bik
+from test_bik_catalog import create_bik_tree
+
+# Stand-in for ffmpeg: arguments are [source, output]; fails for chapter2
+FAKE_FFMPEG = (
+    "import sys\n"
+    "source, output = sys.argv[1], sys.argv[2]\n"
+    "if 'chapter2' in source: sys.exit(1)\n"
+    "open(output, 'wb').write(b'MP4' + open(source, 'rb').read())\n"
+)
+
+
+def fake_transcode_command(source, encode_args=bik.ENCODE_ARGS, output='pipe:1', start=0, threads=None):
+    return [sys.executable, '-c', FAKE_FFMPEG, source, output]
+
+
+def test_pretranscode():
+    """Test that a run fills the cache, reports failures and resumes without redoing work"""
+    print("🎬 Testing batch pre-transcode...")
+    with tempfile.TemporaryDirectory() as directory:
+        client_dir = os.path.join(directory, 'client')
+        cache_dir = os.path.join(directory, 'cache')
+        create_bik_tree(client_dir)
+
+        original = bik.probe, bik.transcode_command, bik.remux_command
+        bik.probe = lambda path: {'duration': 30.0, 'width': 640, 'height': 480}
+        bik.transcode_command = fake_transcode_command
+        bik.remux_command = lambda source, output: [sys.executable, '-c', 'raise SystemExit(1)']
+        try:
+            first = pretranscode_bik.run_pretranscode(client_dir, cache_dir, jobs=2)
+            second = pretranscode_bik.run_pretranscode(client_dir, cache_dir, jobs=2)
+            intro = os.path.join(client_dir, 'resource', 'Bink', 'intro.bik')
+            os.utime(intro, ns=(0, 1_000_000_000))
+            touched = pretranscode_bik.run_pretranscode(client_dir, cache_dir, jobs=2)
+            # A missing encoder raises OSError per file; the batch carries on
+            bik.transcode_command = lambda *args, **kwargs: [os.path.join(directory, 'no-such-ffmpeg')]
+            missing = pretranscode_bik.run_pretranscode(client_dir, cache_dir, jobs=2, force=True)
+        finally:
+            bik.probe, bik.transcode_command, bik.remux_command = original
+
+        cache = bik.TranscodeCache(cache_dir)
+        cached = cache.lookup(cache.key(intro))
+        leftovers = [name for _, _, names in os.walk(cache_dir) for name in names if name.endswith('.part')]
+        checks = [
+            ('Two files transcoded, one failed', first['files'] == 2 and first['failed'] == 1),
+            ('Media seconds totalled', first['media_seconds'] == 60.0),
+            ('Second run skips cached files', second['skipped'] == 2 and second['files'] == 0),
+            ('Failed file retried', second['failed'] == 1),
+            ('Changed file re-transcoded', touched['files'] == 1 and touched['skipped'] == 1),
+            ('Output in the proxy cache', cached is not None and open(cached, 'rb').read().startswith(b'MP4BIKi')),
+            ('Missing encoder fails files, not the batch', missing['failed'] == 3 and missing['files'] == 0),
+            ('No partial files left', not leftovers),
+        ]
+        for name, check in checks:
+            print(f"{'✅' if check else '❌'} {name}")
+        assert all(check for _, check in checks)
+
+
+def run_pretranscode_tests():
+    """Run all BIK pre-transcode tests"""
+    print("🧪 BIK PRE-TRANSCODE TESTS")
+    print("=" * 40)
+    try:
+        test_pretranscode()
+    except AssertionError as e:
+        print(f"❌ BIK pre-transcode tests failed {e}")
+        return False
+    print("\n✅ All BIK pre-transcode tests passed!")
+    return True
+
+
+if __name__ == "__main__":
+    success = run_pretranscode_tests()
+    sys.exit(0 if success else 1)
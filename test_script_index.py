@@ -0,0 +1,196 @@
+#!/usr/bin/env python3
+"""
+Test the full-text script index and the /search-scripts endpoint
+"""
+
+import http.client
+import json
+import os
+import sys
+import tempfile
+import threading
+import time
+
+import manifest
+import script_index
+import server
+from test_server import start_server
+
+SCRIPTS = {
+    'resource/scripts/abilities.lua': (
+        'function GrantHyperJump(player)\n'
+        '    SetAbility(player, 1042)\n'
+        '    -- setability is also called from combat.lua\n'
+        'end\n'
+    ),
+    'resource/scripts/combat.lua': (
+        'local id = 1042\n'
+        'SetAbility(target, id)\n'
+        'SendRPC("RPC_CombatStart", target)\n'
+    ),
+    'resource/config/rpc.xml': '<rpc name="RPC_CombatStart" id="7"/>\n',
+    'resource/models/car.moa': 'SetAbility 1042 binary-looking model\n',
+}
+
+
+def write_client(directory):
+    client_dir = os.path.join(directory, 'client')
+    for relative, text in SCRIPTS.items():
+        path = os.path.join(client_dir, *relative.split('/'))
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        with open(path, 'w') as f:
+            f.write(text)
+    # A binary .lta (like packmap_save.lta) must not be indexed
+    with open(os.path.join(client_dir, 'resource', 'packmap_save.lta'), 'wb') as f:
+        f.write(b'LTAI\0\0SetAbility\0')
+    return client_dir
+
+
+def test_identifier_and_phrase_queries():
+    """Test identifier hits, phrase positions, case-insensitivity and incremental refresh"""
+    print("🔎 Testing script index queries...")
+    with tempfile.TemporaryDirectory() as directory:
+        client_dir = write_client(directory)
+        client = manifest.ClientManifest(client_dir)
+        client.refresh()
+        index = script_index.ScriptIndex(client_dir)
+        indexed = index.refresh(client)
+        indexed_paths = sorted(index.paths)
+
+        identifier = index.search('setability')
+        phrase = index.search('SetAbility(player, 1042)')
+        reversed_phrase = index.search('1042 player')
+        rpc = index.search('RPC_CombatStart')
+        missing = index.search('NoSuchFunction')
+        unchanged = index.refresh(client)
+
+        with open(os.path.join(client_dir, 'resource', 'scripts', 'combat.lua'), 'a') as f:
+            f.write('SetAbility(target, 2000) -- longer now\n')
+        os.remove(os.path.join(client_dir, 'resource', 'config', 'rpc.xml'))
+        client.refresh()
+        reindexed = index.refresh(client)
+        after = index.search('SetAbility')
+        rpc_after = index.search('RPC_CombatStart')
+
+        checks = [
+            ('Only text scripts indexed', indexed == 3 and indexed_paths == [
+                'resource/config/rpc.xml', 'resource/scripts/abilities.lua', 'resource/scripts/combat.lua']),
+            ('Identifier hits by file and line', [(h['path'], h['line']) for h in identifier['hits']] == [
+                ('resource/scripts/abilities.lua', 2), ('resource/scripts/abilities.lua', 3),
+                ('resource/scripts/combat.lua', 2)]),
+            ('Hit line text', identifier['hits'][0]['text'] == 'SetAbility(player, 1042)'),
+            ('Phrase needs consecutive tokens', [(h['path'], h['line']) for h in phrase['hits']] == [
+                ('resource/scripts/abilities.lua', 2)]),
+            ('Phrase order matters', reversed_phrase['total'] == 0),
+            ('Identifier across file types', rpc['files'] == 2),
+            ('No hits', missing['hits'] == [] and missing['total'] == 0),
+            ('Unchanged manifest skips work', unchanged == 0),
+            ('Changed and removed files', reindexed == 2 and after['total'] == 4 and rpc_after['files'] == 1),
+        ]
+        for name, check in checks:
+            print(f"{'✅' if check else '❌'} {name}")
+        assert all(check for _, check in checks)
+
+
+def test_search_during_refresh():
+    """Test that queries answer from the previous index while changed files are tokenized"""
+    print("\n⏳ Testing queries during a refresh...")
+    with tempfile.TemporaryDirectory() as directory:
+        client_dir = write_client(directory)
+        client = manifest.ClientManifest(client_dir)
+        client.refresh()
+        index = script_index.ScriptIndex(client_dir)
+        index.refresh(client)
+
+        with open(os.path.join(client_dir, 'resource', 'scripts', 'combat.lua'), 'a') as f:
+            f.write('SetAbility(target, 2000)\n')
+        client.refresh()
+
+        tokenizing, release = threading.Event(), threading.Event()
+        tokenize_document = index._tokenize_document
+
+        def slow_tokenize(text):
+            tokenizing.set()
+            release.wait(5)
+            return tokenize_document(text)
+
+        index._tokenize_document = slow_tokenize
+        refresh = threading.Thread(target=index.refresh, args=(client,))
+        refresh.start()
+        tokenizing.wait(5)
+        started = time.time()
+        during = index.search('SetAbility')
+        waited = time.time() - started
+        still_refreshing = refresh.is_alive()
+        release.set()
+        refresh.join(5)
+        after = index.search('SetAbility')
+
+        checks = [
+            ('Query not blocked by the refresh', still_refreshing and waited < 1),
+            ('Previous index answered', during['total'] == 3),
+            ('New documents swapped in', after['total'] == 4),
+        ]
+        for name, check in checks:
+            print(f"{'✅' if check else '❌'} {name}")
+        assert all(check for _, check in checks)
+
+
+def test_search_endpoint():
+    """Test /search-scripts over the server's client manifest"""
+    print("\n📡 Testing /search-scripts endpoint...")
+    with tempfile.TemporaryDirectory() as directory:
+        client_dir = write_client(directory)
+        original = server.client_manifest, server.client_script_index
+        server.client_manifest = manifest.ClientManifest(client_dir)
+        server.client_manifest.refresh()
+        server.client_script_index = None
+        httpd, port = start_server(directory)
+        try:
+            conn = http.client.HTTPConnection('127.0.0.1', port, timeout=5)
+            conn.request('GET', '/search-scripts?q=SetAbility&limit=2')
+            response = conn.getresponse()
+            limited = (response.status, json.loads(response.read()))
+            conn.request('GET', '/search-scripts?q=%22SendRPC%20RPC_CombatStart%22')
+            response = conn.getresponse()
+            phrase = json.loads(response.read())
+            conn.request('GET', '/search-scripts?q=%2B%2B')
+            response = conn.getresponse()
+            empty = response.status
+            response.read()
+            conn.close()
+        finally:
+            httpd.shutdown()
+            httpd.server_close()
+            server.client_manifest, server.client_script_index = original
+
+        status, body = limited
+        checks = [
+            ('Limited hits with full total', status == 200 and len(body['hits']) == 2 and body['total'] == 3),
+            ('Timing reported', 'took_ms' in body and body['indexed_files'] == 3),
+            ('Quoted phrase', [(h['path'], h['line']) for h in phrase['hits']] == [('resource/scripts/combat.lua', 3)]),
+            ('Query without tokens rejected', empty == 400),
+        ]
+        for name, check in checks:
+            print(f"{'✅' if check else '❌'} {name}")
+        assert all(check for _, check in checks)
+
+
+def run_script_index_tests():
+    """Run all script index tests"""
+    print("🧪 SCRIPT INDEX TESTS")
+    print("=" * 40)
+    try:
+        test_identifier_and_phrase_queries()
+        test_search_during_refresh()
+        test_search_endpoint()
+    except AssertionError as e:
+        print(f"❌ Script index tests failed {e}")
+        return False
+    print("\n✅ All script index tests passed!")
+    return True
+
+
+if __name__ == "__main__":
+    success = run_script_index_tests()
+    sys.exit(0 if success else 1)
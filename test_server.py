@@ -0,0 +1,418 @@
+#!/usr/bin/env python3
+"""
+Test the threaded keep-alive static server (server.py) and its caching headers
+"""
+
+import functools
+import gzip
+import http.client
+import json
+import os
+import shutil
+import socket
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+
+import manifest
+import server
+from test_pkb_index import build_ltai_index
+
+
+class QuietHandler(server.CORSRequestHandler):
+    """CORSRequestHandler without request logging; a subclass so other test modules keep the real one"""
+
+    def log_message(self, format, *args):
+        pass
+
+
+def start_server(directory):
+    """ThreadPoolHTTPServer on a free port serving directory; returns (httpd, port)"""
+    handler = functools.partial(QuietHandler, directory=directory)
+    httpd = server.ThreadPoolHTTPServer(('127.0.0.1', 0), handler, max_threads=4)
+    threading.Thread(target=httpd.serve_forever, daemon=True).start()
+    return httpd, httpd.server_address[1]
+
+
+def test_static_files():
+    """Test keep-alive, Range and HEAD for static files"""
+    print("📄 Testing static file serving...")
+    with tempfile.TemporaryDirectory() as directory:
+        body = bytes(range(256)) * 64
+        with open(os.path.join(directory, 'archive.bin'), 'wb') as f:
+            f.write(body)
+        httpd, port = start_server(directory)
+        try:
+            conn = http.client.HTTPConnection('127.0.0.1', port, timeout=5)
+            conn.request('GET', '/archive.bin')
+            response = conn.getresponse()
+            full = (response.status, response.read())
+            first_socket = conn.sock
+
+            conn.request('GET', '/archive.bin', headers={'Range': 'bytes=1000-1009'})
+            response = conn.getresponse()
+            partial = (response.status, response.getheader('Content-Range'), response.read())
+            same_connection = conn.sock is first_socket
+
+            conn.request('GET', '/archive.bin', headers={'Range': 'bytes=-4'})
+            response = conn.getresponse()
+            suffix = response.read()
+
+            conn.request('GET', '/archive.bin', headers={'Range': 'bytes=999999-'})
+            response = conn.getresponse()
+            unsatisfiable = (response.status, response.getheader('Content-Range'))
+            response.read()
+
+            conn.request('HEAD', '/archive.bin')
+            response = conn.getresponse()
+            head = (response.getheader('Content-Length'), response.getheader('Accept-Ranges'), response.read())
+
+            conn.request('GET', '/missing.bin')
+            response = conn.getresponse()
+            missing = response.status
+            response.read()
+            conn.close()
+        finally:
+            httpd.shutdown()
+            httpd.server_close()
+
+        checks = [
+            ('Full body', full == (200, body)),
+            ('Range request', partial == (206, 'bytes 1000-1009/16384', body[1000:1010])),
+            ('Connection kept alive', same_connection),
+            ('Suffix range', suffix == body[-4:]),
+            ('Unsatisfiable range', unsatisfiable == (416, 'bytes */16384')),
+            ('HEAD has no body', head == ('16384', 'bytes', b'')),
+            ('Missing file', missing == 404),
+        ]
+        for name, check in checks:
+            print(f"{'✅' if check else '❌'} {name}")
+        assert all(check for _, check in checks)
+
+
+def test_etags_and_gzip():
+    """Test content-hash ETags, 304 revalidation and precompressed gzip siblings"""
+    print("\n🏷️ Testing ETags and gzip siblings...")
+    with tempfile.TemporaryDirectory() as directory:
+        page = os.path.join(directory, 'index.html')
+        text = b'<html>' + b'<p>Matrix Online</p>' * 200 + b'</html>'
+        with open(page, 'wb') as f:
+            f.write(text)
+        httpd, port = start_server(directory)
+        try:
+            conn = http.client.HTTPConnection('127.0.0.1', port, timeout=5)
+            conn.request('GET', '/index.html')
+            response = conn.getresponse()
+            etag, plain = response.getheader('ETag'), response.read()
+
+            conn.request('GET', '/index.html', headers={'If-None-Match': etag})
+            response = conn.getresponse()
+            revalidated = (response.status, response.read())
+
+            conn.request('GET', '/index.html', headers={'Accept-Encoding': 'gzip, deflate'})
+            response = conn.getresponse()
+            gz_etag = response.getheader('ETag')
+            compressed = (response.getheader('Content-Encoding'), gzip.decompress(response.read()))
+
+            conn.request('GET', '/index.html', headers={'Accept-Encoding': 'gzip', 'If-None-Match': f'W/{gz_etag}'})
+            response = conn.getresponse()
+            gz_revalidated = response.status
+            response.read()
+
+            conn.request('GET', '/index.html', headers={'Accept-Encoding': 'gzip', 'Range': 'bytes=0-5'})
+            response = conn.getresponse()
+            ranged = (response.getheader('Content-Encoding'), response.read())
+
+            with open(page, 'ab') as f:
+                f.write(b'<!-- changed -->')
+            os.utime(page, ns=(0, os.stat(page + '.gz').st_mtime_ns + 1_000_000_000))
+            conn.request('GET', '/index.html', headers={'Accept-Encoding': 'gzip', 'If-None-Match': gz_etag})
+            response = conn.getresponse()
+            changed = (response.status, gzip.decompress(response.read()).endswith(b'<!-- changed -->'))
+
+            # Files above the hash threshold are validated by size and mtime
+            archive = os.path.join(directory, 'large.pkb')
+            with open(archive, 'wb') as f:
+                f.write(b'\0' * 4096)
+            original = server.ETAG_HASH_MAX_SIZE
+            server.ETAG_HASH_MAX_SIZE = 1024
+            try:
+                conn.request('GET', '/large.pkb', headers={'Range': 'bytes=0-3'})
+                response = conn.getresponse()
+                large_etag = (response.status, response.getheader('ETag'))
+                response.read()
+            finally:
+                server.ETAG_HASH_MAX_SIZE = original
+            conn.close()
+        finally:
+            httpd.shutdown()
+            httpd.server_close()
+
+        checks = [
+            ('Plain body with ETag', plain == text and etag and etag.startswith('"')),
+            ('If-None-Match gives 304', revalidated == (304, b'')),
+            ('Gzip sibling served', compressed == ('gzip', text) and gz_etag != etag),
+            ('Gzip variant revalidates', gz_revalidated == 304),
+            ('Range requests stay uncompressed', ranged == (None, b'<html>')),
+            ('Changed file gets a new body', changed == (200, True)),
+            ('Large files get size/mtime ETags', large_etag == (206, server.stat_etag(os.stat(archive)))),
+        ]
+        for name, check in checks:
+            print(f"{'✅' if check else '❌'} {name}")
+        assert all(check for _, check in checks)
+
+
+def test_concurrent_connections():
+    """Test that a stalled connection does not block other requests"""
+    print("\n🔀 Testing concurrent connections...")
+    with tempfile.TemporaryDirectory() as directory:
+        with open(os.path.join(directory, 'index.html'), 'wb') as f:
+            f.write(b'<html></html>')
+        httpd, port = start_server(directory)
+        stalled = socket.create_connection(('127.0.0.1', port))
+        try:
+            # Half a request line: a single-threaded server would wait on it forever
+            stalled.sendall(b'GET /index.html HT')
+            conn = http.client.HTTPConnection('127.0.0.1', port, timeout=5)
+            conn.request('GET', '/index.html')
+            response = conn.getresponse()
+            served = (response.status, response.read())
+            conn.close()
+        finally:
+            stalled.close()
+            httpd.shutdown()
+            httpd.server_close()
+
+        assert served == (200, b'<html></html>')
+        print("✅ Request served while another connection is stalled")
+
+        # A preflight must end without a body so the connection can be reused at once
+        httpd, port = start_server(directory)
+        try:
+            conn = http.client.HTTPConnection('127.0.0.1', port, timeout=2)
+            conn.request('OPTIONS', '/index.html', headers={'Access-Control-Request-Method': 'GET'})
+            response = conn.getresponse()
+            preflight = (response.status, response.read(), response.getheader('Access-Control-Allow-Origin'))
+            conn.request('GET', '/index.html')
+            response = conn.getresponse()
+            reused = (response.status, response.read())
+            conn.close()
+        finally:
+            httpd.shutdown()
+            httpd.server_close()
+
+        assert preflight == (204, b'', '*') and reused == (200, b'<html></html>')
+        print("✅ CORS preflight completes on a keep-alive connection")
+
+
+def test_pkb_entry_sendfile():
+    """Test that PKB entry bodies and ranges come from the right archive offsets"""
+    print("\n📦 Testing PKB entries...")
+    with tempfile.TemporaryDirectory() as directory:
+        archive = bytes((i * 7) % 256 for i in range(4096))
+        with open(os.path.join(directory, 'worlds_3g.pkb'), 'wb') as f:
+            f.write(archive)
+        packmap = os.path.join(directory, 'packmap_save.lta')
+        with open(packmap, 'wb') as f:
+            f.write(build_ltai_index([('building1.prop', 'worlds_3g.pkb', 1000, 500)]))
+
+        original = server.PKB_DIR, server.PACKMAP_FILE
+        server.PKB_DIR, server.PACKMAP_FILE = directory, packmap
+        httpd, port = start_server(directory)
+        try:
+            conn = http.client.HTTPConnection('127.0.0.1', port, timeout=5)
+            conn.request('GET', '/pkb/worlds_3g.pkb/building1.prop')
+            entry = conn.getresponse().read()
+            conn.request('GET', '/pkb/worlds_3g.pkb/building1.prop', headers={'Range': 'bytes=10-19'})
+            response = conn.getresponse()
+            partial = (response.status, response.read())
+            conn.close()
+        finally:
+            httpd.shutdown()
+            httpd.server_close()
+            server.PKB_DIR, server.PACKMAP_FILE = original
+
+        checks = [
+            ('Entry bytes', entry == archive[1000:1500]),
+            ('Entry range', partial == (206, archive[1010:1020])),
+        ]
+        for name, check in checks:
+            print(f"{'✅' if check else '❌'} {name}")
+        assert all(check for _, check in checks)
+
+
+def test_client_manifest():
+    """Test manifest paging, prefix queries, revalidation and lazy client file bytes"""
+    print("\n🗂️ Testing client manifest...")
+    with tempfile.TemporaryDirectory() as directory:
+        client_dir = os.path.join(directory, 'client')
+        files = {
+            'resource/models/Building1.prop': b'PROP' * 10,
+            'resource/models/car.moa': b'MOA' * 20,
+            'resource/textures/wall.dtx': b'DTX',
+            'resource/worlds_3g.pkb': bytes(range(256)) * 16,
+            'logs/client.log': b'log line\n',
+            '.hidden/secret.txt': b'no',
+        }
+        for relative, body in files.items():
+            path = os.path.join(client_dir, *relative.split('/'))
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+            with open(path, 'wb') as f:
+                f.write(body)
+
+        original = server.client_manifest
+        server.client_manifest = manifest.ClientManifest(client_dir)
+        server.client_manifest.refresh()
+        httpd, port = start_server(directory)
+
+        def get(target, headers=None):
+            conn.request('GET', target, headers=headers or {})
+            response = conn.getresponse()
+            return response, response.read()
+
+        try:
+            conn = http.client.HTTPConnection('127.0.0.1', port, timeout=5)
+            response, body = get('/manifest')
+            listing, etag = json.loads(body), response.getheader('ETag')
+
+            _, body = get('/manifest?prefix=RESOURCE/models/&format=compact')
+            models = json.loads(body)
+            _, body = get('/manifest?offset=1&limit=2')
+            paged = json.loads(body)
+            _, body = get('/manifest?type=texture')
+            textures = json.loads(body)
+            response, _ = get('/manifest?prefix=logs/', {'If-None-Match': etag})
+            unchanged = response.status
+
+            _, whole = get('/client/resource/worlds_3g.pkb')
+            response, partial = get('/client/RESOURCE/worlds_3g.pkb', {'Range': 'bytes=16-31'})
+            ranged = (response.status, partial)
+            response, _ = get('/client/.hidden/secret.txt')
+            hidden = response.status
+            response, _ = get('/client/../client/logs/client.log')
+            escaped = response.status
+
+            time.sleep(0.01)
+            with open(os.path.join(client_dir, 'logs', 'client2.log'), 'wb') as f:
+                f.write(b'new')
+            changed = server.client_manifest.refresh()
+            response, _ = get('/manifest', {'If-None-Match': etag})
+            refreshed = response.status
+            conn.close()
+        finally:
+            httpd.shutdown()
+            httpd.server_close()
+            server.client_manifest = original
+
+        checks = [
+            ('Sorted listing without hidden files', [f['path'] for f in listing['files']] == [
+                'logs/client.log', 'resource/models/Building1.prop', 'resource/models/car.moa',
+                'resource/textures/wall.dtx', 'resource/worlds_3g.pkb']),
+            ('Sizes and types', listing['files'][1]['size'] == 40 and listing['files'][1]['type'] == 'model'),
+            ('Type counts', listing['types'] == {'log': 1, 'model': 2, 'texture': 1, 'archive': 1}),
+            ('Case-insensitive prefix query', models['count'] == 2 and models['rows'][1][0] == 'resource/models/car.moa'),
+            ('Compact rows', models['fields'] == ['path', 'size', 'mtime', 'type'] and models['rows'][1][1] == 60),
+            ('Paging', paged['count'] == 5 and [f['path'] for f in paged['files']] == [
+                'resource/models/Building1.prop', 'resource/models/car.moa']),
+            ('Type filter', [f['path'] for f in textures['files']] == ['resource/textures/wall.dtx']),
+            ('Unchanged manifest gives 304', unchanged == 304),
+            ('Client file bytes', whole == files['resource/worlds_3g.pkb']),
+            ('Client file range', ranged == (206, bytes(range(16, 32)))),
+            ('Only manifest files reachable', hidden == 404 and escaped == 404),
+            ('Incremental refresh', changed == 1 and refreshed == 200),
+        ]
+        for name, check in checks:
+            print(f"{'✅' if check else '❌'} {name}")
+        assert all(check for _, check in checks)
+
+
+# Loads client_manifest.js the way index.html does and opens one entry the way a tab
+# does: placeholder first, then the real File from ensureFile()/ClientManifest.resolve()
+RESOLVE_SCRIPT = r"""
+globalThis.window = globalThis;
+require('vm').runInThisContext(require('fs').readFileSync(process.argv[1], 'utf8'));
+(async () => {
+    const baseUrl = process.argv[2];
+    const rows = [];
+    await ClientManifest.load({ baseUrl, onPage: page => { rows.push(...page); } });
+    const info = ClientManifest.fileInfo(rows.find(row => row[0] === 'logs/client.log'), baseUrl);
+    const placeholder = !(info.file instanceof Blob);
+    const [first, second] = await Promise.all([ClientManifest.resolve(info), ClientManifest.resolve(info)]);
+    console.log(JSON.stringify({
+        placeholder,
+        isFile: info.file instanceof File && first === info.file && second === info.file,
+        name: info.file.name,
+        text: await info.file.text(),
+        bytes: (await info.file.arrayBuffer()).byteLength
+    }));
+})().catch(error => {
+    console.error(error);
+    process.exit(1);
+});
+"""
+
+
+def test_manifest_backed_file():
+    """Test that a manifest entry's placeholder resolves to a readable File"""
+    print("\n📄 Testing manifest-backed file entries...")
+    node = shutil.which('node')
+    if not node:
+        print("⚠️ node not found, skipping")
+        return
+    with tempfile.TemporaryDirectory() as directory:
+        client_dir = os.path.join(directory, 'client')
+        os.makedirs(os.path.join(client_dir, 'logs'))
+        with open(os.path.join(client_dir, 'logs', 'client.log'), 'wb') as f:
+            f.write(b'RPC_CombatStart\n')
+
+        original = server.client_manifest
+        server.client_manifest = manifest.ClientManifest(client_dir)
+        server.client_manifest.refresh()
+        httpd, port = start_server(directory)
+        try:
+            script = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'client_manifest.js')
+            result = subprocess.run(
+                [node, '-e', RESOLVE_SCRIPT, script, f'http://127.0.0.1:{port}'],
+                capture_output=True, text=True, timeout=30)
+        finally:
+            httpd.shutdown()
+            httpd.server_close()
+            server.client_manifest = original
+
+        resolved = json.loads(result.stdout) if result.returncode == 0 else {}
+        checks = [
+            ('Entry starts as a placeholder', resolved.get('placeholder') is True),
+            ('Resolved once into a File on the entry', resolved.get('isFile') is True),
+            ('File readable as text', resolved.get('name') == 'client.log' and resolved.get('text') == 'RPC_CombatStart\n'),
+            ('File readable as bytes', resolved.get('bytes') == 16),
+        ]
+        if result.returncode != 0:
+            print(result.stderr)
+        for name, check in checks:
+            print(f"{'✅' if check else '❌'} {name}")
+        assert all(check for _, check in checks)
+
+
+def run_server_tests():
+    """Run all static server tests"""
+    print("🧪 STATIC SERVER TESTS")
+    print("=" * 40)
+    try:
+        test_static_files()
+        test_etags_and_gzip()
+        test_concurrent_connections()
+        test_pkb_entry_sendfile()
+        test_client_manifest()
+        test_manifest_backed_file()
+    except AssertionError as e:
+        print(f"❌ Static server tests failed {e}")
+        return False
+    print("\n✅ All static server tests passed!")
+    return True
+
+
+if __name__ == "__main__":
+    success = run_server_tests()
+    sys.exit(0 if success else 1)